@@ -0,0 +1,271 @@
+# 모델 호출 수 제한 (admission control)
+# 수업 중 QR 코드로 여러 학생이 한꺼번에 들어오면 세션마다 바로 스트리밍 호출을 열지 않고,
+# 프로세스 단위로 제공자별 동시 호출 수와 요청 속도(토큰 버킷), 모델별 요청 속도를 지키며 순서대로 호출을 허용합니다.
+# 기다리는 요청은 제공자별 대기열에 들어온 순서대로 처리되고(요청 속도 제한에 걸린 모델의 요청은 건너뛰고
+# 다른 모델의 요청을 먼저 보냄), 대기 순서는 on_wait 콜백으로 화면에 알려 줍니다.
+# 제한 값은 LLM_LIMITS 환경 변수(JSON)로 바꿀 수 있으며, 대기열 길이와 대기 시간은 snapshot으로 확인합니다.
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 기본 제한 값 (requests_per_minute가 없으면 속도 제한 없음, burst는 한 번에 몰아서 보낼 수 있는 요청 수)
+DEFAULT_LIMITS = {
+    "max_queue": 200,
+    "max_wait_seconds": 60,
+    "providers": {
+        "openai": {"max_concurrent": 24, "requests_per_minute": 450, "burst": 30},
+        "gemini": {"max_concurrent": 12, "requests_per_minute": 300, "burst": 20},
+        "anthropic": {"max_concurrent": 12, "requests_per_minute": 45, "burst": 10},
+    },
+    "models": {
+        "claude-3-opus-20240229": {"requests_per_minute": 20, "burst": 5},
+    },
+}
+# 설정에 없는 제공자에 적용할 값
+DEFAULT_PROVIDER_LIMITS = {"max_concurrent": 8}
+
+# 최근 대기 시간 기록 개수 (백분위 계산용)
+WAIT_SAMPLE_SIZE = 500
+
+class AdmissionError(Exception):
+    pass
+
+# 대기열이 가득 차서 바로 거절됨
+class AdmissionRejected(AdmissionError):
+    pass
+
+# 최대 대기 시간이 지남
+class AdmissionTimeout(AdmissionError):
+    pass
+
+# 기본값에 설정(JSON 문자열 또는 dict)을 덮어쓴 제한 값
+def load_limits(config=None):
+    if isinstance(config, str):
+        config = json.loads(config) if config.strip() else {}
+    config = config or {}
+    limits = {key: value for key, value in DEFAULT_LIMITS.items() if key not in ("providers", "models")}
+    limits.update({key: value for key, value in config.items() if key not in ("providers", "models")})
+    for section in ("providers", "models"):
+        merged = {name: dict(values) for name, values in DEFAULT_LIMITS[section].items()}
+        for name, values in config.get(section, {}).items():
+            merged.setdefault(name, {}).update(values)
+        limits[section] = merged
+    return limits
+
+# 제공자의 속도 제한(429) 오류인지 확인 (OpenAI/Anthropic: RateLimitError, Gemini: ResourceExhausted)
+def is_rate_limit_error(error):
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    return type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+class TokenBucket:
+    def __init__(self, requests_per_minute, burst=None, clock=time.monotonic):
+        self.rate = requests_per_minute / 60
+        self.capacity = burst or max(1, requests_per_minute // 6)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated_at = clock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens >= 1
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    # 다음 토큰까지 남은 시간 (초)
+    def wait_time(self, now):
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    # 제공자가 429를 돌려주면 버킷을 비워 잠시 요청을 줄임
+    def drain(self, now):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0)
+
+def _bucket(limits, clock):
+    if not limits.get("requests_per_minute"):
+        return None
+    return TokenBucket(limits["requests_per_minute"], limits.get("burst"), clock)
+
+class Ticket:
+    def __init__(self, provider, model, enqueued_at):
+        self.provider = provider
+        self.model = model
+        self.enqueued_at = enqueued_at
+        self.admitted_at = None
+        # 대기열에 들어왔을 때의 순서 (1이면 바로 앞에 기다리는 요청 없음)
+        self.position = None
+
+    @property
+    def admitted(self):
+        return self.admitted_at is not None
+
+    @property
+    def wait_ms(self):
+        return round((self.admitted_at - self.enqueued_at) * 1000) if self.admitted else None
+
+class _ProviderState:
+    def __init__(self, limits, clock):
+        self.max_concurrent = limits.get("max_concurrent", DEFAULT_PROVIDER_LIMITS["max_concurrent"])
+        self.bucket = _bucket(limits, clock)
+        self.queue = deque()
+        self.in_flight = 0
+        self.stats = {"admitted": 0, "rejected": 0, "timed_out": 0, "rate_limited": 0, "max_queue_depth": 0}
+        self.waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+class ConcurrencyGovernor:
+    def __init__(self, limits=None, clock=time.monotonic, poll_seconds=0.25):
+        self.limits = load_limits(limits)
+        self.clock = clock
+        self.poll_seconds = poll_seconds
+        self.providers = {}
+        self.model_buckets = {name: _bucket(values, clock) for name, values in self.limits["models"].items()}
+        self.cond = threading.Condition()
+
+    # 호출 허용을 받은 동안만 유지되는 컨텍스트 (끝나면 자리 반환)
+    @contextmanager
+    def slot(self, provider, model, on_wait=None, timeout=None):
+        ticket = self.acquire(provider, model, on_wait, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    # 호출 허용을 받을 때까지 대기. on_wait(대기 순서)는 순서가 바뀔 때마다 호출됨
+    def acquire(self, provider, model, on_wait=None, timeout=None):
+        timeout = self.limits["max_wait_seconds"] if timeout is None else timeout
+        with self.cond:
+            state = self._provider(provider)
+            ticket = Ticket(provider, model, self.clock())
+            if len(state.queue) >= self.limits["max_queue"]:
+                state.stats["rejected"] += 1
+                raise AdmissionRejected(f"대기 중인 요청이 너무 많습니다. ({provider})")
+            state.queue.append(ticket)
+            ticket.position = len(state.queue)
+            state.stats["max_queue_depth"] = max(state.stats["max_queue_depth"], len(state.queue))
+        deadline = ticket.enqueued_at + timeout
+        reported = None
+        try:
+            while True:
+                with self.cond:
+                    self._dispatch(state)
+                    if ticket.admitted:
+                        return ticket
+                    now = self.clock()
+                    if now >= deadline:
+                        state.queue.remove(ticket)
+                        state.stats["timed_out"] += 1
+                        raise AdmissionTimeout(f"{round(timeout)}초 동안 차례가 오지 않았습니다. ({provider})")
+                    position = state.queue.index(ticket) + 1
+                    next_check = min(self.poll_seconds, deadline - now, self._next_token_wait(state, now))
+                if on_wait is not None and position != reported:
+                    on_wait(position)
+                    reported = position
+                with self.cond:
+                    if not ticket.admitted:
+                        self.cond.wait(max(next_check, 0.01))
+        except BaseException:
+            # 화면이 다시 실행되는 등으로 기다리기를 멈추면 대기열에서 빼거나, 이미 허용받은 자리는 반환
+            with self.cond:
+                if ticket in state.queue:
+                    state.queue.remove(ticket)
+            if ticket.admitted:
+                self.release(ticket)
+            raise
+
+    # 기다리지 않고 바로 허용받을 수 있을 때만 허용 (대기 중인 요청이 있으면 None)
+    def try_acquire(self, provider, model):
+        with self.cond:
+            state = self._provider(provider)
+            if state.queue:
+                return None
+            ticket = Ticket(provider, model, self.clock())
+            ticket.position = 1
+            state.queue.append(ticket)
+            self._dispatch(state)
+            if not ticket.admitted:
+                state.queue.remove(ticket)
+                return None
+            return ticket
+
+    def release(self, ticket):
+        with self.cond:
+            state = self._provider(ticket.provider)
+            state.in_flight -= 1
+            self._dispatch(state)
+            self.cond.notify_all()
+
+    # 제공자가 429를 돌려줬을 때 호출 (해당 제공자/모델 버킷을 비움)
+    def throttle(self, provider, model):
+        with self.cond:
+            now = self.clock()
+            state = self._provider(provider)
+            state.stats["rate_limited"] += 1
+            for bucket in (state.bucket, self.model_buckets.get(model)):
+                if bucket is not None:
+                    bucket.drain(now)
+
+    # 제공자별 현재 상태와 누적 통계 (대기열 길이, 진행 중인 호출 수, 대기 시간 백분위)
+    def snapshot(self):
+        with self.cond:
+            rows = []
+            for provider, state in sorted(self.providers.items()):
+                waits = sorted(state.waits)
+                rows.append({
+                    "provider": provider,
+                    "queue_depth": len(state.queue),
+                    "in_flight": state.in_flight,
+                    "max_concurrent": state.max_concurrent,
+                    **state.stats,
+                    "wait_ms_p50": _percentile(waits, 50),
+                    "wait_ms_p95": _percentile(waits, 95),
+                    "wait_ms_max": waits[-1] if waits else None,
+                })
+            return rows
+
+    def _provider(self, provider):
+        state = self.providers.get(provider)
+        if state is None:
+            limits = self.limits["providers"].get(provider, DEFAULT_PROVIDER_LIMITS)
+            state = self.providers[provider] = _ProviderState(limits, self.clock)
+        return state
+
+    # 대기열 앞에서부터 보낼 수 있는 요청 허용 (잠금을 잡은 상태에서 호출)
+    def _dispatch(self, state):
+        now = self.clock()
+        for ticket in list(state.queue):
+            if state.in_flight >= state.max_concurrent:
+                break
+            if state.bucket is not None and not state.bucket.available(now):
+                break
+            model_bucket = self.model_buckets.get(ticket.model)
+            if model_bucket is not None and not model_bucket.available(now):
+                continue
+            if state.bucket is not None:
+                state.bucket.take(now)
+            if model_bucket is not None:
+                model_bucket.take(now)
+            state.queue.remove(ticket)
+            state.in_flight += 1
+            state.stats["admitted"] += 1
+            ticket.admitted_at = now
+            state.waits.append(ticket.wait_ms)
+
+    # 속도 제한에 걸려 기다리는 경우 다음 토큰이 생길 때까지의 시간
+    def _next_token_wait(self, state, now):
+        buckets = [state.bucket] + [self.model_buckets.get(ticket.model) for ticket in state.queue]
+        waits = [bucket.wait_time(now) for bucket in buckets if bucket is not None]
+        return max(min([self.poll_seconds] + [wait for wait in waits if wait > 0]), 0.01)
+
+def _percentile(sorted_values, percentile):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))]
@@ -1,29 +1,34 @@
 import streamlit as st
-from anthropic import Anthropic
 import os
-from openai import OpenAI
-import google.generativeai as genai
-import re
-import requests
 from pymongo import MongoClient
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 import urllib.parse
-from datetime import datetime, timedelta
-from google.oauth2.service_account import Credentials
-import gspread
-from google.auth.exceptions import GoogleAuthError
+from datetime import datetime
 import traceback
-import pandas as pd
-import base64  # For QR code image display
 import json
-from google.cloud import storage
-import io
+import threading
+import time
+from schema import ensure_indexes
+from chat_engine import MODEL_REGISTRY, ChatUsage, LazyClient, UnsupportedModelError, build_chat_engine
+from stream_renderer import StreamRenderer
+from admission import AdmissionError, ConcurrencyGovernor, is_rate_limit_error
+from resilience import CircuitOpenError, Resilience, StreamDeadlineExceeded
+from image_jobs import (JOB_DONE, JOB_GENERATING, JOB_PENDING, JOB_UPLOADING, THUMBNAIL_SIZES, ImageJobQueue, ImagePipeline,
+                        is_image_request, safe_image_prompt)
+from catalog import SharedChatbotCatalog
+from chatbot_store import (append_public_chat_history, chatbot_owner, list_chatbot_cards, list_user_chatbots,
+                           load_chat_config, load_user)
+from qr_code import QRCodeError, make_qr_png
+from response_cache import CACHE_MODE_OFF, CACHE_MODE_SEMANTIC, CACHE_MODES, ResponseCache
+from usage_stats import (build_usage_match, log_usage, rebuild_daily_rollups, ttft_percentile,
+                         usage_counts_by_day, usage_counts_by_user, usage_totals_by_model)
 
 # 전역 변수로 db 선언
 db = None
 
-# Streamlit 페이지 설정
-st.set_page_config(page_title="Chatbot Platform", page_icon=":robot_face:", layout="wide")
+# Streamlit 페이지 설정 (아이콘은 이모지 문자로 지정: 단축 코드는 이미지로 처리하려고 numpy/PIL을 불러옴)
+st.set_page_config(page_title="Chatbot Platform", page_icon="🤖", layout="wide")
 
 # CSS 스타일 추가
 st.markdown("""
@@ -53,6 +58,10 @@ st.markdown("""
         height: 160px;
         overflow: hidden;
     }
+    /* 썸네일용 picture 태그는 레이아웃에 영향을 주지 않도록 함 */
+    .chatbot-card picture, .chatbot-title picture {
+        display: contents;
+    }
     .chatbot-card img {
         width: 100px;
         height: 100px;
@@ -112,278 +121,348 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# MongoDB 연결
-try:
-    MONGO_URI = os.environ.get("MONGO_URI")
-    client = MongoClient(MONGO_URI)
-    db = client.get_database("chatbot_platform")
-except Exception as e:
-    st.error("데이터베이스 연결에 실패했습니다. 관리자에게 문의해주세요.")
-    db = None
-
-# API 키 가져오기
+# 외부 서비스 연결 (프로세스 단위 캐시)
+# Streamlit은 클릭/채팅마다 스크립트 전체를 다시 실행하므로, 클라이언트는 st.cache_resource로
+# 프로세스당 한 번만 만들고 모든 세션이 공유합니다. 생성 중 예외가 발생하면 캐시에 저장되지 않으므로
+# 다음 실행 때 자동으로 다시 연결을 시도하며, 사용 중 오류가 나면 해당 함수의 .clear()로 재연결합니다.
+# SDK import와 인증은 해당 서비스를 처음 쓰는 화면에서 합니다. (모델 SDK: 그 모델로 처음 답할 때, Google Sheets: 로그인/
+# 비밀번호 변경, Cloud Storage: 이미지 생성, pandas: 사용량 페이지) 공개 챗봇 URL로 들어온 학생의 첫 화면은 MongoDB만 사용합니다.
+MONGO_URI = os.environ.get("MONGO_URI")
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+# 모델 API 요청 하나의 최대 시간 (초). 재시도는 SDK가 아닌 resilience.py에서 처리
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.environ.get("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
 
-if not (ANTHROPIC_API_KEY and OPENAI_API_KEY and GEMINI_API_KEY):
-    st.error("하나 이상의 API 키가 설정되지 않았습니다. 환경 변수를 확인해주세요.")
-    st.stop()
-
-# API 클라이언트 설정
-try:
-    anthropic_client = Anthropic(api_key=ANTHROPIC_API_KEY)
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
+GOOGLE_SCOPES = [
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/drive',
+    'https://www.googleapis.com/auth/devstorage.read_write'  # Cloud Storage 접근 권한 추가
+]
+sheet_url = "https://docs.google.com/spreadsheets/d/1ql6GXd3KYPywP3wNeXrgJTfWf8aCP8fGXUvGYbmlmic/edit?gid=0"
+
+# MongoDB 클라이언트 (커넥션 풀을 세션 간에 재사용)
+@st.cache_resource(show_spinner=False)
+def get_mongo_db():
+    mongo_client = MongoClient(MONGO_URI)
+    return mongo_client.get_database("chatbot_platform")
+
+# LLM API 클라이언트
+@st.cache_resource(show_spinner=False)
+def get_anthropic_client():
+    from anthropic import Anthropic
+    return Anthropic(api_key=ANTHROPIC_API_KEY, timeout=LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0)
+
+@st.cache_resource(show_spinner=False)
+def get_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY, timeout=LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0)
+
+# Gemini 모듈 (API 키 설정 후 반환)
+@st.cache_resource(show_spinner=False)
+def configure_gemini():
+    import google.generativeai as genai
     genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    st.error("API 클라이언트 초기화에 실패했습니다. 관리자에게 문의해주세요.")
-    st.stop()
-
-# Google Sheets API 및 Google Cloud Storage 설정
-try:
-    scope = [
-        'https://spreadsheets.google.com/feeds',
-        'https://www.googleapis.com/auth/drive',
-        'https://www.googleapis.com/auth/devstorage.read_write'  # Cloud Storage 접근 권한 추가
-    ]
-    service_account_info = os.environ.get("GCP_SERVICE_ACCOUNT_KEY")
-    service_account_info = json.loads(service_account_info)  # JSON 문자열을 딕셔너리로 변환
-
-    creds = Credentials.from_service_account_info(service_account_info, scopes=scope)
+    return genai
+
+# Google 서비스 계정 인증 정보
+@st.cache_resource(show_spinner=False)
+def get_google_credentials():
+    from google.oauth2.service_account import Credentials
+    service_account_info = json.loads(os.environ.get("GCP_SERVICE_ACCOUNT_KEY"))  # JSON 문자열을 딕셔너리로 변환
+    creds = Credentials.from_service_account_info(service_account_info, scopes=GOOGLE_SCOPES)
+    return creds, service_account_info['project_id']
+
+# Google Cloud Storage 클라이언트
+@st.cache_resource(show_spinner=False)
+def get_storage_client():
+    from google.cloud import storage
+    creds, project_id = get_google_credentials()
+    return storage.Client(credentials=creds, project=project_id)
+
+# 사용자 스프레드시트 (워크시트 객체를 캐시하여 매 실행마다 open_by_url 호출을 피함)
+@st.cache_resource(show_spinner=False)
+def get_sheet():
+    import gspread
+    creds, _ = get_google_credentials()
     gs_client = gspread.authorize(creds)
+    return gs_client.open_by_url(sheet_url).sheet1
 
-    # Google Cloud Storage 클라이언트 설정
-    try:
-        storage_client = storage.Client(credentials=creds, project=service_account_info['project_id'])
-    except Exception as e:
-        st.error(f"Google Cloud Storage 클라이언트 초기화에 실패했습니다: {str(e)}")
-        storage_client = None
-
-    # 스프레드시트 열기
-    sheet_url = "https://docs.google.com/spreadsheets/d/1ql6GXd3KYPywP3wNeXrgJTfWf8aCP8fGXUvGYbmlmic/edit?gid=0"
+# 스프레드시트 열기 (로그인/비밀번호 변경 때만 호출, 실패하면 오류를 표시하고 None 반환)
+def load_sheet():
+    import gspread
+    from google.auth.exceptions import GoogleAuthError
     try:
-        sheet = gs_client.open_by_url(sheet_url).sheet1
+        return get_sheet()
     except gspread.exceptions.SpreadsheetNotFound:
         st.error(f"스프레드시트를 찾을 수 없습니다. URL을 확인해주세요: {sheet_url}")
-        sheet = None
     except gspread.exceptions.NoValidUrlKeyFound:
         st.error(f"올바르지 않은 스프레드시트 URL입니다: {sheet_url}")
-        sheet = None
     except gspread.exceptions.APIError as e:
         if 'PERMISSION_DENIED' in str(e):
             st.error("스프레드시트에 접근할 권한이 없습니다. 서비스 계정 이메일을 스프레드시트의 공유 설정에 추가했는지 확인해주세요.")
         else:
             st.error(f"Google Sheets API 오류: {str(e)}")
-        sheet = None
-except GoogleAuthError as e:
-    st.error(f"Google 인증 오류: {str(e)}")
-    sheet = None
-except Exception as e:
-    st.error(f"Google Sheets 설정 중 오류가 발생했습니다: {str(e)}")
-    st.error(traceback.format_exc())  # 예외의 상세 정보 출력
-    sheet = None
+    except GoogleAuthError as e:
+        st.error(f"Google 인증 오류: {str(e)}")
+    except Exception as e:
+        st.error(f"Google Sheets 설정 중 오류가 발생했습니다: {str(e)}")
+        st.error(traceback.format_exc())  # 예외의 상세 정보 출력
+    return None
 
-# 모델 선택 드롭다운
-MODEL_OPTIONS = [
-    "gpt-4o",
-    "gpt-4o-mini",
-    "gemini-pro",
-    "gemini-1.5-pro-latest",
-    "claude-3-5-sonnet-20240620",
-    "claude-3-opus-20240229",
-    "claude-3-haiku-20240307"
-]
+# Cloud Storage 클라이언트 열기 (이미지 생성 때만 호출, 실패하면 오류를 표시하고 None 반환)
+def load_storage_client():
+    try:
+        return get_storage_client()
+    except Exception as e:
+        st.error(f"Google Cloud Storage 클라이언트 초기화에 실패했습니다: {str(e)}")
+        return None
 
-# 이미지 생성 관련 키워드와 패턴
-IMAGE_PATTERNS = [
-    r'(이미지|그림|사진|웹툰).*?(그려|만들어|생성|출력)',
-    r'(그려|만들어|생성|출력).*?(이미지|그림|사진|웹툰)',
-    r'(시각화|시각적).*?(표현|묘사)',
-    r'비주얼.*?(만들어|생성)',
-    r'(그려|만들어|생성|출력)[줘라]',
-    r'(이미지|그림|사진|웹툰).*?(보여)',
-]
+# MongoDB 연결
+try:
+    db = get_mongo_db()
+except Exception as e:
+    st.error("데이터베이스 연결에 실패했습니다. 관리자에게 문의해주세요.")
+    db = None
 
-# 이미지 생성 요청 확인 함수
-def is_image_request(text):
-    return any(re.search(pattern, text, re.IGNORECASE) for pattern in IMAGE_PATTERNS)
+# 대화 내역 및 사용량 기록 보존 기간 (기본 30일)
+CHAT_HISTORY_RETENTION_DAYS = int(os.environ.get("CHAT_HISTORY_RETENTION_DAYS", "30"))
 
-# 이미지 업로드 함수 추가
-def upload_image_to_gcs(image_data, filename):
-    try:
-        bucket_name = 'sawlteacher'  # 버킷 이름을 정확히 입력하세요
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(filename)
-        blob.upload_from_string(image_data, content_type='image/png')
-        # blob.make_public() 호출 제거
-        # 업로드한 객체의 공개 URL 생성
-        public_url = f"https://storage.googleapis.com/{bucket_name}/{filename}"
-        return public_url
-    except Exception as e:
-        st.error(f"이미지를 Cloud Storage에 업로드하는 중 오류가 발생했습니다: {str(e)}")
+# API 키 확인
+if not (ANTHROPIC_API_KEY and OPENAI_API_KEY and GEMINI_API_KEY):
+    st.error("하나 이상의 API 키가 설정되지 않았습니다. 환경 변수를 확인해주세요.")
+    st.stop()
+
+# 모델 선택 드롭다운
+MODEL_OPTIONS = list(MODEL_REGISTRY)
+
+# 이미지 생성 작업 설정
+IMAGE_BUCKET_NAME = 'sawlteacher'
+IMAGE_JOB_WORKERS = int(os.environ.get("IMAGE_JOB_WORKERS", "4"))
+IMAGE_JOB_TIMEOUT_SECONDS = int(os.environ.get("IMAGE_JOB_TIMEOUT_SECONDS", "180"))
+IMAGE_JOB_POLL_SECONDS = 0.5
+IMAGE_JOB_STATUS_MESSAGES = {
+    JOB_PENDING: "이미지 생성 대기 중...",
+    JOB_GENERATING: "이미지 생성 중...",
+    JOB_UPLOADING: "이미지 저장 중...",
+}
+
+# 이미지 생성 작업 기록 저장 (작업자 스레드에서 호출, 단계별 소요 시간 포함)
+# 생성 호출 횟수와 재시도/서킷 브레이커 기록은 usage_logs에도 남깁니다.
+def save_image_job(job):
+    if db is not None:
+        db.image_jobs.insert_one(job.to_record())
+        if job.usage is not None:
+            log_usage(db, job.owner, job.usage.model, job.created_at, usage=job.usage)
+
+# 이미지 생성 작업 큐 (프로세스당 하나)
+@st.cache_resource(show_spinner=False)
+def get_image_job_queue():
+    return ImageJobQueue(ImagePipeline(IMAGE_BUCKET_NAME, resilience=get_resilience(), job_timeout=IMAGE_JOB_TIMEOUT_SECONDS),
+                         IMAGE_JOB_WORKERS, on_finish=save_image_job)
+
+# 이미지 생성 작업 등록 함수 (작업 ID 반환, thumbnail_sizes를 주면 썸네일도 생성)
+def submit_image_job(prompt, thumbnail_sizes=()):
+    owner = st.session_state.user["username"] if st.session_state.get('user') else st.session_state.get('user_name')
+    return get_image_job_queue().submit(safe_image_prompt(prompt), get_openai_client(), load_storage_client(), owner, thumbnail_sizes)
+
+# 이미지 생성 작업 결과 기다리기 함수 (성공하면 작업, 실패하면 None 반환)
+# 스크립트 스레드는 작업 상태만 주기적으로 확인해 표시하고, 실제 생성/다운로드/업로드는 작업자 스레드에서 진행됩니다.
+def wait_for_image_job(job_id):
+    queue = get_image_job_queue()
+    deadline = time.monotonic() + IMAGE_JOB_TIMEOUT_SECONDS
+    status_placeholder = st.empty()
+    job = queue.get(job_id)
+    while job is not None and not job.finished and time.monotonic() < deadline:
+        status_placeholder.caption(IMAGE_JOB_STATUS_MESSAGES.get(job.status, ""))
+        job = queue.wait(job_id, IMAGE_JOB_POLL_SECONDS)
+    status_placeholder.empty()
+    if job is None or not job.finished:
+        st.error("이미지 생성 시간이 초과되었습니다. 다시 시도해주세요.")
         return None
+    if job.status == JOB_DONE:
+        return job
+    if job.error_stage == "upload":
+        # 다음 실행에서 클라이언트를 새로 만들도록 캐시 초기화
+        get_storage_client.clear()
+        st.error(f"이미지를 Cloud Storage에 업로드하는 중 오류가 발생했습니다: {job.error}")
+    elif job.error_stage == "download":
+        st.error(f"이미지 다운로드에 실패했습니다. 오류: {job.error}")
+    else:
+        st.error(f"이미지 생성에 실패했습니다. 다시 시도해주세요. 오류: {job.error}")
+    return None
 
-# DALL-E를 사용한 이미지 생성 함수 수정
+# DALL-E를 사용한 이미지 생성 함수 (작업 큐에 등록하고 결과를 기다림)
 def generate_image(prompt):
+    job = wait_for_image_job(submit_image_job(prompt))
+    return job.url if job else None
+
+# 프로필 이미지 생성 함수 (이미지 URL과 카드용 썸네일 URL 반환)
+def generate_profile_image(prompt):
+    job = wait_for_image_job(submit_image_job(prompt, THUMBNAIL_SIZES))
+    return (job.url, job.thumbnails) if job else (None, {})
+
+# 프로필 이미지 HTML (썸네일이 있으면 WebP 썸네일과 PNG 대체 이미지를 사용)
+def profile_image_html(chatbot, size):
+    thumbnails = (chatbot.get('profile_thumbnails') or {}).get(str(size))
+    if thumbnails:
+        return (f'<picture><source srcset="{thumbnails["webp"]}" type="image/webp">'
+                f'<img src="{thumbnails["png"]}" alt="프로필 이미지"></picture>')
+    return f'<img src="{chatbot.get("profile_image_url", f"https://via.placeholder.com/{size}")}" alt="프로필 이미지">'
+
+# 계정 정보 동기화 주기 (초)
+CREDENTIAL_SYNC_SECONDS = int(os.environ.get("CREDENTIAL_SYNC_SECONDS", "600"))
+# 저장소에 없는 아이디로 로그인할 때, 마지막 동기화가 이 시간(초)보다 오래되었으면 즉시 다시 동기화
+CREDENTIAL_MISS_RESYNC_SECONDS = 60
+
+# 계정 정보 저장소 (프로세스당 하나)
+# accounts: 아이디 -> {"row": 시트 행 번호, "password": 비밀번호}
+@st.cache_resource(show_spinner=False)
+def get_credential_store():
+    return {"accounts": None, "id_col": None, "password_col": None, "synced_at": 0.0, "syncing": False, "lock": threading.Lock()}
+
+# 스프레드시트 계정 정보 동기화 함수
+# 시트를 한 번 읽어 아이디를 키로 하는 딕셔너리를 만든 뒤 통째로 교체하므로, 동기화 중에도 기존 데이터로 조회할 수 있습니다.
+def sync_credentials(store, worksheet):
+    with store["lock"]:
+        values = worksheet.get_all_values()
+        if not values:
+            raise ValueError("스프레드시트에 데이터가 없습니다.")
+        lower_keys = [header.strip().lower() for header in values[0]]
+        if '아이디' not in lower_keys:
+            raise ValueError("스프레드시트에 '아이디' 열이 없습니다.")
+        if '비밀번호' not in lower_keys:
+            raise ValueError("스프레드시트에 '비밀번호' 열이 없습니다.")
+        id_index = lower_keys.index('아이디')
+        password_index = lower_keys.index('비밀번호')
+
+        accounts = {}
+        for row_number, row in enumerate(values[1:], start=2):  # 헤더를 고려하여 2행부터
+            username = row[id_index] if len(row) > id_index else ''
+            if username and username not in accounts:
+                password = row[password_index] if len(row) > password_index else ''
+                accounts[username] = {"row": row_number, "password": password}
+
+        store["accounts"] = accounts
+        store["id_col"] = id_index + 1
+        store["password_col"] = password_index + 1
+        store["synced_at"] = time.time()
+
+# 백그라운드 동기화 함수 (실패하면 기존 데이터를 계속 사용)
+def sync_credentials_in_background(store, worksheet):
     try:
-        clean_prompt = re.sub(r'(이미지|그림|사진|웹툰).*?(그려|만들어|생성|출력|보여)[줘라]?', '', prompt).strip()
-        safe_prompt = f"Create a safe and appropriate image based on this description: {clean_prompt}. The image should be family-friendly and avoid any controversial or sensitive content."
-        response = openai_client.images.generate(
-            model="dall-e-3",
-            prompt=safe_prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1,
-        )
-        image_url = response.data[0].url
-        # 이미지 다운로드
-        image_response = requests.get(image_url)
-        if image_response.status_code == 200:
-            image_data = image_response.content
-            # 고유한 파일 이름 생성
-            filename = f"images/{datetime.now().strftime('%Y%m%d%H%M%S%f')}.png"
-            # Google Cloud Storage에 업로드
-            public_url = upload_image_to_gcs(image_data, filename)
-            if public_url:
-                return public_url
-            else:
-                return None
-        else:
-            st.error("이미지 다운로드에 실패했습니다.")
+        sync_credentials(store, worksheet)
+    except Exception:
+        pass
+    finally:
+        store["syncing"] = False
+
+# 계정 정보 조회 함수
+# 처음 한 번만 시트를 직접 읽고, 이후에는 메모리의 딕셔너리를 사용하며 주기가 지나면 백그라운드에서 갱신합니다.
+def get_credentials(force_sync=False):
+    store = get_credential_store()
+    if store["accounts"] is None or force_sync:
+        sheet = load_sheet()
+        if sheet is None:
+            st.error("Google Sheets 연결에 실패하여 사용자 데이터를 불러올 수 없습니다.")
             return None
-    except Exception as e:
-        st.error(f"이미지 생성에 실패했습니다. 다시 시도해주세요. 오류: {str(e)}")
-        return None
-
-# 사용자 데이터 캐싱 함수
-@st.cache_data(ttl=600)
-def get_users_data():
-    if sheet is None:
-        st.error("Google Sheets 연결에 실패하여 사용자 데이터를 불러올 수 없습니다.")
-        return None
-    try:
-        # 모든 데이터를 가져옵니다.
-        values = sheet.get_all_values()
-        if not values:
-            st.error("스프레드시트에 데이터가 없습니다.")
+        try:
+            sync_credentials(store, sheet)
+        except Exception as e:
+            # 다음 실행에서 스프레드시트를 다시 열도록 캐시 초기화
+            get_sheet.clear()
+            st.error(f"사용자 데이터 불러오기 중 오류가 발생했습니다: {str(e)}")
             return None
-        headers = [header.strip() for header in values[0]]
-        data_rows = values[1:]
-        records = []
-        for row in data_rows:
-            # 행의 길이를 헤더의 길이에 맞춥니다.
-            if len(row) < len(headers):
-                row.extend([''] * (len(headers) - len(row)))
-            elif len(row) > len(headers):
-                row = row[:len(headers)]
-            record = dict(zip(headers, row))
-            records.append(record)
-        return records
-    except Exception as e:
-        st.error(f"사용자 데이터 불러오기 중 오류가 발생했습니다: {str(e)}")
-        return None
+    elif time.time() - store["synced_at"] > CREDENTIAL_SYNC_SECONDS and not store["syncing"]:
+        sheet = load_sheet()
+        if sheet is not None:
+            store["syncing"] = True
+            threading.Thread(target=sync_credentials_in_background, args=(store, sheet), daemon=True).start()
+    return store["accounts"]
+
+# 계정 조회 함수 (없으면 최근에 동기화하지 않은 경우에 한해 한 번 더 동기화)
+def find_account(username):
+    accounts = get_credentials()
+    if accounts is None:
+        return None, None
+    account = accounts.get(username)
+    if account is None and time.time() - get_credential_store()["synced_at"] > CREDENTIAL_MISS_RESYNC_SECONDS:
+        accounts = get_credentials(force_sync=True)
+        if accounts is None:
+            return None, None
+        account = accounts.get(username)
+    return accounts, account
 
 # 로그인 함수 수정
 def login(username, password):
-    users_data = get_users_data()
-    if users_data is None:
+    accounts, account = find_account(username)
+    if accounts is None:
         st.error("사용자 데이터를 불러올 수 없어 로그인할 수 없습니다.")
         return None
 
     try:
-        if not users_data:
+        if not accounts:
             st.error("사용자 데이터가 비어 있습니다.")
             return None
 
-        # 첫 번째 행의 키(헤더)를 가져옵니다.
-        first_row_keys = list(users_data[0].keys())
-        # 키를 모두 소문자로 변환하여 비교합니다.
-        lower_keys = [key.lower() for key in first_row_keys]
-
-        # '아이디'와 '비밀번호' 키가 있는지 확인합니다.
-        if '아이디' in lower_keys:
-            id_key = first_row_keys[lower_keys.index('아이디')]
-        else:
-            st.error("스프레드시트에 '아이디' 열이 없습니다.")
-            return None
-
-        if '비밀번호' in lower_keys:
-            password_key = first_row_keys[lower_keys.index('비밀번호')]
-        else:
-            st.error("스프레드시트에 '비밀번호' 열이 없습니다.")
-            return None
-
         # 사용자 찾기
-        for row in users_data:
-            if row.get(id_key) == username:
-                if row.get(password_key) == password:
-                    if password == "1111":
-                        return "change_password"
-                    # 데이터베이스에서 사용자 정보 가져오기
-                    if db is not None:
-                        user = db.users.find_one({"username": username})
-                        if user:
-                            return user
-                        else:
-                            # 사용자 정보가 없으면 새로 생성
-                            new_user = {"username": username, "chatbots": []}
-                            db.users.insert_one(new_user)
-                            return new_user
-                    else:
-                        return {"username": username, "chatbots": []}
-                else:
-                    st.error("비밀번호가 잘못되었습니다.")
-                    return None
-        else:
+        if account is None:
             st.error("아이디를 찾을 수 없습니다.")
             return None
+        if account["password"] != password:
+            st.error("비밀번호가 잘못되었습니다.")
+            return None
+        if password == "1111":
+            return "change_password"
+        # 데이터베이스에서 사용자 정보 가져오기
+        if db is not None:
+            # 사용자 정보와 카드 필드만 담은 챗봇 목록 (없으면 새로 생성)
+            user = load_user(db, username)
+            user["chatbots"] = load_user_chatbots(username)
+            return user
+        else:
+            return {"username": username, "chatbots": []}
     except Exception as e:
         st.error(f"로그인 중 오류가 발생했습니다: {str(e)}")
     return None
 
 # 비밀번호 변경 함수 수정
 def change_password(username, new_password):
-    users_data = get_users_data()
-    if users_data is None:
+    accounts, account = find_account(username)
+    if accounts is None:
         st.error("사용자 데이터를 불러올 수 없어 비밀번호를 변경할 수 없습니다.")
         return False
 
     try:
-        if not users_data:
+        if not accounts:
             st.error("사용자 데이터가 비어 있습니다.")
             return False
-
-        # 첫 번째 행의 키(헤더)를 가져옵니다.
-        first_row_keys = list(users_data[0].keys())
-        # 키를 모두 소문자로 변환하여 비교합니다.
-        lower_keys = [key.lower() for key in first_row_keys]
-
-        # '아이디'와 '비밀번호' 키가 있는지 확인합니다.
-        if '아이디' in lower_keys:
-            id_key = first_row_keys[lower_keys.index('아이디')]
-        else:
-            st.error("스프레드시트에 '아이디' 열이 없습니다.")
-            return False
-
-        if '비밀번호' in lower_keys:
-            password_key = first_row_keys[lower_keys.index('비밀번호')]
-        else:
-            st.error("스프레드시트에 '비밀번호' 열이 없습니다.")
+        if account is None:
             return False
 
-        # 사용자 찾기
-        for idx, row in enumerate(users_data):
-            if row.get(id_key) == username:
-                # 비밀번호 업데이트
-                row_number = idx + 2  # 헤더를 고려하여 +2
-                col_number = lower_keys.index('비밀번호') + 1  # 인덱스가 0부터 시작하므로 +1
-                sheet.update_cell(row_number, col_number, new_password)
-                # 캐시 데이터 갱신
-                get_users_data.clear()
-                return True
-        else:
+        store = get_credential_store()
+        sheet = load_sheet()
+        if sheet is None:
             return False
+        # 마지막 동기화 이후 시트의 행이 바뀌었으면 다시 동기화하여 행 번호를 갱신
+        if sheet.cell(account["row"], store["id_col"]).value != username:
+            accounts = get_credentials(force_sync=True)
+            if not accounts or username not in accounts:
+                return False
+        # 시트 쓰기와 저장소 갱신을 동기화와 같은 잠금 안에서 처리
+        # (쓰기 전에 시트를 읽은 백그라운드 동기화가 나중에 저장소를 옛 비밀번호로 바꾸지 않도록 함)
+        with store["lock"]:
+            # 그사이 동기화로 저장소가 교체되었을 수 있으므로 현재 저장소의 계정을 사용
+            account = (store["accounts"] or {}).get(username)
+            if account is None:
+                return False
+            # 비밀번호 업데이트
+            sheet.update_cell(account["row"], store["password_col"], new_password)
+            # 저장소의 해당 계정만 갱신 (시트 전체를 다시 읽지 않음)
+            account["password"] = new_password
+        return True
     except Exception as e:
+        get_sheet.clear()
         st.error(f"비밀번호 변경 중 오류가 발생했습니다: {str(e)}")
         return False
 
@@ -445,31 +524,249 @@ def save_chat_history(chatbot_name, messages):
         except Exception as e:
             st.error(f"대화 내역 저장 중 오류가 발생했습니다: {str(e)}")
 
-# 오래된 대화 내역 삭제 함수
-def delete_old_chat_history():
-    if db is not None:
+# 개인 챗봇 목록 불러오기 함수 (세션에 보관하는 카드 필드만 조회)
+# 시스템 프롬프트 등 대화 설정은 챗봇을 열 때 find_chatbot으로 읽습니다.
+def load_user_chatbots(username):
+    if db is None:
+        return []
+    return list_user_chatbots(db, username)
+
+# admin 챗봇 목록 한 쪽당 개수
+ADMIN_CHATBOT_PAGE_SIZE = 30
+
+# 전체 개인 챗봇 목록 불러오기 함수 (admin용, 카드 필드만 페이지 단위로 조회)
+# owner를 지정하면 해당 교사의 챗봇만 조회합니다.
+def load_all_chatbots(page=1, owner=None):
+    chatbots = list_chatbot_cards(db, page, ADMIN_CHATBOT_PAGE_SIZE, owner)
+    for chatbot in chatbots:
+        chatbot["owner"] = chatbot.get("creator", "")
+    return chatbots
+
+# 챗봇 찾기 함수 (_id 문자열로 조회)
+# 세션의 챗봇 목록에는 카드 필드만 있으므로, 챗봇을 처음 열 때 대화 설정을 _id로 한 번 읽어 세션에 보관합니다.
+# 내 챗봇이 아니면 admin만 열 수 있습니다. (오프라인 모드에서는 세션의 목록이 전체 정보)
+def find_chatbot(chatbot_id):
+    if chatbot_id is None:
+        return None
+    descriptor = next((chatbot for chatbot in st.session_state.user.get("chatbots", []) if str(chatbot.get('_id')) == chatbot_id), None)
+    if db is None:
+        return descriptor
+    if descriptor is None and st.session_state.user["username"] != 'admin':
+        return None
+    opened = st.session_state.setdefault('opened_chatbots', {})
+    if chatbot_id not in opened:
         try:
-            one_month_ago = datetime.now() - timedelta(days=30)
-            db.chat_history.delete_many({"timestamp": {"$lt": one_month_ago}})
-            db.public_chat_history.delete_many({"timestamp": {"$lt": one_month_ago}})
-            db.usage_logs.delete_many({"timestamp": {"$lt": one_month_ago}})
-        except Exception as e:
-            st.error(f"오래된 대화 내역 삭제 중 오류가 발생했습니다: {str(e)}")
+            opened[chatbot_id] = load_chat_config(db, chatbot_id)
+        except InvalidId:
+            opened[chatbot_id] = None
+    return opened[chatbot_id]
+
+# 챗봇 대화 메시지 불러오기 함수
+# 세션마다 챗봇별로 한 번만 조회하고, 이후에는 세션 상태의 목록에 새 메시지를 덧붙여 사용합니다.
+def get_chatbot_messages(chatbot):
+    if db is None:
+        return chatbot.setdefault('messages', [{"role": "assistant", "content": chatbot.get('welcome_message', "안녕하세요! 무엇을 도와드릴까요?")}])
+    if 'chatbot_messages' not in st.session_state:
+        st.session_state.chatbot_messages = {}
+    key = str(chatbot['_id'])
+    if key not in st.session_state.chatbot_messages:
+        st.session_state.chatbot_messages[key] = list(db.messages.find(
+            {"chatbot_id": chatbot['_id']},
+            {"_id": 0, "role": 1, "content": 1, "image_url": 1}
+        ).sort("_id", 1))
+    return st.session_state.chatbot_messages[key]
+
+# 챗봇 대화 메시지 저장 함수 (메시지 하나당 작은 문서 하나를 추가)
+def append_chatbot_messages(chatbot, new_messages):
+    if db is None or not new_messages:
+        return
+    try:
+        now = datetime.now()
+        db.messages.insert_many([dict(message, chatbot_id=chatbot['_id'], timestamp=now) for message in new_messages])
+    except Exception as e:
+        st.error(f"대화 내용 저장 중 오류가 발생했습니다: {str(e)}")
+
+# 챗봇 대화 메시지 초기화 함수
+def reset_chatbot_messages(chatbot):
+    welcome_messages = [{"role": "assistant", "content": chatbot.get('welcome_message', "안녕하세요! 무엇을 도와드릴까요?")}]
+    if db is None:
+        chatbot['messages'] = welcome_messages
+        return
+    try:
+        db.messages.delete_many({"chatbot_id": chatbot['_id']})
+        append_chatbot_messages(chatbot, welcome_messages)
+    except Exception as e:
+        st.error(f"대화 내역 초기화 중 오류가 발생했습니다: {str(e)}")
+    if 'chatbot_messages' not in st.session_state:
+        st.session_state.chatbot_messages = {}
+    st.session_state.chatbot_messages[str(chatbot['_id'])] = welcome_messages
+
+# 인덱스 및 보존 기간 설정 함수 (프로세스당 한 번 실행)
+# 오래된 대화 내역은 페이지 렌더링 중에 delete_many로 지우지 않고, timestamp 필드의 TTL 인덱스로
+# MongoDB가 백그라운드에서 삭제합니다. 인덱스 정의는 schema.py를 참고하세요.
+@st.cache_resource(show_spinner=False)
+def bootstrap_schema(_db, retention_days):
+    ensure_indexes(_db, retention_days)
+    return True
+
+# 인덱스 및 보존 기간 적용
+if db is not None:
+    try:
+        bootstrap_schema(db, CHAT_HISTORY_RETENTION_DAYS)
+    except Exception as e:
+        st.error(f"데이터베이스 인덱스 설정 중 오류가 발생했습니다: {str(e)}")
+
+# 모델별 토큰 단가 (USD, 100만 토큰당 입력/출력)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gemini-pro": (0.50, 1.50),
+    "gemini-1.5-pro-latest": (1.25, 5.00),
+    "claude-3-5-sonnet-20240620": (3.00, 15.00),
+    "claude-3-opus-20240229": (15.00, 75.00),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+}
+
+# 프롬프트 캐시 토큰 단가 배율 (제공자별 캐시 읽기, 캐시 쓰기)
+# Claude는 input_tokens에 캐시 토큰이 빠져 있고, OpenAI/Gemini는 입력 토큰 중 일부가 캐시에서 읽힌 것으로 보고됩니다.
+CACHE_PRICE_MULTIPLIERS = {
+    "anthropic": (0.10, 1.25),
+    "openai": (0.50, 1.00),
+    "gemini": (0.25, 1.00),
+}
 
 # 사용량 기록 함수 추가
-def record_usage(username, model_name, timestamp, tokens_used=None):
+# usage_logs에 기록하고 관리자 대시보드용 일간 집계를 갱신합니다. (usage_stats.log_usage 참고)
+def record_usage(username, model_name, timestamp, tokens_used=None, usage=None, response_cache=None):
     if db is not None:
         try:
-            usage_entry = {
-                "username": username,
-                "model_name": model_name,
-                "timestamp": timestamp,
-                "tokens_used": tokens_used
-            }
-            db.usage_logs.insert_one(usage_entry)
+            log_usage(db, username, model_name, timestamp, tokens_used, usage, response_cache)
         except Exception as e:
             st.error(f"사용량 기록 중 오류가 발생했습니다: {str(e)}")
 
+# 스트리밍 응답 화면 갱신 주기 (밀리초 / 글자 수)
+STREAM_FLUSH_INTERVAL_MS = int(os.environ.get("STREAM_FLUSH_INTERVAL_MS", "200"))
+STREAM_FLUSH_CHARS = int(os.environ.get("STREAM_FLUSH_CHARS", "500"))
+
+# 모델 호출 수 제한 설정 (JSON, admission.py의 DEFAULT_LIMITS 형식으로 필요한 값만 덮어씀)
+# 예: LLM_LIMITS='{"providers": {"openai": {"max_concurrent": 10, "requests_per_minute": 200}}}'
+LLM_LIMITS = os.environ.get("LLM_LIMITS", "")
+
+# 모델 호출 수 제한 (프로세스당 하나, 모든 세션이 같은 대기열 사용)
+@st.cache_resource(show_spinner=False)
+def get_chat_governor():
+    return ConcurrencyGovernor(LLM_LIMITS)
+
+# 장애 대응 설정 (JSON, resilience.py의 DEFAULT_RESILIENCE 형식으로 필요한 값만 덮어씀)
+# 예: RESILIENCE_CONFIG='{"fallback_enabled": false, "first_token_timeout_seconds": 15}'
+RESILIENCE_CONFIG = os.environ.get("RESILIENCE_CONFIG", "")
+
+# 제공자별 서킷 브레이커와 TTFT 기록 (프로세스당 하나, 채팅과 이미지 생성이 함께 사용)
+@st.cache_resource(show_spinner=False)
+def get_resilience():
+    return Resilience(RESILIENCE_CONFIG)
+
+# 채팅 엔진 (프로세스당 하나)
+@st.cache_resource(show_spinner=False)
+def get_chat_engine():
+    return build_chat_engine(LazyClient(get_anthropic_client), LazyClient(get_openai_client), LazyClient(configure_gemini),
+                             governor=get_chat_governor(),
+                             resilience=get_resilience(), request_timeout=LLM_REQUEST_TIMEOUT_SECONDS)
+
+# 모델 응답 스트리밍 함수 (모든 채팅 화면 공통)
+# 응답을 화면에 표시하면서 사용량을 usage_owner 이름으로 기록하고, 전체 응답 텍스트를 반환합니다.
+# 화면 갱신은 STREAM_FLUSH_INTERVAL_MS 또는 STREAM_FLUSH_CHARS마다 한 번씩만 합니다. (stream_renderer.py 참고)
+# 긴 대화는 conversation_key별로 세션에 저장된 요약을 사용해 토큰 예산 안으로 줄입니다. (context_window.py 참고)
+# 요약은 답변을 표시한 뒤에 만들며, 요약 호출의 사용량도 usage_owner 이름으로 기록됩니다.
+# on_complete는 응답이 오류 없이 끝났을 때 전체 응답 텍스트로 호출됩니다.
+# 동시에 호출이 많으면 차례를 기다리는 동안 대기 순서를 보여 줍니다. (admission.py 참고)
+# 선택한 모델이 응답하지 않으면 대체 모델로 답할 수 있으며, 사용량은 실제로 답한 모델 이름으로 기록됩니다. (resilience.py 참고)
+def stream_assistant_reply(message_placeholder, messages, system_prompt, selected_model, usage_owner, conversation_key,
+                           response_cache=None, on_complete=None):
+    renderer = StreamRenderer(message_placeholder, STREAM_FLUSH_INTERVAL_MS, STREAM_FLUSH_CHARS)
+    if 'context_states' not in st.session_state:
+        st.session_state.context_states = {}
+    context_state = st.session_state.context_states.setdefault(conversation_key, {})
+    try:
+        start_time = datetime.now()
+        usage = None
+        on_wait = lambda position: message_placeholder.markdown(f"사용자가 많아 차례를 기다리는 중입니다... (대기 순서: {position}번째)")
+        for event in get_chat_engine().stream(messages, system_prompt, selected_model, context_state, on_wait=on_wait):
+            if not isinstance(event, ChatUsage):
+                renderer.append(event)
+            elif event.purpose == "summary":
+                # 답변 뒤에 대화 요약을 만든 호출의 사용량
+                record_usage(usage_owner, event.model, datetime.now(), usage=event)
+            else:
+                # 대화 요약을 만드는 동안 기다리지 않도록 답변을 먼저 마저 표시하고 기록
+                usage = event
+                renderer.finish()
+                record_usage(usage_owner, usage.model, start_time, usage=usage, response_cache=response_cache)
+        if usage is None:
+            renderer.finish()
+            record_usage(usage_owner, selected_model, start_time, response_cache=response_cache)
+        if on_complete is not None:
+            on_complete(renderer.text)
+    except UnsupportedModelError as e:
+        st.error(str(e))
+    except AdmissionError:
+        st.warning("지금 사용하는 사람이 많아 답변을 시작하지 못했습니다. 잠시 후 다시 질문해 주세요.")
+    except (CircuitOpenError, StreamDeadlineExceeded):
+        st.warning("AI 서비스가 응답하지 않고 있습니다. 잠시 후 다시 질문해 주세요.")
+    except Exception as e:
+        if is_rate_limit_error(e):
+            st.warning("AI 서비스 요청 한도에 도달했습니다. 잠시 후 다시 질문해 주세요.")
+        else:
+            st.error(f"응답 생성 중 오류가 발생했습니다: {str(e)}")
+    return renderer.text
+
+# 응답 캐시 설정 (RESPONSE_CACHE_SIMILARITY: 비슷한 질문으로 볼 글자 n-gram 코사인 유사도 기준)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.65"))
+RESPONSE_CACHE_LABELS = {
+    "off": "사용 안 함",
+    "exact": "같은 질문에 저장된 답변 사용",
+    "semantic": "비슷한 질문에도 저장된 답변 사용",
+}
+
+# 응답 캐시 (프로세스당 하나)
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    return ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SIMILARITY)
+
+# 응답 캐시를 거쳐 답변하는 함수 (공개 챗봇용)
+# 챗봇에 응답 캐시가 켜져 있으면 같은 대화 흐름에서 같은(또는 비슷한) 질문에 저장된 답변을 바로 보여 주고,
+# 없으면 모델을 호출한 뒤 답변을 저장합니다.
+def reply_with_response_cache(message_placeholder, chatbot, messages, selected_model, usage_owner, conversation_key):
+    cache_mode = chatbot.get('response_cache', CACHE_MODE_OFF)
+    if cache_mode == CACHE_MODE_OFF:
+        return stream_assistant_reply(message_placeholder, messages, chatbot['system_prompt'], selected_model, usage_owner, conversation_key)
+
+    cache = get_response_cache()
+    question = messages[-1]["content"]
+    scope = cache.scope_for(chatbot['_id'], selected_model, chatbot['system_prompt'], messages[:-1])
+    cached_response, cache_result = cache.get(scope, question, semantic=cache_mode == CACHE_MODE_SEMANTIC)
+    if cached_response is not None:
+        message_placeholder.markdown(cached_response)
+        record_usage(usage_owner, selected_model, datetime.now(), tokens_used=0, response_cache=cache_result)
+        return cached_response
+    return stream_assistant_reply(message_placeholder, messages, chatbot['system_prompt'], selected_model, usage_owner, conversation_key,
+                                  response_cache=cache_result,
+                                  on_complete=lambda response: cache.put(scope, question, response))
+
+# 예상 비용 계산 함수 (USD, 프롬프트 캐시 할인 반영)
+def estimate_cost(model_name, input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0):
+    input_price, output_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    provider = MODEL_REGISTRY.get(model_name)
+    read_multiplier, write_multiplier = CACHE_PRICE_MULTIPLIERS.get(provider, (1.0, 1.0))
+    input_tokens, cache_read_tokens, cache_write_tokens = input_tokens or 0, cache_read_tokens or 0, cache_write_tokens or 0
+    if provider == "anthropic":
+        input_cost = input_tokens + cache_read_tokens * read_multiplier + cache_write_tokens * write_multiplier
+    else:
+        input_cost = input_tokens - cache_read_tokens + cache_read_tokens * read_multiplier
+    return (input_cost * input_price + (output_tokens or 0) * output_price) / 1_000_000
+
 # 홈 페이지 (기본 챗봇)
 def show_home_page():
     st.title("Default 봇")
@@ -505,42 +802,7 @@ def show_home_page():
                         full_response = "죄송합니다. 이미지 생성 중 오류가 발생했습니다. 다른 주제로 시도해 보시거나, 요청을 더 구체적으로 해주세요."
                         st.session_state.home_messages.append({"role": "assistant", "content": full_response})
             else:
-                try:
-                    start_time = datetime.now()
-                    if "gpt" in selected_model:
-                        response = openai_client.chat.completions.create(
-                            model=selected_model,
-                            messages=[{"role": "system", "content": "당신은 도움이 되는 AI 어시스턴트입니다."}] + st.session_state.home_messages,
-                            stream=True
-                        )
-                        for chunk in response:
-                            if chunk.choices[0].delta.content is not None:
-                                full_response += chunk.choices[0].delta.content
-                                message_placeholder.markdown(full_response + "▌")
-                        # 사용량 기록
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                    elif "gemini" in selected_model:
-                        model = genai.GenerativeModel(selected_model)
-                        response = model.generate_content(prompt, stream=True)
-                        for chunk in response:
-                            if chunk.text:
-                                full_response += chunk.text
-                                message_placeholder.markdown(full_response + "▌")
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                    elif "claude" in selected_model:
-                        with anthropic_client.messages.stream(
-                            max_tokens=1000,
-                            messages=st.session_state.home_messages,
-                            model=selected_model,
-                            system="당신은 도움이 되는 AI 어시스턴트입니다.",
-                        ) as stream:
-                            for text in stream.text_stream:
-                                full_response += text
-                                message_placeholder.markdown(full_response + "▌")
-                        message_placeholder.markdown(full_response)
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                except Exception as e:
-                    st.error("응답 생성 중 오류가 발생했습니다. 다시 시도해주세요.")
+                full_response = stream_assistant_reply(message_placeholder, st.session_state.home_messages, "당신은 도움이 되는 AI 어시스턴트입니다.", selected_model, st.session_state.user["username"], "home")
 
                 if full_response:
                     st.session_state.home_messages.append({"role": "assistant", "content": full_response})
@@ -562,6 +824,8 @@ def show_create_chatbot_page():
     welcome_message = st.text_input("웰컴 메시지", value="안녕하세요! 무엇을 도와드릴까요?")
     is_shared = st.checkbox("다른 교사와 공유하기")
     background_color = st.color_picker("챗봇 카드 배경색 선택", "#FFFFFF")
+    response_cache = st.selectbox("응답 캐시 (URL로 접속한 학생의 반복 질문)", CACHE_MODES, format_func=RESPONSE_CACHE_LABELS.get,
+                                  help="같은 대화 흐름에서 이미 답한 질문에는 모델을 다시 호출하지 않고 저장된 답변을 보여 줍니다.")
 
     if 'temp_profile_image_url' not in st.session_state:
         st.session_state.temp_profile_image_url = "https://via.placeholder.com/100"
@@ -571,7 +835,7 @@ def show_create_chatbot_page():
     if is_shared:
         # 기존 범주 가져오기
         if db is not None:
-            existing_categories = db.shared_chatbots.distinct('category')
+            existing_categories = get_shared_catalog().category_names()
         else:
             existing_categories = []
         category_option = st.selectbox('챗봇 범주 선택', options=existing_categories + ['새 범주 입력'])
@@ -585,9 +849,10 @@ def show_create_chatbot_page():
     if st.button("프로필 이미지 생성"):
         with st.spinner("프로필 이미지를 생성 중입니다. 잠시만 기다려주세요..."):
             profile_image_prompt = f"Create a profile image for a chatbot named '{chatbot_name}'. Description: {chatbot_description}"
-            generated_image_url = generate_image(profile_image_prompt)
+            generated_image_url, generated_thumbnails = generate_profile_image(profile_image_prompt)
             if generated_image_url:
                 st.session_state.temp_profile_image_url = generated_image_url
+                st.session_state.temp_profile_thumbnails = generated_thumbnails
                 st.success("프로필 이미지가 생성되었습니다.")
             else:
                 st.error("프로필 이미지 생성에 실패했습니다. 기본 이미지가 사용됩니다.")
@@ -605,7 +870,9 @@ def show_create_chatbot_page():
             "creator": st.session_state.user["username"],
             "is_shared": is_shared,
             "background_color": background_color,
-            "profile_image_url": st.session_state.temp_profile_image_url
+            "profile_image_url": st.session_state.temp_profile_image_url,
+            "profile_thumbnails": st.session_state.get('temp_profile_thumbnails', {}),
+            "response_cache": response_cache
         }
         if is_shared:
             new_chatbot['category'] = category  # 범주 추가
@@ -613,27 +880,29 @@ def show_create_chatbot_page():
         if db is not None:
             try:
                 if is_shared:
+                    # 공유 챗봇의 대화는 세션마다 따로 진행되므로 메시지는 저장하지 않음
+                    new_chatbot.pop('messages')
                     result = db.shared_chatbots.insert_one(new_chatbot)
                     new_chatbot['_id'] = result.inserted_id
+                    get_shared_catalog().invalidate()
                 else:
-                    # 챗봇에 고유 ID 추가
-                    new_chatbot['_id'] = ObjectId()
-                    db.users.update_one(
-                        {"username": st.session_state.user["username"]},
-                        {"$push": {"chatbots": new_chatbot}},
-                        upsert=True
-                    )
-                    # 사용자 정보 갱신
-                    st.session_state.user = db.users.find_one({"username": st.session_state.user["username"]})
+                    # 챗봇 정보와 대화 메시지를 각각의 컬렉션에 저장
+                    welcome_messages = new_chatbot.pop('messages')
+                    result = db.chatbots.insert_one(new_chatbot)
+                    new_chatbot['_id'] = result.inserted_id
+                    append_chatbot_messages(new_chatbot, welcome_messages)
+                    # 사용자 챗봇 목록 갱신
+                    st.session_state.user['chatbots'] = load_user_chatbots(st.session_state.user["username"])
                 st.success(f"'{chatbot_name}' 챗봇이 생성되었습니다!")
                 # 임시 프로필 이미지 URL 초기화
                 st.session_state.pop('temp_profile_image_url', None)
+                st.session_state.pop('temp_profile_thumbnails', None)
                 # 새로 생성된 챗봇으로 이동
                 if is_shared:
                     st.session_state.current_shared_chatbot = new_chatbot
                     st.session_state.current_page = 'shared_chatbot'
                 else:
-                    st.session_state.current_chatbot = len(st.session_state.user['chatbots']) - 1
+                    st.session_state.current_chatbot = str(new_chatbot['_id'])
                     st.session_state.current_page = 'chatbot'
                 st.rerun()
             except Exception as e:
@@ -641,12 +910,14 @@ def show_create_chatbot_page():
         else:
             if 'chatbots' not in st.session_state.user:
                 st.session_state.user['chatbots'] = []
+            new_chatbot['_id'] = ObjectId()
             st.session_state.user['chatbots'].append(new_chatbot)
             st.success(f"'{chatbot_name}' 챗봇이 생성되었습니다! (오프라인 모드)")
             # 임시 프로필 이미지 URL 초기화
             st.session_state.pop('temp_profile_image_url', None)
+            st.session_state.pop('temp_profile_thumbnails', None)
             # 새로 생성된 챗봇으로 이동
-            st.session_state.current_chatbot = len(st.session_state.user['chatbots']) - 1
+            st.session_state.current_chatbot = str(new_chatbot['_id'])
             st.session_state.current_page = 'chatbot'
             st.rerun()
 
@@ -654,25 +925,28 @@ def show_create_chatbot_page():
 def show_edit_chatbot_page():
     st.title("챗봇 수정")
 
-    if 'editing_chatbot' not in st.session_state:
+    chatbot = find_chatbot(st.session_state.get('editing_chatbot'))
+    if chatbot is None:
         st.error("수정할 챗봇이 선택되지 않았습니다.")
         return
 
-    chatbot = st.session_state.user["chatbots"][st.session_state.editing_chatbot]
-
     new_name = st.text_input("챗봇 이름", value=chatbot['name'])
     new_description = st.text_input("챗봇 소개", value=chatbot['description'])
     new_system_prompt = st.text_area("시스템 프롬프트", value=chatbot['system_prompt'], height=200)
     new_welcome_message = st.text_input("웰컴 메시지", value=chatbot['welcome_message'])
     new_background_color = st.color_picker("챗봇 카드 배경색 선택", value=chatbot.get('background_color', '#FFFFFF'))
+    new_response_cache = st.selectbox("응답 캐시 (URL로 접속한 학생의 반복 질문)", CACHE_MODES, format_func=RESPONSE_CACHE_LABELS.get,
+                                      index=CACHE_MODES.index(chatbot.get('response_cache', CACHE_MODE_OFF)),
+                                      help="같은 대화 흐름에서 이미 답한 질문에는 모델을 다시 호출하지 않고 저장된 답변을 보여 줍니다.")
 
     if st.button("프로필 이미지 재생성"):
         with st.spinner("프로필 이미지를 재생성 중입니다. 잠시만 기다려주세요..."):
             profile_image_prompt = f"Create a profile image for a chatbot named '{new_name}'. Description: {new_description}"
-            new_profile_image_url = generate_image(profile_image_prompt)
+            new_profile_image_url, new_profile_thumbnails = generate_profile_image(profile_image_prompt)
             if new_profile_image_url:
                 st.image(new_profile_image_url, caption="새로 생성된 프로필 이미지", width=200)
                 chatbot['profile_image_url'] = new_profile_image_url
+                chatbot['profile_thumbnails'] = new_profile_thumbnails
                 st.success("프로필 이미지가 재생성되었습니다.")
             else:
                 st.error("프로필 이미지 재생성에 실패했습니다. 기존 이미지가 유지됩니다.")
@@ -686,13 +960,27 @@ def show_edit_chatbot_page():
         chatbot['system_prompt'] = new_system_prompt
         chatbot['welcome_message'] = new_welcome_message
         chatbot['background_color'] = new_background_color
+        chatbot['response_cache'] = new_response_cache
+        # 수정 전 설정으로 저장된 답변 삭제
+        get_response_cache().invalidate(chatbot.get('_id'))
 
         if db is not None:
             try:
-                db.users.update_one(
-                    {"username": st.session_state.user["username"]},
-                    {"$set": {f"chatbots.{st.session_state.editing_chatbot}": chatbot}}
+                db.chatbots.update_one(
+                    {"_id": chatbot['_id']},
+                    {"$set": {
+                        "name": chatbot['name'],
+                        "description": chatbot['description'],
+                        "system_prompt": chatbot['system_prompt'],
+                        "welcome_message": chatbot['welcome_message'],
+                        "background_color": chatbot['background_color'],
+                        "profile_image_url": chatbot.get('profile_image_url', 'https://via.placeholder.com/100'),
+                        "profile_thumbnails": chatbot.get('profile_thumbnails', {}),
+                        "response_cache": chatbot['response_cache']
+                    }}
                 )
+                # 세션의 챗봇 카드 목록 갱신
+                st.session_state.user['chatbots'] = load_user_chatbots(st.session_state.user["username"])
                 st.success("챗봇이 성공적으로 수정되었습니다.")
                 st.session_state.current_chatbot = st.session_state.editing_chatbot
                 st.session_state.pop('editing_chatbot', None)
@@ -701,41 +989,60 @@ def show_edit_chatbot_page():
             except Exception as e:
                 st.error(f"챗봇 수정 중 오류가 발생했습니다: {str(e)}")
         else:
-            st.session_state.user['chatbots'][st.session_state.editing_chatbot] = chatbot
             st.success("챗봇이 성공적으로 수정되었습니다. (오프라인 모드)")
             st.session_state.current_chatbot = st.session_state.editing_chatbot
             st.session_state.pop('editing_chatbot', None)
             st.session_state.current_page = 'chatbot'
             st.rerun()
 
-# 대화 내역 저장 함수 (공개 챗봇용)
-def save_public_chat_history(chatbot_id, user_name, messages):
-    if db is not None:
+# 대화 내역 저장 함수 (공개 챗봇용, 이번 턴에 추가된 메시지만 저장. chatbot_store.append_public_chat_history 참고)
+def save_public_chat_history(chatbot_id, user_name, session_id, new_messages):
+    if db is not None and new_messages:
         try:
-            chat_history = {
-                "chatbot_id": str(chatbot_id),
-                "user_name": user_name,
-                "timestamp": datetime.now(),
-                "messages": messages
-            }
-            db.public_chat_history.insert_one(chat_history)
+            append_public_chat_history(db, chatbot_id, user_name, session_id, new_messages)
+            return True
         except Exception as e:
             st.error(f"대화 내역 저장 중 오류가 발생했습니다: {str(e)}")
+    return False
+
+# 공개 챗봇 대화 내역 불러오기 함수
+# 세션 문서는 그대로 하나의 대화로 사용합니다. 이전 방식(매 턴 전체 대화를 새 문서로 저장)으로 쌓인 문서는
+# 같은 사용자의 직전 문서가 현재 문서의 앞부분과 같으면 같은 대화의 중간 스냅샷이므로 최신 문서로 대체합니다.
+def load_public_conversations(query, sort_direction=1):
+    conversations = []
+    last_legacy = {}  # 사용자 이름 -> 이전 방식 문서로 만든 마지막 대화
+    for history in db.public_chat_history.find(query).sort("timestamp", 1):
+        conversation = {
+            "_id": history['_id'],
+            "user_name": history.get('user_name', ''),
+            "started_at": history.get('started_at', history['timestamp']),
+            "messages": history['messages']
+        }
+        if 'started_at' not in history:
+            previous = last_legacy.get(conversation['user_name'])
+            if previous is not None and history['messages'][:len(previous['messages'])] == previous['messages']:
+                previous['messages'] = history['messages']
+                continue
+            last_legacy[conversation['user_name']] = conversation
+        conversations.append(conversation)
+    if sort_direction < 0:
+        conversations.reverse()
+    return conversations
 
 # 나만 사용 가능한 챗봇 페이지
 def show_available_chatbots_page():
     st.title("나만 사용 가능한 챗봇")
 
     if db is not None and st.session_state.user["username"] == 'admin':
-        # admin user can see all chatbots
-        users = db.users.find()
-        all_chatbots = []
-        for user in users:
-            user_chatbots = user.get("chatbots", [])
-            for chatbot in user_chatbots:
-                chatbot["owner"] = user["username"]
-                all_chatbots.append(chatbot)
-        chatbots_to_show = all_chatbots
+        # admin user can see all chatbots (교사별 필터, 페이지 단위)
+        owners = db.chatbots.distinct("creator")
+        owner = st.selectbox("소유자", ["전체"] + owners, key="admin_chatbot_owner")
+        owner = None if owner == "전체" else owner
+        total = db.chatbots.count_documents({"creator": owner} if owner else {})
+        page_count = max(1, (total + ADMIN_CHATBOT_PAGE_SIZE - 1) // ADMIN_CHATBOT_PAGE_SIZE)
+        page = st.number_input(f"페이지 (전체 {page_count}쪽, {total}개)", min_value=1, max_value=page_count, value=1,
+                               key="admin_chatbot_page")
+        chatbots_to_show = load_all_chatbots(page, owner)
     else:
         chatbots_to_show = st.session_state.user.get("chatbots", [])
 
@@ -743,8 +1050,8 @@ def show_available_chatbots_page():
         st.info("아직 만든 챗봇이 없습니다. '새 챗봇 만들기'에서 첫 번째 챗봇을 만들어보세요!")
         return
 
-    # 환경 변수에서 BASE_URL 가져오기
-    base_url = os.environ.get("BASE_URL")
+    # 환경 변수에서 공유 URL 주소 가져오기 (PUBLIC_CHAT_URL: 공개 챗봇 경량 서버 주소, public_server.py 참고)
+    base_url = os.environ.get("PUBLIC_CHAT_URL") or os.environ.get("BASE_URL")
     if not base_url:
         st.error("BASE_URL이 설정되지 않았습니다. 환경 변수를 확인해주세요.")
         return
@@ -755,7 +1062,7 @@ def show_available_chatbots_page():
         with cols[i % 3]:
             st.markdown(f"""
             <div class="chatbot-card" style="background-color: {chatbot.get('background_color', '#FFFFFF')}">
-                <img src="{chatbot.get('profile_image_url', 'https://via.placeholder.com/100')}" alt="프로필 이미지">
+                {profile_image_html(chatbot, 100)}
                 <div class="chatbot-info">
                     <div class="chatbot-name">{chatbot['name']}</div>
                     <div class="chatbot-description">{chatbot['description']}</div>
@@ -765,66 +1072,80 @@ def show_available_chatbots_page():
             st.markdown("</div></div>", unsafe_allow_html=True)
             col1, col2, col3 = st.columns(3)
             with col1:
-                if st.button("사용하기", key=f"use_{i}"):
-                    st.session_state.current_chatbot = i
+                if st.button("사용하기", key=f"use_{chatbot['_id']}"):
+                    st.session_state.current_chatbot = str(chatbot['_id'])
                     st.session_state.current_page = 'chatbot'
                     st.rerun()
             with col2:
                 if st.session_state.user["username"] == 'admin' or chatbot.get('creator', '') == st.session_state.user["username"]:
-                    if st.button("수정하기", key=f"edit_{i}"):
-                        st.session_state.editing_chatbot = i
+                    if st.button("수정하기", key=f"edit_{chatbot['_id']}"):
+                        st.session_state.editing_chatbot = str(chatbot['_id'])
                         st.session_state.current_page = 'edit_chatbot'
                         st.rerun()
             with col3:
                 if st.session_state.user["username"] == 'admin' or chatbot.get('creator', '') == st.session_state.user["username"]:
-                    if st.button("삭제하기", key=f"delete_{i}"):
+                    if st.button("삭제하기", key=f"delete_{chatbot['_id']}"):
                         if delete_chatbot(chatbot.get('_id'), chatbot.get('creator', '')):
                             st.success(f"'{chatbot['name']}' 챗봇이 삭제되었습니다.")
                             st.rerun()
             # URL 생성 버튼 추가
             with st.expander("URL 생성", expanded=False):
-                selected_model = st.selectbox("모델 선택", MODEL_OPTIONS, key=f"model_select_{i}")
-                if st.button("URL 생성", key=f"generate_url_{i}"):
-                    chatbot_id = str(chatbot.get('_id', i))
-                    model_param = urllib.parse.quote(selected_model)
-                    shareable_url = f"{base_url}?chatbot_id={chatbot_id}&model={model_param}"
+                selected_model = st.selectbox("모델 선택", MODEL_OPTIONS, key=f"model_select_{chatbot['_id']}")
+                chatbot_id = str(chatbot.get('_id', i))
+                # 생성한 URL은 세션에 기억해 두어 'QR 코드 확대' 클릭 후 다시 실행되어도 계속 표시
+                if st.button("URL 생성", key=f"generate_url_{chatbot['_id']}"):
+                    st.session_state[f"shared_url_{chatbot_id}"] = selected_model
+                shared_model = st.session_state.get(f"shared_url_{chatbot_id}")
+                if shared_model:
+                    shareable_url = build_shareable_url(base_url, chatbot_id, shared_model)
                     st.write(f"공유 가능한 URL: {shareable_url}")
-            
-                    # QR 코드 생성
-                    qr_code_url = f"https://api.qrserver.com/v1/create-qr-code/?size=150x150&data={urllib.parse.quote(shareable_url)}"
-                    qr_code_response = requests.get(qr_code_url)
-                    if qr_code_response.status_code == 200:
-                        qr_code_image = qr_code_response.content
+
+                    # QR 코드 생성 (앱 안에서 생성하고 챗봇/모델/크기별로 캐시)
+                    try:
+                        qr_code_image = get_qr_code_png(base_url, chatbot_id, shared_model, QR_CODE_SIZE)
                         # 이미지 표시
                         st.markdown("<div class='qr-code'>", unsafe_allow_html=True)
                         st.image(qr_code_image, caption="QR 코드 (클릭하여 확대)", use_column_width=False, width=150)
                         st.markdown("</div>", unsafe_allow_html=True)
                         # 이미지 확대 기능
-                        if st.button("QR 코드 확대", key=f"enlarge_qr_{i}"):
-                            st.image(qr_code_image, caption="QR 코드 (확대)", width=600)
-                    else:
-                        st.error("QR 코드를 생성하는 데 실패했습니다.")
+                        if st.button("QR 코드 확대", key=f"enlarge_qr_{chatbot['_id']}"):
+                            st.image(get_qr_code_png(base_url, chatbot_id, shared_model, QR_CODE_ENLARGED_SIZE), caption="QR 코드 (확대)", width=600)
+                    except QRCodeError as e:
+                        st.error(f"QR 코드를 생성하는 데 실패했습니다: {str(e)}")
 
             # 챗봇 제작자만 볼 수 있는 'URL 사용자 대화내역 보기' 버튼 추가
             if chatbot.get('creator', '') == st.session_state.user["username"] or st.session_state.user["username"] == 'admin':
-                if st.button("URL 사용자 대화내역 보기", key=f"view_url_history_{i}"):
+                if st.button("URL 사용자 대화내역 보기", key=f"view_url_history_{chatbot['_id']}"):
                     st.session_state.viewing_chatbot_history = str(chatbot['_id'])
                     st.session_state.current_page = 'view_public_chat_history'
                     st.rerun()
 
+# QR 코드 크기 (px) 및 캐시 항목 수
+QR_CODE_SIZE = 150
+QR_CODE_ENLARGED_SIZE = 600
+QR_CODE_CACHE_ENTRIES = 256
+
+# 챗봇 공유 URL 만들기
+def build_shareable_url(base_url, chatbot_id, model):
+    return f"{base_url}?chatbot_id={chatbot_id}&model={urllib.parse.quote(model)}"
+
+# QR 코드 PNG 만들기 (외부 API 호출 없이 생성하고, (챗봇 ID, 모델, 크기)별로 캐시)
+@st.cache_data(max_entries=QR_CODE_CACHE_ENTRIES, show_spinner=False)
+def get_qr_code_png(base_url, chatbot_id, model, size):
+    return make_qr_png(build_shareable_url(base_url, chatbot_id, model), width=size)
+
 # 챗봇 삭제 함수 수정
 def delete_chatbot(chatbot_id, creator):
     if db is not None:
         try:
             if st.session_state.user["username"] == 'admin' or creator == st.session_state.user["username"]:
-                db.users.update_one(
-                    {"chatbots._id": ObjectId(chatbot_id)},
-                    {"$pull": {"chatbots": {"_id": ObjectId(chatbot_id)}}}
-                )
+                db.chatbots.delete_one({"_id": ObjectId(chatbot_id)})
                 # 관련된 대화 내역도 삭제
+                db.messages.delete_many({"chatbot_id": ObjectId(chatbot_id)})
                 db.chat_history.delete_many({"chatbot_name": chatbot_id})
                 db.public_chat_history.delete_many({"chatbot_id": str(chatbot_id)})
-                st.session_state.user = db.users.find_one({"username": st.session_state.user["username"]})
+                st.session_state.user['chatbots'] = load_user_chatbots(st.session_state.user["username"])
+                st.session_state.get('opened_chatbots', {}).pop(str(chatbot_id), None)
                 return True
             else:
                 st.error("삭제 권한이 없습니다.")
@@ -840,55 +1161,67 @@ def delete_chatbot(chatbot_id, creator):
 def show_shared_chatbots_page():
     st.title("수원외국어고등학교 공유 챗봇")
     if db is not None:
-        shared_chatbots = list(db.shared_chatbots.find())
-        if not shared_chatbots:
+        catalog = get_shared_catalog()
+        categories = catalog.categories()
+        if not categories:
             st.info("공유된 챗봇이 없습니다.")
             return
 
-        # 범주별로 챗봇 그룹화
-        categories = {}
-        for chatbot in shared_chatbots:
-            category = chatbot.get('category', '기타')
-            if category not in categories:
-                categories[category] = []
-            categories[category].append(chatbot)
-
-        for category, chatbots_in_category in categories.items():
-            st.subheader(f"범주: {category}")
-            cols = st.columns(3)
-            for i, chatbot in enumerate(chatbots_in_category):
-                with cols[i % 3]:
-                    st.markdown(f"""
-                    <div class="chatbot-card" style="background-color: {chatbot.get('background_color', '#FFFFFF')}">
-                        <img src="{chatbot.get('profile_image_url', 'https://via.placeholder.com/100')}" alt="프로필 이미지">
-                        <div class="chatbot-info">
-                            <div class="chatbot-name">{chatbot['name']}</div>
-                            <div class="chatbot-description">{chatbot['description']}</div>
-                            <p>작성자: {chatbot['creator']}</p>
-                        </div>
+        # 선택한 범주의 카드만 페이지 단위로 불러옴
+        category = st.selectbox("범주 선택", [name for name, _ in categories],
+                                format_func=lambda name: f"{name} ({dict(categories)[name]}개)", key="shared_category")
+        page_count = catalog.page_count(category)
+        page = st.number_input(f"페이지 (전체 {page_count}쪽)", min_value=1, max_value=page_count, value=1,
+                               key=f"shared_page_{category}") if page_count > 1 else 1
+
+        st.subheader(f"범주: {category}")
+        cols = st.columns(3)
+        for i, chatbot in enumerate(catalog.page(category, page)):
+            with cols[i % 3]:
+                st.markdown(f"""
+                <div class="chatbot-card" style="background-color: {chatbot.get('background_color', '#FFFFFF')}">
+                    {profile_image_html(chatbot, 100)}
+                    <div class="chatbot-info">
+                        <div class="chatbot-name">{chatbot['name']}</div>
+                        <div class="chatbot-description">{chatbot['description']}</div>
+                        <p>작성자: {chatbot['creator']}</p>
                     </div>
-                    """, unsafe_allow_html=True)
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        if st.button("사용하기", key=f"use_shared_{category}_{i}"):
-                            st.session_state.current_shared_chatbot = chatbot
-                            st.session_state.current_page = 'shared_chatbot'
+                </div>
+                """, unsafe_allow_html=True)
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    if st.button("사용하기", key=f"use_shared_{chatbot['_id']}"):
+                        st.session_state.current_shared_chatbot = load_shared_chatbot(chatbot['_id'])
+                        st.session_state.current_page = 'shared_chatbot'
+                        st.rerun()
+                with col2:
+                    if chatbot['creator'] == st.session_state.user["username"] or st.session_state.user["username"] == 'admin':
+                        if st.button("수정하기", key=f"edit_shared_{chatbot['_id']}"):
+                            st.session_state.editing_shared_chatbot = load_shared_chatbot(chatbot['_id'])
+                            st.session_state.current_page = 'edit_shared_chatbot'
                             st.rerun()
-                    with col2:
-                        if chatbot['creator'] == st.session_state.user["username"] or st.session_state.user["username"] == 'admin':
-                            if st.button("수정하기", key=f"edit_shared_{category}_{i}"):
-                                st.session_state.editing_shared_chatbot = chatbot
-                                st.session_state.current_page = 'edit_shared_chatbot'
+                with col3:
+                    if chatbot['creator'] == st.session_state.user["username"] or st.session_state.user["username"] == 'admin':
+                        if st.button("삭제하기", key=f"delete_shared_{chatbot['_id']}"):
+                            if delete_shared_chatbot(chatbot['_id']):
+                                st.success(f"'{chatbot['name']}' 공유 챗봇이 삭제되었습니다.")
                                 st.rerun()
-                    with col3:
-                        if chatbot['creator'] == st.session_state.user["username"] or st.session_state.user["username"] == 'admin':
-                            if st.button("삭제하기", key=f"delete_shared_{category}_{i}"):
-                                if delete_shared_chatbot(chatbot['_id']):
-                                    st.success(f"'{chatbot['name']}' 공유 챗봇이 삭제되었습니다.")
-                                    st.rerun()
     else:
         st.write("데이터베이스 연결이 없어 공유 챗봇을 불러올 수 없습니다.")
 
+# 공유 챗봇 목록 캐시 설정
+SHARED_CATALOG_TTL_SECONDS = int(os.environ.get("SHARED_CATALOG_TTL_SECONDS", "60"))
+SHARED_CATALOG_PAGE_SIZE = 12
+
+# 공유 챗봇 목록 캐시 (프로세스당 하나)
+@st.cache_resource(show_spinner=False)
+def get_shared_catalog():
+    return SharedChatbotCatalog(db, SHARED_CATALOG_TTL_SECONDS, SHARED_CATALOG_PAGE_SIZE)
+
+# 공유 챗봇 대화 설정 불러오기 (대화/수정 화면용)
+def load_shared_chatbot(chatbot_id):
+    return load_chat_config(db, chatbot_id, "shared_chatbots")
+
 # 공유 챗봇 삭제 함수 수정
 def delete_shared_chatbot(chatbot_id):
     if db is not None:
@@ -898,6 +1231,7 @@ def delete_shared_chatbot(chatbot_id):
             else:
                 result = db.shared_chatbots.delete_one({"_id": chatbot_id, "creator": st.session_state.user["username"]})
             if result.deleted_count > 0:
+                get_shared_catalog().invalidate()
                 return True
             else:
                 st.error("삭제 권한이 없거나 챗봇을 찾을 수 없습니다.")
@@ -913,7 +1247,7 @@ def delete_shared_chatbot(chatbot_id):
 def show_edit_shared_chatbot_page():
     st.title("공유 챗봇 수정")
 
-    if 'editing_shared_chatbot' not in st.session_state:
+    if not st.session_state.get('editing_shared_chatbot'):
         st.error("수정할 공유 챗봇이 선택되지 않았습니다.")
         return
 
@@ -927,7 +1261,7 @@ def show_edit_shared_chatbot_page():
 
     # 범주 수정
     if db is not None:
-        existing_categories = db.shared_chatbots.distinct('category')
+        existing_categories = get_shared_catalog().category_names()
     else:
         existing_categories = []
     category_option = st.selectbox('챗봇 범주 선택', options=existing_categories + ['새 범주 입력'], index=existing_categories.index(chatbot.get('category', '기타')) if chatbot.get('category', '기타') in existing_categories else len(existing_categories))
@@ -939,10 +1273,11 @@ def show_edit_shared_chatbot_page():
     if st.button("프로필 이미지 재생성"):
         with st.spinner("프로필 이미지를 재생성 중입니다. 잠시만 기다려주세요..."):
             profile_image_prompt = f"Create a profile image for a chatbot named '{new_name}'. Description: {new_description}"
-            new_profile_image_url = generate_image(profile_image_prompt)
+            new_profile_image_url, new_profile_thumbnails = generate_profile_image(profile_image_prompt)
             if new_profile_image_url:
                 st.image(new_profile_image_url, caption="새로 생성된 프로필 이미지", width=200)
                 chatbot['profile_image_url'] = new_profile_image_url
+                chatbot['profile_thumbnails'] = new_profile_thumbnails
                 st.success("프로필 이미지가 재생성되었습니다.")
             else:
                 st.error("프로필 이미지 재생성에 실패했습니다. 기존 이미지가 유지됩니다.")
@@ -960,10 +1295,21 @@ def show_edit_shared_chatbot_page():
 
         if db is not None:
             try:
+                # 수정한 필드만 저장 (세션의 대화 메시지는 저장하지 않음)
                 db.shared_chatbots.update_one(
                     {"_id": chatbot["_id"]},
-                    {"$set": chatbot}
+                    {"$set": {
+                        "name": chatbot['name'],
+                        "description": chatbot['description'],
+                        "system_prompt": chatbot['system_prompt'],
+                        "welcome_message": chatbot['welcome_message'],
+                        "background_color": chatbot['background_color'],
+                        "category": chatbot['category'],
+                        "profile_image_url": chatbot.get('profile_image_url', 'https://via.placeholder.com/100'),
+                        "profile_thumbnails": chatbot.get('profile_thumbnails', {})
+                    }}
                 )
+                get_shared_catalog().invalidate()
                 st.success("공유 챗봇이 성공적으로 수정되었습니다.")
                 st.session_state.current_shared_chatbot = chatbot
                 st.session_state.pop('editing_shared_chatbot', None)
@@ -976,22 +1322,13 @@ def show_edit_shared_chatbot_page():
 
 # 특정 챗봇 페이지
 def show_chatbot_page():
-    if db is not None and st.session_state.user["username"] == 'admin':
-        # admin user can access any chatbot
-        users = db.users.find()
-        all_chatbots = []
-        for user in users:
-            user_chatbots = user.get("chatbots", [])
-            for chatbot in user_chatbots:
-                all_chatbots.append(chatbot)
-        chatbot = all_chatbots[st.session_state.current_chatbot]
-    else:
-        chatbot = st.session_state.user["chatbots"][st.session_state.current_chatbot]
+    # admin은 다른 교사의 챗봇도 _id로 바로 조회
+    chatbot = find_chatbot(st.session_state.current_chatbot)
 
     # 제목과 프로필 이미지를 함께 표시
     st.markdown(f"""
     <div class="chatbot-title">
-        <img src="{chatbot.get('profile_image_url', 'https://via.placeholder.com/150')}" alt="프로필 이미지">
+        {profile_image_html(chatbot, 150)}
         <h1>{chatbot['name']} 챗봇</h1>
     </div>
     """, unsafe_allow_html=True)
@@ -1010,28 +1347,21 @@ def show_chatbot_page():
     # 사이드바에 대화 내역 초기화 버튼 추가
     if st.sidebar.button("현재 대화내역 초기화", key="reset_chat", help="현재 대화 내역을 초기화합니다.", use_container_width=True):
         # 현재 대화 내역 저장
-        save_chat_history(chatbot['name'], chatbot['messages'])
+        save_chat_history(chatbot['name'], get_chatbot_messages(chatbot))
 
         # 대화 내역 초기화
-        default_welcome_message = "안녕하세요! 무엇을 도와드릴까요?"
-        chatbot['messages'] = [{"role": "assistant", "content": chatbot.get('welcome_message', default_welcome_message)}]
-        if db is not None:
-            try:
-                db.users.update_one(
-                    {"username": st.session_state.user["username"]},
-                    {"$set": {f"chatbots.{st.session_state.current_chatbot}.messages": chatbot['messages']}}
-                )
-            except Exception as e:
-                st.error(f"대화 내역 초기화 중 오류가 발생했습니다: {str(e)}")
+        reset_chatbot_messages(chatbot)
 
-    for message in chatbot['messages']:
+    messages = get_chatbot_messages(chatbot)
+    for message in messages:
         with st.chat_message(message["role"]):
             if message["role"] == "assistant" and "image_url" in message:
                 st.image(message["image_url"], caption="생성된 이미지")
             st.markdown(message["content"])
 
     if prompt := st.chat_input("무엇을 도와드릴까요?"):
-        chatbot['messages'].append({"role": "user", "content": prompt})
+        saved_count = len(messages)
+        messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
@@ -1046,66 +1376,21 @@ def show_chatbot_page():
                     if image_url:
                         st.image(image_url, caption="생성된 이미지")
                         full_response = "요청하신 이미지를 생성했습니다. 위의 이미지를 확인해 주세요."
-                        chatbot['messages'].append({"role": "assistant", "content": full_response, "image_url": image_url})
+                        messages.append({"role": "assistant", "content": full_response, "image_url": image_url})
                     else:
                         full_response = "죄송합니다. 이미지 생성 중 오류가 발생했습니다. 다른 주제로 시도해 보시거나, 요청을 더 구체적으로 해주세요."
             else:
-                try:
-                    start_time = datetime.now()
-                    if "gpt" in selected_model:
-                        response = openai_client.chat.completions.create(
-                            model=selected_model,
-                            messages=[{"role": "system", "content": chatbot['system_prompt']}] + chatbot['messages'],
-                            stream=True
-                        )
-                        for chunk in response:
-                            if chunk.choices[0].delta.content is not None:
-                                full_response += chunk.choices[0].delta.content
-                                message_placeholder.markdown(full_response + "▌")
-                        # 사용량 기록
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                    elif "gemini" in selected_model:
-                        model = genai.GenerativeModel(selected_model)
-                        response = model.generate_content(chatbot['system_prompt'] + "\n\n" + prompt, stream=True)
-                        for chunk in response:
-                            if chunk.text:
-                                full_response += chunk.text
-                                message_placeholder.markdown(full_response + "▌")
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                    elif "claude" in selected_model:
-                        with anthropic_client.messages.stream(
-                            max_tokens=1000,
-                            messages=chatbot['messages'],
-                            model=selected_model,
-                            system=chatbot['system_prompt'],
-                        ) as stream:
-                            for text in stream.text_stream:
-                                full_response += text
-                                message_placeholder.markdown(full_response + "▌")
-
-                        message_placeholder.markdown(full_response)
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                except Exception as e:
-                    st.error(f"응답 생성 중 오류가 발생했습니다: {str(e)}")
+                full_response = stream_assistant_reply(message_placeholder, messages, chatbot['system_prompt'], selected_model, st.session_state.user["username"], f"chatbot:{chatbot['_id']}")
 
             if full_response:
-                chatbot['messages'].append({"role": "assistant", "content": full_response})
+                messages.append({"role": "assistant", "content": full_response})
 
-        # 데이터베이스 업데이트
-        if db is not None:
-            try:
-                db.users.update_one(
-                    {"username": st.session_state.user["username"]},
-                    {"$set": {f"chatbots.{st.session_state.current_chatbot}": chatbot}}
-                )
-            except Exception as e:
-                st.error(f"대화 내용 저장 중 오류가 발생했습니다: {str(e)}")
-        else:
-            st.session_state.user["chatbots"][st.session_state.current_chatbot] = chatbot
+        # 데이터베이스 업데이트 (이번 턴에 추가된 메시지만 저장)
+        append_chatbot_messages(chatbot, messages[saved_count:])
 
 # 공유 챗봇 대화 페이지
 def show_shared_chatbot_page():
-    if 'current_shared_chatbot' not in st.session_state:
+    if not st.session_state.get('current_shared_chatbot'):
         st.error("선택된 공유 챗봇이 없습니다.")
         return
 
@@ -1114,7 +1399,7 @@ def show_shared_chatbot_page():
     # 제목과 프로필 이미지를 함께 표시
     st.markdown(f"""
     <div class="chatbot-title">
-        <img src="{chatbot.get('profile_image_url', 'https://via.placeholder.com/150')}" alt="프로필 이미지">
+        {profile_image_html(chatbot, 150)}
         <h1>{chatbot['name']} (공유 챗봇)</h1>
     </div>
     """, unsafe_allow_html=True)
@@ -1163,43 +1448,7 @@ def show_shared_chatbot_page():
                     else:
                         full_response = "죄송합니다. 이미지 생성 중 오류가 발생했습니다. 다른 주제로 시도해 보시거나, 요청을 더 구체적으로 해주세요."
             else:
-                try:
-                    start_time = datetime.now()
-                    if "gpt" in selected_model:
-                        response = openai_client.chat.completions.create(
-                            model=selected_model,
-                            messages=[{"role": "system", "content": chatbot['system_prompt']}] + chatbot['messages'],
-                            stream=True
-                        )
-                        for chunk in response:
-                            if chunk.choices[0].delta.content is not None:
-                                full_response += chunk.choices[0].delta.content
-                                message_placeholder.markdown(full_response + "▌")
-                        # 사용량 기록
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                    elif "gemini" in selected_model:
-                        model = genai.GenerativeModel(selected_model)
-                        response = model.generate_content(chatbot['system_prompt'] + "\n\n" + prompt, stream=True)
-                        for chunk in response:
-                            if chunk.text:
-                                full_response += chunk.text
-                                message_placeholder.markdown(full_response + "▌")
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                    elif "claude" in selected_model:
-                        with anthropic_client.messages.stream(
-                            max_tokens=1000,
-                            messages=chatbot['messages'],
-                            model=selected_model,
-                            system=chatbot['system_prompt'],
-                        ) as stream:
-                            for text in stream.text_stream:
-                                full_response += text
-                                message_placeholder.markdown(full_response + "▌")
-
-                        message_placeholder.markdown(full_response)
-                        record_usage(st.session_state.user["username"], selected_model, start_time)
-                except Exception as e:
-                    st.error(f"응답 생성 중 오류가 발생했습니다: {str(e)}")
+                full_response = stream_assistant_reply(message_placeholder, chatbot['messages'], chatbot['system_prompt'], selected_model, st.session_state.user["username"], f"shared:{chatbot['_id']}")
 
                 if full_response:
                     chatbot['messages'].append({"role": "assistant", "content": full_response})
@@ -1210,9 +1459,7 @@ def show_public_chatbot_page(chatbot_id):
     chatbot = None
     if db is not None:
         try:
-            user = db.users.find_one({"chatbots._id": ObjectId(chatbot_id)}, {"chatbots.$": 1})
-            if user:
-                chatbot = user['chatbots'][0]
+            chatbot = load_chat_config(db, chatbot_id)
         except InvalidId:
             st.error("잘못된 챗봇 ID입니다.")
             return
@@ -1226,12 +1473,12 @@ def show_public_chatbot_page(chatbot_id):
 
     # URL에서 모델 파라미터 가져오기
     query_params = st.query_params
-    selected_model = query_params.get('model', ['gpt-4o'])[0]
+    selected_model = query_params.get('model', 'gpt-4o')
 
     # 챗봇 이름과 프로필 이미지 표시
     st.markdown(f"""
     <div class="chatbot-title">
-        <img src="{chatbot.get('profile_image_url', 'https://via.placeholder.com/150')}" alt="프로필 이미지">
+        {profile_image_html(chatbot, 150)}
         <h1>{chatbot['name']}</h1>
     </div>
     """, unsafe_allow_html=True)
@@ -1250,6 +1497,9 @@ def show_public_chatbot_page(chatbot_id):
 def start_chatting(chatbot, user_name, selected_model):
     if 'public_chatbot_messages' not in st.session_state:
         st.session_state.public_chatbot_messages = [{"role": "assistant", "content": chatbot.get('welcome_message', "안녕하세요! 무엇을 도와드릴까요?")}]
+        # 대화 세션 ID와 이미 저장된 메시지 수 (매 턴에는 새 메시지만 저장)
+        st.session_state.public_chat_session_id = str(ObjectId())
+        st.session_state.public_chat_saved_count = 0
 
     for message in st.session_state.public_chatbot_messages:
         with st.chat_message(message["role"]):
@@ -1277,51 +1527,17 @@ def start_chatting(chatbot, user_name, selected_model):
                     else:
                         full_response = "죄송합니다. 이미지 생성 중 오류가 발생했습니다. 다른 주제로 시도해 보시거나, 요청을 더 구체적으로 해주세요."
             else:
-                try:
-                    start_time = datetime.now()
-                    if "gpt" in selected_model:
-                        response = openai_client.chat.completions.create(
-                            model=selected_model,
-                            messages=[{"role": "system", "content": chatbot['system_prompt']}] + st.session_state.public_chatbot_messages,
-                            stream=True
-                        )
-                        for chunk in response:
-                            if chunk.choices[0].delta.content is not None:
-                                full_response += chunk.choices[0].delta.content
-                                message_placeholder.markdown(full_response + "▌")
-                        # 사용량 기록: 챗봇 제작자의 이름으로 기록
-                        record_usage(chatbot['creator'], selected_model, start_time)
-                    elif "gemini" in selected_model:
-                        model = genai.GenerativeModel(selected_model)
-                        response = model.generate_content(chatbot['system_prompt'] + "\n\n" + prompt, stream=True)
-                        for chunk in response:
-                            if chunk.text:
-                                full_response += chunk.text
-                                message_placeholder.markdown(full_response + "▌")
-                        record_usage(chatbot['creator'], selected_model, start_time)
-                    elif "claude" in selected_model.lower():
-                        with anthropic_client.messages.stream(
-                            max_tokens=1000,
-                            messages=[{"role": m["role"], "content": m["content"]} for m in st.session_state.public_chatbot_messages],
-                            model=selected_model,
-                            system=chatbot['system_prompt'],
-                        ) as stream:
-                            for text in stream.text_stream:
-                                full_response += text
-                                message_placeholder.markdown(full_response + "▌")
-                        record_usage(chatbot['creator'], selected_model, start_time)
-                    else:
-                        st.error(f"지원되지 않는 모델입니다: {selected_model}")
-                except Exception as e:
-                    st.error(f"응답 생성 중 오류가 발생했습니다: {str(e)}")
+                full_response = reply_with_response_cache(message_placeholder, chatbot, st.session_state.public_chatbot_messages, selected_model, chatbot['creator'], f"public:{st.session_state.public_chat_session_id}")
 
                 # 대화 내역에 추가
                 if full_response:
                     st.session_state.public_chatbot_messages.append({"role": "assistant", "content": full_response})
-                    message_placeholder.markdown(full_response)
 
-            # 대화 내역 저장
-            save_public_chat_history(chatbot['_id'], user_name, st.session_state.public_chatbot_messages)
+            # 대화 내역 저장 (이번 턴에 추가된 메시지만)
+            saved_count = st.session_state.public_chat_saved_count
+            new_messages = st.session_state.public_chatbot_messages[saved_count:]
+            if save_public_chat_history(chatbot['_id'], user_name, st.session_state.public_chat_session_id, new_messages):
+                st.session_state.public_chat_saved_count = saved_count + len(new_messages)
 
 # 대화 내역 확인 페이지
 def show_chat_history_page():
@@ -1333,7 +1549,7 @@ def show_chat_history_page():
             st.write(chatbot['description'])
             if st.button(f"개인 대화 내역 보기 #{i}"):
                 st.write("--- 현재 대화 내역 ---")
-                for message in chatbot['messages']:
+                for message in get_chatbot_messages(chatbot):
                     st.write(f"{message['role']}: {message['content']}")
                 st.write("---")
 
@@ -1359,13 +1575,13 @@ def show_chat_history_page():
             if st.button(f"공개 대화 내역 보기 #{i}"):
                 if db is not None:
                     st.write("--- 공개 대화 내역 ---")
-                    chat_histories = db.public_chat_history.find({
+                    chat_histories = load_public_conversations({
                         "chatbot_id": str(chatbot.get('_id'))
-                    }).sort("timestamp", -1)
+                    }, sort_direction=-1)
 
                     for history in chat_histories:
                         st.write(f"사용자 이름: {history['user_name']}")
-                        st.write(f"대화 시간: {history['timestamp']}")
+                        st.write(f"대화 시간: {history['started_at']}")
                         for message in history['messages']:
                             st.write(f"{message['role']}: {message['content']}")
                         st.write("---")
@@ -1388,14 +1604,10 @@ def show_public_chatbot_history():
 
     chatbot_id = str(st.session_state.viewing_chatbot_history)
 
-    # 챗봇 정보 가져오기 및 제작자 확인
-    user = db.users.find_one(
-        {"chatbots._id": ObjectId(chatbot_id)},
-        {"chatbots.$": 1}
-    )
-    if user:
-        chatbot = user['chatbots'][0]
-        if chatbot.get('creator', '') != st.session_state.user["username"] and st.session_state.user["username"] != 'admin':
+    # 챗봇 제작자 확인 (creator 필드만 조회)
+    creator = chatbot_owner(db, chatbot_id)
+    if creator is not None:
+        if creator != st.session_state.user["username"] and st.session_state.user["username"] != 'admin':
             st.error("해당 챗봇의 대화 내역을 볼 권한이 없습니다.")
             return
     else:
@@ -1414,63 +1626,115 @@ def show_public_chatbot_history():
 
         if selected_user:
             # 선택한 사용자에 대한 대화 내역 가져오기
-            chat_histories = db.public_chat_history.find({
+            conversations = load_public_conversations({
                 "chatbot_id": chatbot_id,
                 "user_name": selected_user
-            }).sort("timestamp", 1)  # 오름차순 정렬
-
-            all_messages = []
-            first_timestamp = None
+            })  # 오름차순 정렬
 
-            for history in chat_histories:
-                if first_timestamp is None:
-                    first_timestamp = history['timestamp']
-                all_messages.extend(history['messages'])
-
-            if first_timestamp:
-                st.write(f"대화 시작 시간: {first_timestamp}")
-            else:
+            if not conversations:
                 st.write("대화 내역이 없습니다.")
 
-            for message in all_messages:
-                st.write(f"{message['role']}: {message['content']}")
-            st.write("---")
+            for conversation in conversations:
+                st.write(f"대화 시작 시간: {conversation['started_at']}")
+                for message in conversation['messages']:
+                    st.write(f"{message['role']}: {message['content']}")
+                st.write("---")
     else:
         st.warning("데이터베이스 연결이 없어 대화 내역을 불러올 수 없습니다.")
 
 # 사용량 데이터 페이지 추가
+# 필터와 집계는 MongoDB 집계 파이프라인으로 처리하고, 요약 표는 일간 집계 문서(usage_daily)에서 읽습니다.
+USAGE_LOG_PAGE_SIZE = 100
+
 def show_usage_data_page():
+    import pandas as pd  # 사용량 페이지에서만 필요
+
     st.title("AI 모델 사용량 데이터")
 
     if db is not None:
-        usage_logs = list(db.usage_logs.find())
-
-        if not usage_logs:
+        # 일간 집계가 아직 없으면 기존 로그로 한 번 만들어 둠
+        if db.usage_daily.estimated_document_count() == 0 and db.usage_logs.estimated_document_count() > 0:
+            with st.spinner("일별 사용량 집계를 만드는 중입니다..."):
+                rebuild_daily_rollups(db)
+
+        usernames = sorted(db.usage_daily.distinct("username"))
+        models = sorted(db.usage_daily.distinct("model_name"))
+        if not usernames:
             st.info("사용량 데이터가 없습니다.")
             return
 
-        df = pd.DataFrame(usage_logs)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df['date'] = df['timestamp'].dt.date
-
         # 필터링 및 정렬 기능 추가
-        usernames = df['username'].unique()
         selected_user = st.multiselect("사용자 선택", usernames, default=usernames)
-        models = df['model_name'].unique()
         selected_model = st.multiselect("모델 선택", models, default=models)
         date_range = st.date_input("날짜 범위 선택", [])
-        if len(date_range) == 2:
-            start_date, end_date = date_range
-            df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-        df_filtered = df[(df['username'].isin(selected_user)) & (df['model_name'].isin(selected_model))]
-
-        # 데이터 표시
-        st.dataframe(df_filtered[['username', 'model_name', 'timestamp', 'tokens_used']])
+        start_date, end_date = date_range if len(date_range) == 2 else (None, None)
+        rollup_match = build_usage_match(selected_user, selected_model, start_date, end_date)
+        log_match = build_usage_match(selected_user, selected_model, start_date, end_date, date_field="timestamp")
+
+        # 원본 로그 (페이지 단위로 조회)
+        total_logs = db.usage_logs.count_documents(log_match)
+        total_pages = max(1, (total_logs + USAGE_LOG_PAGE_SIZE - 1) // USAGE_LOG_PAGE_SIZE)
+        page = st.number_input(f"페이지 (전체 {total_pages}쪽, {total_logs}건)", min_value=1, max_value=total_pages, value=1)
+        log_columns = ['username', 'model_name', 'timestamp', 'tokens_used', 'input_tokens', 'output_tokens', 'ttft_ms', 'duration_ms', 'chunk_count', 'cache_read_tokens', 'cache_write_tokens', 'context_tokens', 'trimmed_messages', 'response_cache', 'queue_wait_ms', 'queue_position', 'requested_model', 'attempts', 'hedged', 'hedge_won', 'failover_events']
+        usage_logs = list(db.usage_logs.find(log_match, {"_id": 0, **{column: 1 for column in log_columns}})
+                          .sort("timestamp", -1)
+                          .skip((page - 1) * USAGE_LOG_PAGE_SIZE)
+                          .limit(USAGE_LOG_PAGE_SIZE))
+        st.dataframe(pd.DataFrame(usage_logs, columns=log_columns))
 
         # 사용자별 모델 사용 횟수 집계
-        usage_summary = df_filtered.groupby(['username', 'model_name']).size().reset_index(name='사용 횟수')
+        usage_summary = pd.DataFrame(
+            [{"username": row["_id"]["username"], "model_name": row["_id"]["model_name"], "사용 횟수": row["count"]}
+             for row in usage_counts_by_user(db, rollup_match)],
+            columns=["username", "model_name", "사용 횟수"]
+        )
         st.write("사용자별 모델 사용 횟수:")
         st.dataframe(usage_summary)
+
+        # 일별 사용 횟수
+        daily_counts = usage_counts_by_day(db, rollup_match)
+        if daily_counts:
+            st.write("일별 사용 횟수:")
+            st.bar_chart(pd.DataFrame([{"날짜": row["_id"], "사용 횟수": row["count"]} for row in daily_counts]).set_index("날짜"))
+
+        # 모델별 비용 및 지연 시간 집계
+        model_summary = pd.DataFrame([
+            {
+                "model_name": row["_id"],
+                "요청_수": row["request_count"],
+                "요약_호출_수": row["summary_count"],
+                "입력_토큰": row["input_tokens"],
+                "출력_토큰": row["output_tokens"],
+                "캐시_읽기_토큰": row["cache_read_tokens"],
+                "캐시_쓰기_토큰": row["cache_write_tokens"],
+                "예상_비용_USD": estimate_cost(row["_id"], row["input_tokens"], row["output_tokens"],
+                                            row["cache_read_tokens"], row["cache_write_tokens"]),
+                "평균_TTFT_ms": row["ttft_ms_sum"] / row["ttft_count"] if row["ttft_count"] else None,
+                "p95_TTFT_ms(이하)": ttft_percentile(row["ttft_hist"], 95),
+                "평균_응답_시간_ms": row["duration_ms_sum"] / row["duration_count"] if row["duration_count"] else None,
+                "응답_캐시_적중률": row["response_cache_hits"] / row["response_cache_lookups"] if row["response_cache_lookups"] else None,
+                "평균_대기_ms": row["queue_wait_ms_sum"] / row["queue_wait_count"] if row["queue_wait_count"] else None,
+                "대기한_요청_수": row["queued_requests"],
+                "재시도_수": row["retries"],
+                "대체_모델_응답_수": row["fallback_requests"],
+                "헤지_요청_수": row["hedged_requests"]
+            }
+            for row in usage_totals_by_model(db, rollup_match)
+        ])
+        st.write("모델별 비용 및 지연 시간:")
+        st.dataframe(model_summary)
+
+        # 이 인스턴스의 모델 호출 대기열 상태 (제한 값 조정용)
+        st.write("모델 호출 대기열 (현재 인스턴스):")
+        st.dataframe(pd.DataFrame(get_chat_governor().snapshot()))
+        st.write("제공자별 서킷 브레이커 (현재 인스턴스):")
+        st.dataframe(pd.DataFrame(get_resilience().snapshot()))
+
+        if st.button("일별 집계 다시 만들기",
+                     help="사용량 로그가 남아 있는 날짜(보존 기간 이내)의 일별 집계만 다시 계산합니다. 그보다 오래된 집계는 그대로 둡니다."):
+            with st.spinner("일별 사용량 집계를 만드는 중입니다..."):
+                rebuild_daily_rollups(db)
+            st.rerun()
     else:
         st.warning("데이터베이스 연결이 없어 사용량 데이터를 불러올 수 없습니다.")
 
@@ -1513,7 +1777,7 @@ def main_app():
     elif st.session_state.current_page == 'shared_chatbots':
         show_shared_chatbots_page()
     elif st.session_state.current_page == 'chatbot':
-        if 'current_chatbot' in st.session_state and st.session_state.current_chatbot < len(st.session_state.user.get("chatbots", [])):
+        if find_chatbot(st.session_state.get('current_chatbot')) is not None:
             show_chatbot_page()
         else:
             st.error("선택된 챗봇을 찾을 수 없습니다.")
@@ -1536,9 +1800,6 @@ def main_app():
         st.session_state.current_page = 'home'
         show_home_page()
 
-    # 오래된 대화 내역 삭제 (1달 이상 된 내역)
-    delete_old_chat_history()
-
     # 사이드바 맨 아래에 작은 글씨 추가
     add_sidebar_footer()
 
@@ -1553,7 +1814,7 @@ def add_sidebar_footer():
 def main():
     query_params = st.query_params
     if 'chatbot_id' in query_params:
-        chatbot_id = query_params['chatbot_id'][0]
+        chatbot_id = query_params['chatbot_id']
         show_public_chatbot_page(chatbot_id)
     elif st.session_state.current_page == 'login':
         show_login_page()
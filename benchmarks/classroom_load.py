@@ -0,0 +1,331 @@
+# 수업 시간 동시 접속 부하 테스트
+# 교사가 QR 코드를 띄우면 학생들이 한꺼번에 공개 URL로 들어와 질문하는 상황을, Streamlit AppTest 세션 여러 개로
+# app.py를 그대로 실행하여 재현합니다. 세션마다 공개 챗봇 화면(show_public_chatbot_page -> start_chatting)
+# 또는 로그인한 교사의 챗봇 화면(show_chatbot_page)에서 정해진 횟수만큼 질문합니다.
+# 외부 서비스는 benchmarks/fake_services.py의 가짜 모델(TTFT, 초당 토큰 수 설정), 가짜 Sheets/GCS와
+# mongomock(또는 --mongo-uri로 지정한 로컬 mongod)으로 대신합니다.
+# --mongo-uri를 쓰면 앱도 그 서버의 테스트용 데이터베이스(--database)를 사용하며, 측정 전에 그 데이터베이스를 비웁니다.
+# 이 벤치마크가 만든 적 없는(표시 컬렉션이 없는) 데이터베이스에 데이터가 있으면 비우지 않고 중단합니다.
+#
+# 동시 세션 수를 단계별로 늘려 가며 다음을 출력합니다.
+# - TTFT(첫 토큰까지의 시간, usage_logs의 ttft_ms) p50/p95/p99, 답변 한 번의 전체 시간 p95
+# - 초당 처리한 질문 수(turns/s), 오류 수
+# - 세션당 메모리 (부하 측정이 끝난 뒤 --memory-sessions개 세션으로 따로 측정, 모든 질문을 마친 세션을 유지한 상태에서
+#   tracemalloc으로 잰 Python 메모리 증가량 / 세션 수. tracemalloc은 느려서 처리량 측정과 분리)
+# - 포화 지점: 세션을 늘려도 turns/s가 거의 늘지 않거나 p95 TTFT가 기준(--ttft-slo-ms)을 넘는 첫 단계
+#
+# 사용법 (requirements.txt와 mongomock 필요, 실제 API 키는 필요 없음):
+#   python benchmarks/classroom_load.py --levels 5,10,20,40 --turns 3 --ttft 0.6 --tokens-per-second 40
+#   LLM_LIMITS='{"providers": {"openai": {"max_concurrent": 8}}}' python benchmarks/classroom_load.py --levels 10,20
+import argparse
+import gc
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+# 가짜 google.* 모듈을 설치하기 전에 불러와야 함 (Streamlit이 실제 google.protobuf를 사용)
+from streamlit.testing.v1 import AppTest
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_services  # noqa: E402
+
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+TEACHER = "loadtest_teacher"
+QUESTIONS = [
+    "광합성이 뭐예요?",
+    "광합성에 필요한 것은 무엇인가요?",
+    "엽록체는 어디에 있나요?",
+    "호흡과 광합성의 차이를 알려 주세요.",
+    "빛의 세기가 광합성에 어떤 영향을 주나요?",
+    "이산화탄소 농도가 높아지면 어떻게 되나요?",
+]
+
+# app.py가 읽는 환경 변수 (가짜 서비스용 값, 이미 설정된 값은 유지)
+def set_environment():
+    for name, value in {
+        "MONGO_URI": "mongodb://localhost:27017",
+        "ANTHROPIC_API_KEY": "loadtest",
+        "OPENAI_API_KEY": "loadtest",
+        "GEMINI_API_KEY": "loadtest",
+        "GCP_SERVICE_ACCOUNT_KEY": '{"project_id": "loadtest"}',
+        "BASE_URL": "http://localhost:8501",
+    }.items():
+        os.environ.setdefault(name, value)
+
+# 이 벤치마크가 만든 데이터베이스임을 표시하는 컬렉션
+LOADTEST_MARKER = "loadtest_marker"
+
+# --mongo-uri의 테스트용 데이터베이스 비우기 (비어 있거나 이전 부하 테스트가 만든 데이터베이스일 때만)
+def reset_database(db):
+    names = [name for name in db.list_collection_names() if not name.startswith("system.")]
+    if names and LOADTEST_MARKER not in names:
+        sys.exit(f"{db.name} 데이터베이스에 부하 테스트가 만들지 않은 데이터가 있어 중단합니다. "
+                 "비어 있는 데이터베이스를 --database로 지정하세요.")
+    for name in names:
+        if name != LOADTEST_MARKER:
+            db[name].delete_many({})
+    db[LOADTEST_MARKER].replace_one({"_id": "classroom_load"}, {"_id": "classroom_load", "reset_at": datetime.now()},
+                                    upsert=True)
+
+# 테스트용 챗봇 하나 만들기 (공개 URL과 교사 화면이 같은 챗봇 사용)
+def seed_chatbot(db, response_cache):
+    from bson.objectid import ObjectId
+
+    chatbot_id = ObjectId()
+    db.chatbots.insert_one({
+        "_id": chatbot_id,
+        "name": "광합성 도우미",
+        "description": "부하 테스트용 챗봇",
+        "system_prompt": "당신은 고등학교 생명과학 수업을 돕는 친절한 조교입니다.",
+        "welcome_message": "안녕하세요! 광합성에 대해 물어보세요.",
+        "creator": TEACHER,
+        "background_color": "#FFFFFF",
+        "profile_image_url": "https://images.invalid/profile.png",
+        "profile_thumbnails": {},
+        "response_cache": response_cache,
+    })
+    db.messages.insert_one({"chatbot_id": chatbot_id, "role": "assistant", "content": "안녕하세요! 광합성에 대해 물어보세요.",
+                            "timestamp": datetime.now()})
+    return chatbot_id
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+# AppTest 여러 개를 스레드에서 동시에 실행할 수 있도록 준비
+# - AppTest는 실행할 때마다 전역 Runtime._instance를 가짜 Runtime으로 바꾸고 끝나면 None으로 되돌리므로,
+#   다른 세션이 실행 도중 Runtime을 잃지 않도록 마지막으로 설정된 가짜 Runtime을 계속 사용함
+# - 실행할 때마다 app.py를 새로 컴파일하는데, 여러 스레드가 동시에 ast.parse하면 Python 3.11에서 SystemError가 나므로
+#   컴파일한 코드를 프로세스 안에서 공유함
+# - AppTest는 실행하는 동안만 config.get_option을 바꿔 global.appTest를 켜는데, 동시에 실행하면 되돌리는 순서가 섞여
+#   위젯 테스트 정보가 저장되지 않으므로 처음부터 켜 둠
+def prepare_concurrent_apptest():
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    original = Runtime.instance.__func__
+    latest = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            latest["runtime"] = cls._instance
+            return cls._instance
+        return latest["runtime"] if latest else original(cls)
+
+    Runtime.instance = classmethod(instance)
+    config.set_option("global.appTest", True)
+
+    get_bytecode = ScriptCache.get_bytecode
+    compiled = {}
+    compile_lock = threading.Lock()
+
+    def shared_bytecode(self, script_path):
+        with compile_lock:
+            if script_path not in compiled:
+                compiled[script_path] = get_bytecode(self, script_path)
+            return compiled[script_path]
+
+    ScriptCache.get_bytecode = shared_bytecode
+
+# 시뮬레이션한 세션 하나 (AppTest 하나 = Streamlit 세션 하나)
+class SimulatedSession:
+    def __init__(self, index, kind, chatbot_id, model, args):
+        self.index = index
+        self.kind = kind
+        self.app = AppTest.from_file(APP_PATH, default_timeout=args.turn_timeout)
+        self.turn_seconds = []
+        self.errors = []
+        self.random = random.Random(index)
+        self.turns = args.turns
+        self.think_seconds = args.think_seconds
+        if kind == "public":
+            self.app.query_params["chatbot_id"] = str(chatbot_id)
+            self.app.query_params["model"] = model
+            self.app.session_state["user_name"] = f"학생{index}"
+        else:
+            from chatbot_store import list_user_chatbots
+
+            self.app.session_state["user"] = {"username": TEACHER, "chatbots": list_user_chatbots(args.db, TEACHER)}
+            self.app.session_state["current_page"] = "chatbot"
+            self.app.session_state["current_chatbot"] = str(chatbot_id)
+
+    def run(self, start_barrier):
+        try:
+            self.app.run()
+            self._check("open")
+            start_barrier.wait()
+            for turn in range(self.turns):
+                if turn:
+                    time.sleep(self.think_seconds * self.random.uniform(0.5, 1.5))
+                question = self.random.choice(QUESTIONS)
+                started_at = time.perf_counter()
+                self.app.chat_input[0].set_value(question).run()
+                self.turn_seconds.append(time.perf_counter() - started_at)
+                self._check(f"turn {turn + 1}")
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:
+            self.errors.append(f"{type(e).__name__}: {e}")
+
+    def _check(self, stage):
+        if self.app.exception:
+            self.errors.append(f"{stage}: {self.app.exception[0].value}")
+        for error in self.app.error:
+            self.errors.append(f"{stage}: {error.value}")
+
+# 동시 세션 수 한 단계 실행
+def run_level(level, args, chatbot_id):
+    sessions = []
+    for i in range(level):
+        kind = "teacher" if i < round(level * args.teacher_ratio) else "public"
+        sessions.append(SimulatedSession(i, kind, chatbot_id, args.model, args))
+
+    measured_from = datetime.now()
+    barrier = threading.Barrier(level + 1)
+    threads = [threading.Thread(target=session.run, args=(barrier,), daemon=True) for session in sessions]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait(timeout=args.turn_timeout * 2)
+    except threading.BrokenBarrierError:
+        pass
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    turn_seconds = [seconds for session in sessions for seconds in session.turn_seconds]
+    errors = [error for session in sessions for error in session.errors]
+    ttfts = [log["ttft_ms"] for log in args.db.usage_logs.find({"timestamp": {"$gte": measured_from}}, {"ttft_ms": 1})
+             if log.get("ttft_ms") is not None]
+    queue_waits = [log["queue_wait_ms"] for log in args.db.usage_logs.find({"timestamp": {"$gte": measured_from}},
+                                                                          {"queue_wait_ms": 1})
+                   if log.get("queue_wait_ms") is not None]
+    result = {
+        "sessions": level,
+        "turns": len(turn_seconds),
+        "errors": len(errors),
+        "turns_per_second": len(turn_seconds) / elapsed if elapsed else 0,
+        "ttft_p50_ms": percentile(ttfts, 50),
+        "ttft_p95_ms": percentile(ttfts, 95),
+        "ttft_p99_ms": percentile(ttfts, 99),
+        "turn_p95_ms": round(percentile(turn_seconds, 95) * 1000) if turn_seconds else None,
+        "queue_wait_p95_ms": percentile(queue_waits, 95),
+        "first_errors": errors[:3],
+    }
+    # 다음 단계 전에 세션 정리
+    del sessions
+    return result
+
+# 세션당 메모리 (KiB): 세션을 하나씩 끝까지 실행하고 모두 유지한 상태의 메모리 증가량 / 세션 수
+def measure_session_memory(count, args, chatbot_id):
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        sessions = []
+        barrier = threading.Barrier(1)
+        for i in range(count):
+            kind = "teacher" if i < round(count * args.teacher_ratio) else "public"
+            session = SimulatedSession(i, kind, chatbot_id, args.model, args)
+            session.think_seconds = 0
+            session.run(barrier)
+            sessions.append(session)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / count / 1024
+
+# 포화 지점: turns/s 증가가 growth_threshold 미만이거나 p95 TTFT가 기준을 넘는 첫 단계
+def find_saturation(results, ttft_slo_ms, growth_threshold=0.1):
+    previous = None
+    for result in results:
+        if result["errors"] or (result["ttft_p95_ms"] is not None and result["ttft_p95_ms"] > ttft_slo_ms):
+            return result["sessions"]
+        if previous is not None:
+            expected_growth = result["sessions"] / previous["sessions"] - 1
+            growth = result["turns_per_second"] / previous["turns_per_second"] - 1 if previous["turns_per_second"] else 0
+            if growth < expected_growth * growth_threshold:
+                return result["sessions"]
+        previous = result
+    return None
+
+def format_value(value, digits=0):
+    if value is None:
+        return "-"
+    return f"{value:.{digits}f}" if isinstance(value, float) else str(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="수업 시간 동시 접속 부하 테스트 (가짜 외부 서비스 사용)")
+    parser.add_argument("--levels", default="5,10,20,40", help="단계별 동시 세션 수 (쉼표로 구분)")
+    parser.add_argument("--turns", type=int, default=3, help="세션당 질문 수")
+    parser.add_argument("--think-seconds", type=float, default=2.0, help="질문 사이 평균 대기 시간 (초)")
+    parser.add_argument("--teacher-ratio", type=float, default=0.1, help="로그인한 교사 화면 세션 비율")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--ttft", type=float, default=0.6, help="가짜 모델의 첫 토큰 지연 (초)")
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--response-cache", default="off", choices=["off", "exact", "semantic"])
+    parser.add_argument("--ttft-slo-ms", type=int, default=3000, help="포화로 판단할 p95 TTFT (ms)")
+    parser.add_argument("--turn-timeout", type=float, default=120, help="질문 하나의 최대 실행 시간 (초)")
+    parser.add_argument("--memory-sessions", type=int, default=5, help="세션당 메모리 측정에 사용할 세션 수 (0이면 생략)")
+    parser.add_argument("--mongo-uri", help="지정하면 mongomock 대신 이 MongoDB 사용 (--database를 비우고 사용)")
+    parser.add_argument("--database", default="chatbot_platform_loadtest",
+                        help="--mongo-uri에서 앱 대신 사용할 테스트용 데이터베이스 이름 (chatbot_platform은 사용할 수 없음)")
+    args = parser.parse_args()
+
+    set_environment()
+    prepare_concurrent_apptest()
+    profile = fake_services.LatencyProfile(args.ttft, args.tokens_per_second, args.response_tokens, seed=1)
+    if args.mongo_uri and args.database == fake_services.APP_DATABASE:
+        parser.error(f"--database로 {fake_services.APP_DATABASE}은 사용할 수 없습니다. (실제 서비스 데이터베이스)")
+    client = fake_services.install({TEACHER: "loadtest-password"}, profile, args.mongo_uri, args.database)
+    args.db = client.get_database(fake_services.APP_DATABASE)
+    if args.mongo_uri:
+        reset_database(args.db)
+    chatbot_id = seed_chatbot(args.db, args.response_cache)
+
+    # 모듈 import와 캐시 초기화에 드는 시간과 메모리가 첫 단계 측정에 섞이지 않도록 한 번 먼저 실행
+    warmup = SimulatedSession(0, "public", chatbot_id, args.model, args)
+    warmup.app.run()
+    del warmup
+
+    levels = [int(level) for level in args.levels.split(",")]
+    print(f"가짜 모델: TTFT {args.ttft}s, {args.tokens_per_second} tokens/s, 응답 {args.response_tokens} tokens / "
+          f"세션당 {args.turns}회 질문, 교사 화면 비율 {args.teacher_ratio}")
+    header = ["sessions", "turns", "errors", "turns/s", "TTFT p50", "TTFT p95", "TTFT p99", "turn p95", "queue p95"]
+    print(" | ".join(f"{column:>11}" for column in header))
+    results = []
+    for level in levels:
+        result = run_level(level, args, chatbot_id)
+        results.append(result)
+        row = [result["sessions"], result["turns"], result["errors"], format_value(result["turns_per_second"], 2),
+               format_value(result["ttft_p50_ms"]), format_value(result["ttft_p95_ms"]), format_value(result["ttft_p99_ms"]),
+               format_value(result["turn_p95_ms"]), format_value(result["queue_wait_p95_ms"])]
+        print(" | ".join(f"{format_value(value):>11}" for value in row))
+        for error in result["first_errors"]:
+            print(f"    오류 예: {error}")
+
+    saturation = find_saturation(results, args.ttft_slo_ms)
+    if saturation is None:
+        print(f"포화 지점: 측정한 범위({levels[-1]} 세션)까지 포화되지 않음")
+    else:
+        print(f"포화 지점: 동시 세션 약 {saturation}개 (turns/s가 더 늘지 않거나 p95 TTFT > {args.ttft_slo_ms}ms)")
+
+    if args.memory_sessions > 0:
+        memory = measure_session_memory(args.memory_sessions, args, chatbot_id)
+        print(f"세션당 메모리: 약 {memory:.1f} KiB (세션 {args.memory_sessions}개, 세션당 질문 {args.turns}회)")
+
+if __name__ == "__main__":
+    main()
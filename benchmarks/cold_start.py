@@ -0,0 +1,216 @@
+# 콜드 스타트 / 화면별 import 측정
+# 새 프로세스에서 화면 하나를 처음 여는 데 걸리는 시간을 화면마다 따로 잽니다. (Cloud Run 인스턴스가 새로 뜬 직후의 첫 요청)
+# - streamlit import 시간, app.py가 맨 위에서 불러오는 모듈의 import 시간
+# - AppTest로 app.py를 처음 실행하는 시간 (MongoDB 연결, 인덱스 확인, 화면 그리기 포함)
+# - 그 화면을 여는 동안 불러온 무거운 모듈 (모델 SDK, Google Sheets/Cloud Storage, pandas 등)
+# 화면마다 불러오면 안 되는 모듈이 정해져 있어(ROUTES), 불러왔거나 시간 기준(--budget-ms, --import-budget-ms)을 넘으면
+# 종료 코드 1로 끝납니다. 외부 서비스는 benchmarks/fake_services.py의 가짜 모듈(import할 때만 로드됨)과 mongomock을 사용합니다.
+# 실제 SDK가 설치되어 있으면 각 모듈을 새 프로세스에서 import하는 시간도 함께 출력합니다. (지연 로딩으로 아끼는 시간)
+#
+# 사용법 (requirements.txt와 mongomock 필요, 실제 API 키는 필요 없음):
+#   python benchmarks/cold_start.py
+#   python benchmarks/cold_start.py --routes public,login --budget-ms 1500 --repeat 3
+import argparse
+import ast
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+TEACHER = "coldstart_teacher"
+PASSWORD = "coldstart-password"
+
+# 화면을 여는 데 필요하지 않아야 하는 무거운 모듈
+MODEL_SDKS = ["openai", "anthropic", "google.generativeai"]
+GOOGLE_APIS = ["gspread", "google.oauth2.service_account", "google.cloud.storage"]
+DATA_LIBRARIES = ["pandas", "pyarrow", "numpy"]
+HEAVY_MODULES = MODEL_SDKS + GOOGLE_APIS + DATA_LIBRARIES + ["requests", "PIL.Image"]
+
+# 화면 -> (설명, 불러오면 안 되는 모듈)
+ROUTES = {
+    "public": ("공개 챗봇 URL 첫 화면 (학생 이름 입력)", HEAVY_MODULES),
+    "login": ("로그인 화면", HEAVY_MODULES),
+    "login_submit": ("로그인 버튼 클릭 (Google Sheets 계정 확인)",
+                     MODEL_SDKS + DATA_LIBRARIES + ["google.cloud.storage", "requests", "PIL.Image"]),
+    "home": ("로그인한 교사 홈 화면", HEAVY_MODULES),
+    "usage": ("관리자 사용량 데이터 화면", MODEL_SDKS + GOOGLE_APIS + ["requests", "PIL.Image"]),
+}
+
+# app.py가 읽는 환경 변수 (가짜 서비스용 값, 이미 설정된 값은 유지)
+def set_environment():
+    for name, value in {
+        "MONGO_URI": "mongodb://localhost:27017",
+        "ANTHROPIC_API_KEY": "coldstart",
+        "OPENAI_API_KEY": "coldstart",
+        "GEMINI_API_KEY": "coldstart",
+        "GCP_SERVICE_ACCOUNT_KEY": '{"project_id": "coldstart"}',
+        "BASE_URL": "http://localhost:8501",
+    }.items():
+        os.environ.setdefault(name, value)
+
+# app.py 맨 위의 import 문에 나오는 모듈 이름
+def app_top_level_modules():
+    with open(APP_PATH, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return modules
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+# 화면 하나 측정 (새 프로세스 안에서 실행, 결과를 JSON 한 줄로 출력)
+def measure_route(route, timeout):
+    set_environment()
+    started_at = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = (time.perf_counter() - started_at) * 1000
+
+    sys.path.insert(0, REPO_ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fake_services
+
+    client = fake_services.install({TEACHER: PASSWORD}, fake_services.LatencyProfile(0, 1000, 1))
+    db = client.get_database("chatbot_platform")
+
+    started_at = time.perf_counter()
+    for module in app_top_level_modules():
+        importlib.import_module(module)
+    app_import_ms = (time.perf_counter() - started_at) * 1000
+
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    if route == "public":
+        from bson.objectid import ObjectId
+
+        chatbot_id = ObjectId()
+        db.chatbots.insert_one({"_id": chatbot_id, "name": "광합성 도우미", "system_prompt": "당신은 친절한 조교입니다.",
+                                "welcome_message": "안녕하세요!", "creator": TEACHER})
+        app.query_params["chatbot_id"] = str(chatbot_id)
+        app.query_params["model"] = "gpt-4o"
+    elif route in ("home", "usage"):
+        username = "admin" if route == "usage" else TEACHER
+        app.session_state["user"] = {"username": username, "chatbots": []}
+        app.session_state["current_page"] = "usage_data" if route == "usage" else "home"
+        if route == "usage":
+            from datetime import datetime
+            from usage_stats import log_usage
+
+            for model in ("gpt-4o", "claude-3-haiku-20240307"):
+                log_usage(db, TEACHER, model, datetime.now(), tokens_used=100)
+
+    started_at = time.perf_counter()
+    app.run()
+    first_run_ms = (time.perf_counter() - started_at) * 1000
+    if route == "login_submit":
+        app.text_input(key="login_username").input(TEACHER)
+        app.text_input(key="login_password").input(PASSWORD)
+        started_at = time.perf_counter()
+        app.button[0].click().run()
+        first_run_ms += (time.perf_counter() - started_at) * 1000
+
+    errors = [element.value for element in app.error] + [str(exception.value) for exception in app.exception]
+    if route == "login_submit" and app.session_state["current_page"] != "home":
+        errors.append("로그인 후 홈 화면으로 이동하지 않았습니다.")
+    return {
+        "route": route,
+        "streamlit_import_ms": streamlit_ms,
+        "app_import_ms": app_import_ms,
+        "first_run_ms": first_run_ms,
+        "imported": loaded_heavy_modules(),
+        "errors": errors,
+    }
+
+def run_child(args, *extra):
+    command = [sys.executable, os.path.abspath(__file__), *extra]
+    started_at = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout + 60)
+    process_ms = (time.perf_counter() - started_at) * 1000
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("{"):
+            result = json.loads(line)
+            result["process_ms"] = process_ms
+            return result
+    raise RuntimeError(f"측정 프로세스가 결과 없이 끝났습니다: {' '.join(extra)}\n{completed.stderr[-2000:]}")
+
+# 실제 SDK를 새 프로세스에서 import하는 시간 (설치되어 있지 않으면 None)
+def measure_import(module):
+    code = ("import importlib.util, time, json\n"
+            f"found = importlib.util.find_spec({module.split('.')[0]!r}) is not None\n"
+            "started_at = time.perf_counter()\n"
+            f"exec('import {module}') if found else None\n"
+            "print(json.dumps((time.perf_counter() - started_at) * 1000 if found else None))\n")
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="화면별 콜드 스타트와 import 측정 (가짜 외부 서비스 사용)")
+    parser.add_argument("--routes", default=",".join(ROUTES), help=f"측정할 화면 (쉼표로 구분, {', '.join(ROUTES)})")
+    parser.add_argument("--repeat", type=int, default=1, help="화면마다 새 프로세스로 측정할 횟수 (중앙값 사용)")
+    parser.add_argument("--budget-ms", type=float, default=3000, help="app.py 첫 실행 시간 기준 (ms)")
+    parser.add_argument("--import-budget-ms", type=float, default=1500,
+                        help="streamlit과 app.py 맨 위 모듈의 import 시간 합계 기준 (ms)")
+    parser.add_argument("--skip-sdk-imports", action="store_true", help="실제 SDK의 import 시간 측정 생략")
+    parser.add_argument("--timeout", type=float, default=60, help="화면 하나의 최대 실행 시간 (초)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_route(args.child, args.timeout), ensure_ascii=False))
+        return
+
+    routes = [route.strip() for route in args.routes.split(",") if route.strip()]
+    unknown = [route for route in routes if route not in ROUTES]
+    if unknown:
+        parser.error(f"알 수 없는 화면: {', '.join(unknown)}")
+
+    failures = []
+    header = ["route", "streamlit", "app import", "first run", "process"]
+    print(" | ".join(f"{column:>12}" for column in header) + " | 불러온 무거운 모듈")
+    for route in routes:
+        results = [run_child(args, "--child", route) for _ in range(args.repeat)]
+        median = {key: statistics.median(result[key] for result in results)
+                  for key in ("streamlit_import_ms", "app_import_ms", "first_run_ms", "process_ms")}
+        imported = sorted(set().union(*(result["imported"] for result in results)))
+        row = [route] + [f"{median[key]:.0f} ms" for key in ("streamlit_import_ms", "app_import_ms", "first_run_ms", "process_ms")]
+        print(" | ".join(f"{value:>12}" for value in row) + f" | {', '.join(imported) or '-'}")
+
+        description, forbidden = ROUTES[route]
+        violations = [name for name in imported if name in forbidden]
+        if violations:
+            failures.append(f"{route} ({description}): 불러오면 안 되는 모듈 {', '.join(violations)}")
+        import_ms = median["streamlit_import_ms"] + median["app_import_ms"]
+        if import_ms > args.import_budget_ms:
+            failures.append(f"{route}: import {import_ms:.0f} ms > 기준 {args.import_budget_ms:.0f} ms")
+        if median["first_run_ms"] > args.budget_ms:
+            failures.append(f"{route}: 첫 실행 {median['first_run_ms']:.0f} ms > 기준 {args.budget_ms:.0f} ms")
+        for error in results[0]["errors"][:3]:
+            failures.append(f"{route}: 화면 오류 {error}")
+
+    if not args.skip_sdk_imports:
+        costs = [(module, measure_import(module)) for module in HEAVY_MODULES]
+        costs = [(module, ms) for module, ms in costs if ms is not None]
+        if costs:
+            print("\n실제 모듈 import 시간 (새 프로세스, 해당 화면에서 처음 쓸 때만 발생):")
+            for module, ms in sorted(costs, key=lambda item: -item[1]):
+                print(f"  {module:<30} {ms:>7.0f} ms")
+
+    if failures:
+        print("\n기준 미달:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\n모든 화면이 기준을 만족합니다.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# 부하 테스트용 외부 서비스 대역
+# app.py가 사용하는 OpenAI / Anthropic / Gemini SDK, Google Sheets(gspread), Google 인증, Cloud Storage를
+# 같은 이름의 가짜 모듈로 바꿔 끼웁니다. (install을 app.py 실행 전에 호출해야 함, 가짜 모듈은 실제로 import될 때 로드됨)
+# 가짜 모델은 설정한 첫 토큰 지연(TTFT)과 초당 토큰 수로 응답을 흘려 보내며, MongoDB는 mongomock 또는 실제 mongod를 사용합니다.
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import random
+import sys
+import threading
+import time
+import types
+from types import SimpleNamespace
+
+WORDS = ["학생", "여러분", "오늘은", "광합성에", "대해", "알아봅시다.", "빛", "에너지가", "화학", "에너지로", "바뀝니다.\n"]
+
+# 모델 응답 속도 설정
+class LatencyProfile:
+    def __init__(self, ttft_seconds=0.6, tokens_per_second=40, response_tokens=120, jitter=0.2, seed=None):
+        self.ttft_seconds = ttft_seconds
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _jittered(self, value):
+        with self.lock:
+            return value * (1 + self.random.uniform(-self.jitter, self.jitter))
+
+    # 응답 토큰을 실제 시간에 맞춰 내보냄
+    def tokens(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self._jittered(self.ttft_seconds))
+        interval = 1 / self.tokens_per_second
+        for i in range(self.response_tokens):
+            if i:
+                time.sleep(interval)
+            yield WORDS[i % len(WORDS)] + " "
+
+# ---- OpenAI ----
+class _OpenAICompletions:
+    def __init__(self, profile):
+        self.profile = profile
+
+    def create(self, model, messages, stream=False, stream_options=None, max_tokens=None, **kwargs):
+        if not stream:
+            # 대화 요약 호출
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="이전 대화 요약"))])
+        return self._stream(messages)
+
+    def _stream(self, messages):
+        count = 0
+        for token in self.profile.tokens():
+            count += 1
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        prompt_tokens = sum(len(str(message["content"])) for message in messages) // 2
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=count,
+                                                                prompt_tokens_details=None))
+
+class _OpenAIImages:
+    def generate(self, model, prompt, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(url=f"https://images.invalid/{abs(hash(prompt))}.png")])
+
+class FakeOpenAI:
+    profile = LatencyProfile()
+
+    def __init__(self, api_key=None, **kwargs):
+        self.chat = SimpleNamespace(completions=_OpenAICompletions(self.profile))
+        self.images = _OpenAIImages()
+
+# ---- Anthropic ----
+class _AnthropicStream:
+    def __init__(self, profile, messages):
+        self.profile = profile
+        self.messages = messages
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        for token in self.profile.tokens():
+            self.count += 1
+            yield token
+
+    def get_final_message(self):
+        input_tokens = sum(len(str(message["content"])) for message in self.messages) // 2
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=self.count,
+                                                     cache_read_input_tokens=0, cache_creation_input_tokens=0))
+
+class FakeAnthropic:
+    profile = LatencyProfile()
+
+    def __init__(self, api_key=None, **kwargs):
+        self.messages = SimpleNamespace(stream=lambda messages, **options: _AnthropicStream(self.profile, messages))
+
+# ---- Gemini ----
+class _GeminiResponse:
+    def __init__(self, profile):
+        self.profile = profile
+        self.usage_metadata = None
+
+    def __iter__(self):
+        count = 0
+        for token in self.profile.tokens():
+            count += 1
+            yield SimpleNamespace(text=token)
+        self.usage_metadata = SimpleNamespace(prompt_token_count=100, candidates_token_count=count,
+                                              cached_content_token_count=0)
+
+class FakeGenerativeModel:
+    profile = LatencyProfile()
+
+    def __init__(self, model, system_instruction=None):
+        self.model = model
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        return _GeminiResponse(self.profile)
+
+# ---- Google Sheets ----
+class FakeWorksheet:
+    def __init__(self, accounts):
+        self.rows = [["아이디", "비밀번호"]] + [[username, password] for username, password in accounts.items()]
+
+    def get_all_values(self):
+        return [list(row) for row in self.rows]
+
+    def update_cell(self, row, col, value):
+        self.rows[row - 1][col - 1] = value
+
+# ---- Cloud Storage ----
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.cache_control = None
+        self.chunk_size = None
+        self.size = None
+
+    def upload_from_file(self, file, content_type=None, size=None):
+        data = file.read()
+        self.size = len(data)
+        self.bucket.objects[self.name] = data
+
+    def upload_from_string(self, data, content_type=None):
+        self.size = len(data)
+        self.bucket.objects[self.name] = data
+
+    def patch(self):
+        pass
+
+class FakeBucket:
+    def __init__(self, name):
+        self.name = name
+        self.objects = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+class FakeStorageClient:
+    buckets = {}
+
+    def __init__(self, credentials=None, project=None):
+        pass
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket(name))
+
+# 가짜 모듈은 import할 때 sys.modules에 올라가도록 import 경로 맨 앞의 finder가 제공함
+# (어떤 화면이 어떤 SDK를 불러오는지 benchmarks/cold_start.py에서 sys.modules로 확인할 수 있음)
+class _FakeModuleFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def __init__(self):
+        self.modules = {}
+
+    def find_spec(self, name, path=None, target=None):
+        if name not in self.modules:
+            return None
+        return importlib.machinery.ModuleSpec(name, self, is_package=True)
+
+    def create_module(self, spec):
+        return self.modules[spec.name]
+
+    def exec_module(self, module):
+        pass
+
+_finder = _FakeModuleFinder()
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    _finder.modules[name] = module
+    # 이미 불러온 실제 모듈은 다음 import부터 가짜 모듈로 바뀌도록 제거
+    sys.modules.pop(name, None)
+    return module
+
+# 앱이 사용하는 데이터베이스 이름 (app.py, public_server.py)
+APP_DATABASE = "chatbot_platform"
+
+# 가짜 모듈 설치
+# accounts: 스프레드시트 계정 {아이디: 비밀번호}, profile: 모든 가짜 모델에 적용할 LatencyProfile
+# mongo_uri를 주지 않으면 pymongo.MongoClient를 프로세스 안에서 공유하는 mongomock 클라이언트로 바꿈
+# mongo_uri를 주면 앱의 MONGO_URI와 상관없이 mongo_uri로 연결하고, 앱의 데이터베이스 대신 database를 사용하게 함
+# (실제 서비스 데이터베이스를 건드리지 않도록)
+def install(accounts, profile, mongo_uri=None, database=None):
+    FakeOpenAI.profile = FakeAnthropic.profile = FakeGenerativeModel.profile = profile
+    if _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+
+    _module("openai", OpenAI=FakeOpenAI)
+    _module("anthropic", Anthropic=FakeAnthropic)
+
+    worksheet = FakeWorksheet(accounts)
+    gspread_exceptions = _module("gspread.exceptions", SpreadsheetNotFound=type("SpreadsheetNotFound", (Exception,), {}),
+                                 NoValidUrlKeyFound=type("NoValidUrlKeyFound", (Exception,), {}),
+                                 APIError=type("APIError", (Exception,), {}))
+    _module("gspread", exceptions=gspread_exceptions,
+            authorize=lambda creds: SimpleNamespace(open_by_url=lambda url: SimpleNamespace(sheet1=worksheet)))
+
+    credentials = type("Credentials", (), {"from_service_account_info": staticmethod(lambda info, scopes=None: object())})
+    # protobuf 등 실제 google 네임스페이스 패키지가 있으면 그대로 두고 하위 모듈만 바꿈
+    if "google" not in sys.modules and importlib.util.find_spec("google") is None:
+        _module("google")
+    _module("google.oauth2")
+    _module("google.oauth2.service_account", Credentials=credentials)
+    _module("google.auth")
+    _module("google.auth.exceptions", GoogleAuthError=type("GoogleAuthError", (Exception,), {}))
+    _module("google.cloud")
+    _module("google.cloud.storage", Client=FakeStorageClient)
+    _module("google.generativeai", configure=lambda api_key=None: None, GenerativeModel=FakeGenerativeModel)
+
+    import pymongo
+    if mongo_uri is None:
+        import mongomock
+        shared_client = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *args, **kwargs: shared_client
+        return shared_client
+    if not database or database == APP_DATABASE:
+        raise ValueError(f"실제 MongoDB를 사용할 때는 {APP_DATABASE}이 아닌 테스트용 데이터베이스 이름이 필요합니다.")
+
+    class RedirectedMongoClient(pymongo.MongoClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(mongo_uri)
+
+        def get_database(self, name=None, *args, **kwargs):
+            return super().get_database(database if name == APP_DATABASE else name, *args, **kwargs)
+
+    pymongo.MongoClient = RedirectedMongoClient
+    return RedirectedMongoClient()
@@ -0,0 +1,120 @@
+# 공개 챗봇 경량 서버(public_server.py) 동시 접속 측정
+# uvicorn으로 서버를 이 프로세스 안에서 띄우고(가짜 모델/MongoDB, benchmarks/fake_services.py), 학생 수만큼 WebSocket으로
+# 동시에 접속해 질문합니다. 학생마다 이름 입력 -> 질문 --turns회를 하고, 다음을 출력합니다.
+# - 첫 텍스트 조각까지의 시간(TTFT, 클라이언트 기준) p50/p95/p99, 답변 전체 시간 p95, 오류 수
+# - 서버 프로세스 CPU 시간 (전체, 질문 하나당) -> 코어 하나로 처리할 수 있는 동시 학생 수를 가늠
+# 가짜 모델의 TTFT와 초당 토큰 수는 실제 모델과 비슷하게 두고, 호출 수 제한에 걸리지 않도록 LLM_LIMITS를 넉넉히 잡아야
+# 서버 자체의 처리 능력을 볼 수 있습니다.
+#
+# 사용법 (requirements.txt와 mongomock 필요, 실제 API 키는 필요 없음):
+#   LLM_LIMITS='{"providers": {"openai": {"max_concurrent": 1000, "requests_per_minute": 100000, "burst": 1000}}}' \
+#     python benchmarks/public_server_load.py --students 300 --turns 2
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_services  # noqa: E402
+
+QUESTIONS = ["광합성이 뭐예요?", "엽록체는 어디에 있나요?", "호흡과 광합성의 차이를 알려 주세요."]
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+# 학생 한 명 (WebSocket 연결 하나)
+async def student(index, url, chatbot_id, args, results):
+    import websockets
+
+    try:
+        async with websockets.connect(url, max_size=None) as socket:
+            await socket.send(json.dumps({"type": "start", "chatbot_id": chatbot_id, "model": args.model,
+                                          "user_name": f"학생{index}"}))
+            json.loads(await socket.recv())
+            for turn in range(args.turns):
+                started_at = time.perf_counter()
+                first_text_at = None
+                await socket.send(json.dumps({"type": "message",
+                                              "content": f"{QUESTIONS[(index + turn) % len(QUESTIONS)]} ({index}-{turn})"}))
+                while True:
+                    event = json.loads(await asyncio.wait_for(socket.recv(), args.turn_timeout))
+                    if event["type"] == "text" and first_text_at is None:
+                        first_text_at = time.perf_counter()
+                    elif event["type"] == "done":
+                        break
+                    elif event["type"] == "error":
+                        raise RuntimeError(event["message"])
+                finished_at = time.perf_counter()
+                results["ttft_ms"].append((first_text_at - started_at) * 1000 if first_text_at else None)
+                results["turn_ms"].append((finished_at - started_at) * 1000)
+    except Exception as e:
+        results["errors"].append(f"{type(e).__name__}: {e}")
+
+async def run_students(url, chatbot_id, args):
+    results = {"ttft_ms": [], "turn_ms": [], "errors": []}
+    await asyncio.gather(*(student(i, url, chatbot_id, args, results) for i in range(args.students)))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="공개 챗봇 경량 서버 동시 접속 측정 (가짜 외부 서비스 사용)")
+    parser.add_argument("--students", type=int, default=300, help="동시에 접속하는 학생 수")
+    parser.add_argument("--turns", type=int, default=2, help="학생당 질문 수")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--ttft", type=float, default=0.6, help="가짜 모델의 첫 토큰 지연 (초)")
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--turn-timeout", type=float, default=120, help="질문 하나의 최대 대기 시간 (초)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for name in ("MONGO_URI", "ANTHROPIC_API_KEY", "OPENAI_API_KEY", "GEMINI_API_KEY"):
+        os.environ.setdefault(name, "loadtest")
+    profile = fake_services.LatencyProfile(args.ttft, args.tokens_per_second, args.response_tokens, seed=1)
+    client = fake_services.install({}, profile)
+    db = client.get_database("chatbot_platform")
+    from bson.objectid import ObjectId
+
+    chatbot_id = ObjectId()
+    db.chatbots.insert_one({"_id": chatbot_id, "name": "광합성 도우미", "system_prompt": "당신은 친절한 조교입니다.",
+                            "welcome_message": "안녕하세요!", "creator": "loadtest_teacher"})
+
+    import uvicorn
+    import public_server
+
+    server = uvicorn.Server(uvicorn.Config(public_server.app, host="127.0.0.1", port=args.port, log_level="warning",
+                                           ws_max_queue=64))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    cpu_before = time.process_time()
+    started_at = time.perf_counter()
+    results = asyncio.run(run_students(f"ws://127.0.0.1:{args.port}/ws/chat", str(chatbot_id), args))
+    elapsed = time.perf_counter() - started_at
+    # 클라이언트도 같은 프로세스에서 실행되므로 CPU 시간은 서버 사용량의 상한
+    cpu_seconds = time.process_time() - cpu_before
+    server.should_exit = True
+
+    ttfts = [value for value in results["ttft_ms"] if value is not None]
+    turns = len(results["turn_ms"])
+    print(f"가짜 모델: TTFT {args.ttft}s, {args.tokens_per_second} tokens/s, 응답 {args.response_tokens} tokens")
+    print(f"학생 {args.students}명 x 질문 {args.turns}회: 완료 {turns}회, 오류 {len(results['errors'])}건, {elapsed:.1f}초")
+    print(f"TTFT p50/p95/p99: {percentile(ttfts, 50):.0f} / {percentile(ttfts, 95):.0f} / {percentile(ttfts, 99):.0f} ms"
+          if ttfts else "TTFT: -")
+    if results["turn_ms"]:
+        print(f"답변 전체 시간 p95: {percentile(results['turn_ms'], 95):.0f} ms")
+    print(f"CPU 시간 (서버+클라이언트): {cpu_seconds:.2f}초, 질문당 {cpu_seconds / max(turns, 1) * 1000:.1f} ms, "
+          f"평균 CPU 사용률 {cpu_seconds / elapsed * 100:.0f}%")
+    for error in results["errors"][:3]:
+        print(f"    오류 예: {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# 리런 지연 시간 벤치마크
+# app.py 상단의 연결 설정을 "매 리런마다 새로 생성"(기존 방식)과 "프로세스당 한 번 생성 후 재사용"(캐시 방식)으로
+# 각각 반복 실행하여 리런 1회당 평균/최대 소요 시간을 비교합니다.
+#
+# 사용법 (app.py와 동일한 환경 변수 필요):
+#   MONGO_URI=... ANTHROPIC_API_KEY=... OPENAI_API_KEY=... GEMINI_API_KEY=... \
+#   GCP_SERVICE_ACCOUNT_KEY='{...}' python benchmarks/rerun_latency.py --reruns 20
+import argparse
+import json
+import os
+import statistics
+import time
+
+from anthropic import Anthropic
+from openai import OpenAI
+import google.generativeai as genai
+from pymongo import MongoClient
+from google.oauth2.service_account import Credentials
+import gspread
+from google.cloud import storage
+
+SCOPES = [
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/drive',
+    'https://www.googleapis.com/auth/devstorage.read_write'
+]
+SHEET_URL = "https://docs.google.com/spreadsheets/d/1ql6GXd3KYPywP3wNeXrgJTfWf8aCP8fGXUvGYbmlmic/edit?gid=0"
+
+# 기존 app.py 상단 설정과 동일한 작업 (리런마다 실행되던 부분)
+def connect_all():
+    mongo_client = MongoClient(os.environ["MONGO_URI"])
+    db = mongo_client.get_database("chatbot_platform")
+    anthropic_client = Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+    openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    service_account_info = json.loads(os.environ["GCP_SERVICE_ACCOUNT_KEY"])
+    creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    gs_client = gspread.authorize(creds)
+    storage_client = storage.Client(credentials=creds, project=service_account_info['project_id'])
+    sheet = gs_client.open_by_url(SHEET_URL).sheet1
+    return {"db": db, "sheet": sheet, "anthropic": anthropic_client, "openai": openai_client, "storage": storage_client}
+
+# 리런 한 번에서 실제로 수행되는 대표적인 작업 (사용자 조회 1회)
+def simulate_rerun_work(services):
+    services["db"].users.find_one({"username": "admin"}, {"_id": 1})
+
+def run_uncached(reruns):
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        services = connect_all()
+        simulate_rerun_work(services)
+        timings.append(time.perf_counter() - start)
+        services["db"].client.close()
+    return timings
+
+def run_cached(reruns):
+    services = connect_all()
+    simulate_rerun_work(services)  # 첫 연결(콜드 스타트)은 측정에서 제외
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        simulate_rerun_work(services)
+        timings.append(time.perf_counter() - start)
+    services["db"].client.close()
+    return timings
+
+def report(label, timings):
+    ms = [t * 1000 for t in timings]
+    print(f"{label:<10} 평균 {statistics.mean(ms):8.1f} ms | 중앙값 {statistics.median(ms):8.1f} ms | 최대 {max(ms):8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="리런 지연 시간: 연결 캐시 전/후 비교")
+    parser.add_argument("--reruns", type=int, default=10)
+    args = parser.parse_args()
+
+    report("기존 방식", run_uncached(args.reruns))
+    report("캐시 방식", run_cached(args.reruns))
+
+if __name__ == "__main__":
+    main()
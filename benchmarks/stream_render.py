@@ -0,0 +1,78 @@
+# 스트리밍 응답 표시 벤치마크
+# 약 4k 토큰 응답을 청크 단위로 흘려 보내면서, 기존 방식(청크마다 전체 응답을 다시 전송)과
+# StreamRenderer(시간/글자 수 기준으로 모아서 전송)의 전송 바이트 수, 전송 횟수, CPU 시간을 비교합니다.
+# Streamlit 없이 실행되며, placeholder 대신 전송 내용을 직렬화만 하는 가짜 객체를 사용합니다.
+#
+# 사용법:
+#   python benchmarks/stream_render.py --tokens 4000 --tokens-per-second 60
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stream_renderer import StreamRenderer  # noqa: E402
+
+# st.empty()와 같은 역할을 하는 가짜 placeholder (웹소켓으로 보낼 메시지 직렬화 비용만 재현)
+class FakePlaceholder:
+    def __init__(self):
+        self.bytes_pushed = 0
+        self.push_count = 0
+
+    def markdown(self, content):
+        payload = json.dumps({"type": "markdown", "body": content}, ensure_ascii=False).encode("utf-8")
+        self.bytes_pushed += len(payload)
+        self.push_count += 1
+
+# 토큰 도착 시각을 흉내 내는 가짜 시계 (실제로 기다리지 않음)
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_chunks(tokens):
+    words = ["학생", "여러분", "오늘은", "광합성에", "대해", "알아봅시다.", "Photosynthesis", "converts", "light", "energy.\n"]
+    return [words[i % len(words)] + " " for i in range(tokens)]
+
+def run_before(chunks):
+    placeholder = FakePlaceholder()
+    start = time.process_time()
+    full_response = ""
+    for chunk in chunks:
+        full_response += chunk
+        placeholder.markdown(full_response + "▌")
+    placeholder.markdown(full_response)
+    return placeholder, time.process_time() - start
+
+def run_after(chunks, tokens_per_second, flush_interval_ms, flush_chars):
+    placeholder = FakePlaceholder()
+    clock = FakeClock()
+    start = time.process_time()
+    renderer = StreamRenderer(placeholder, flush_interval_ms, flush_chars, clock=clock)
+    for chunk in chunks:
+        clock.now += 1 / tokens_per_second
+        renderer.append(chunk)
+    renderer.finish()
+    return placeholder, time.process_time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="스트리밍 응답 표시: 청크별 전송 vs 묶음 전송")
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--flush-interval-ms", type=int, default=200)
+    parser.add_argument("--flush-chars", type=int, default=500)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.tokens)
+    before, before_cpu = run_before(chunks)
+    after, after_cpu = run_after(chunks, args.tokens_per_second, args.flush_interval_ms, args.flush_chars)
+
+    print(f"응답 길이: {sum(len(c) for c in chunks)}자, 청크 {len(chunks)}개")
+    for label, placeholder, cpu in (("기존 방식", before, before_cpu), ("묶음 전송", after, after_cpu)):
+        print(f"{label:<8} 전송 {placeholder.push_count:6d}회 | {placeholder.bytes_pushed / 1024 / 1024:8.2f} MiB | CPU {cpu * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# 공유 챗봇 목록 캐시
+# 공유 챗봇 화면은 매 실행마다 shared_chatbots 전체를 읽지 않고, 범주 목록과 범주별 카드 페이지를 짧은 TTL 동안 메모리에서 제공합니다.
+# 카드 표시에 필요한 필드만 읽으며, 공유 챗봇을 만들거나 수정/삭제하면 invalidate로 바로 비웁니다.
+# (다른 인스턴스에서 바뀐 내용은 TTL이 지나면 반영됩니다.)
+import threading
+import time
+
+from pymongo import ASCENDING
+
+from chatbot_store import CARD_PROJECTION
+
+# 범주가 없는 챗봇을 표시할 범주 이름
+DEFAULT_CATEGORY = "기타"
+
+# 범주 이름으로 조회 조건 만들기 ('기타'에는 범주가 없는 챗봇도 포함)
+def category_filter(category):
+    if category == DEFAULT_CATEGORY:
+        return {"category": {"$in": [None, "", DEFAULT_CATEGORY]}}
+    return {"category": category}
+
+class SharedChatbotCatalog:
+    def __init__(self, db, ttl_seconds=60, page_size=12, clock=time.monotonic):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.page_size = page_size
+        self.clock = clock
+        self.entries = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    # [(범주, 챗봇 수)] (범주 이름순)
+    def categories(self):
+        def load():
+            counts = {}
+            for row in self.db.shared_chatbots.aggregate([{"$group": {"_id": "$category", "count": {"$sum": 1}}}]):
+                category = row["_id"] or DEFAULT_CATEGORY
+                counts[category] = counts.get(category, 0) + row["count"]
+            return sorted(counts.items())
+        return self._cached(("categories",), load)
+
+    # 범주 선택 상자용 이름 목록
+    def category_names(self):
+        return [category for category, _ in self.categories()]
+
+    # 범주의 page번째(1부터) 카드 목록
+    def page(self, category, page):
+        def load():
+            return list(self.db.shared_chatbots.find(category_filter(category), CARD_PROJECTION)
+                        .sort("_id", ASCENDING)
+                        .skip((page - 1) * self.page_size)
+                        .limit(self.page_size))
+        return self._cached(("page", category, page), load)
+
+    def page_count(self, category):
+        count = dict(self.categories()).get(category, 0)
+        return max(1, (count + self.page_size - 1) // self.page_size)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+    def _cached(self, key, load):
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            generation = self.generation
+        value = load()
+        with self.lock:
+            # 읽는 동안 invalidate되었으면 이전 내용일 수 있으므로 저장하지 않음
+            if generation == self.generation:
+                self.entries[key] = (now + self.ttl_seconds, value)
+        return value
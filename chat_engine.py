@@ -0,0 +1,469 @@
+# 채팅 엔진
+# OpenAI / Gemini / Claude 호출을 제공자별 어댑터로 감싸고, 모든 채팅 화면이 ChatEngine.stream 하나만 사용하도록 합니다.
+# stream은 응답 텍스트 조각(str)을 순서대로 내보낸 뒤, 마지막에 토큰 수와 지연 시간을 담은 ChatUsage를 내보냅니다.
+# 대화 상태(context_state)를 넘기면 모든 제공자에 대해 같은 방식으로 토큰 예산에 맞춰 대화 내역을 줄입니다.
+# 오래된 대화의 요약은 답변을 모두 내보낸 뒤 같은 제공자의 작은 모델(SUMMARY_MODELS)로 만들고,
+# 그 호출의 사용량을 purpose="summary"인 ChatUsage로 한 번 더 내보냅니다.
+# 프롬프트 캐시: 선생님이 작성한 시스템 프롬프트를 항상 맨 앞에 두고(대화 요약은 그 뒤에 따로), Claude는 시스템 프롬프트와
+# 직전까지의 대화에 캐시 지점(cache_control)을 표시합니다. 캐시 읽기/쓰기 토큰 수는 ChatUsage에 기록됩니다.
+# 호출 수 제한(governor)을 넘기면 제공자 호출 전에 차례를 기다리며, 대기 시간과 대기 순서도 ChatUsage에 기록됩니다. (admission.py 참고)
+# 장애 대응(resilience)을 넘기면 첫 토큰 전까지 기한, 재시도, 대체 모델, 헤지 요청을 적용하고
+# 실제로 답한 모델과 전환 기록을 ChatUsage에 남깁니다. (resilience.py 참고)
+# 클라이언트 대신 LazyClient를 넘기면 SDK import와 클라이언트 생성을 해당 제공자를 처음 호출할 때로 미룹니다.
+import functools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from admission import is_rate_limit_error
+from context_window import ContextManager, format_summary, summary_request
+from resilience import (CircuitOpenError, StreamAttempt, StreamDeadlineExceeded, StreamRace, add_failover_event,
+                        is_retriable_error)
+
+# 모델 이름 -> 제공자
+MODEL_REGISTRY = {
+    "gpt-4o": "openai",
+    "gpt-4o-mini": "openai",
+    "gemini-pro": "gemini",
+    "gemini-1.5-pro-latest": "gemini",
+    "claude-3-5-sonnet-20240620": "anthropic",
+    "claude-3-opus-20240229": "anthropic",
+    "claude-3-haiku-20240307": "anthropic",
+}
+
+# 제공자 -> 대화 요약에 사용하는 모델
+SUMMARY_MODELS = {
+    "openai": "gpt-4o-mini",
+    "gemini": "gemini-pro",
+    "anthropic": "claude-3-haiku-20240307",
+}
+
+logger = logging.getLogger("chat_engine")
+
+class UnsupportedModelError(ValueError):
+    pass
+
+# 처음 사용할 때 만드는 클라이언트 (factory()가 돌려준 객체로 속성 접근을 넘김)
+# 제공자 SDK는 import에만 수백 ms가 걸리므로, 선택한 모델의 SDK만 불러오도록 어댑터에 이 객체를 넘깁니다.
+class LazyClient:
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return getattr(self._client, name)
+
+# 스트리밍 한 번의 사용량 기록 (model/provider는 실제로 답한 모델)
+@dataclass
+class ChatUsage:
+    model: str
+    provider: str
+    # 사용자가 선택한 모델 (대체 모델로 답하면 model과 다름)
+    requested_model: str = None
+    input_tokens: int = None
+    output_tokens: int = None
+    ttft_ms: int = None
+    duration_ms: int = None
+    chunk_count: int = 0
+    # 프롬프트 캐시에서 읽은 / 캐시에 새로 쓴 입력 토큰 수
+    cache_read_tokens: int = None
+    cache_write_tokens: int = None
+    # 컨텍스트 관리 결과 (추정 토큰 수, 요약으로 대체된 메시지 수)
+    original_context_tokens: int = None
+    context_tokens: int = None
+    trimmed_messages: int = 0
+    # 호출 수 제한 대기열에서 기다린 시간과 들어갔을 때의 순서
+    queue_wait_ms: int = None
+    queue_position: int = None
+    # 제공자 호출 횟수 (재시도, 대체 모델, 헤지 요청 포함), 헤지 요청 여부, 헤지 요청이 먼저 답했는지
+    attempts: int = 0
+    hedged: bool = False
+    hedge_won: bool = False
+    # 실패하거나 건너뛴 호출: [{"model", "provider", "error"}]
+    failover_events: list = None
+    # 호출 목적 ("chat": 답변, "summary": 대화 요약, "image": 이미지 생성)
+    purpose: str = "chat"
+
+    def to_log_fields(self):
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "ttft_ms": self.ttft_ms,
+            "duration_ms": self.duration_ms,
+            "chunk_count": self.chunk_count,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "original_context_tokens": self.original_context_tokens,
+            "context_tokens": self.context_tokens,
+            "trimmed_messages": self.trimmed_messages,
+            "queue_wait_ms": self.queue_wait_ms,
+            "queue_position": self.queue_position,
+            "requested_model": self.requested_model,
+            "attempts": self.attempts,
+            "hedged": self.hedged,
+            "hedge_won": self.hedge_won,
+            "failover_events": self.failover_events,
+            "purpose": self.purpose,
+        }
+
+# 제공자에 보낼 메시지 형식으로 변환 (image_url 등 화면용 필드 제거)
+def to_provider_messages(messages):
+    return [{"role": message["role"], "content": message["content"]} for message in messages]
+
+# 모델 이름으로 제공자 찾기
+def provider_for(model):
+    provider = MODEL_REGISTRY.get(model)
+    if provider is None:
+        raise UnsupportedModelError(f"지원되지 않는 모델입니다: {model}")
+    return provider
+
+class OpenAIAdapter:
+    def __init__(self, client):
+        self.client = client
+
+    # on_response(응답 스트림): 호출을 취소할 때 스트림을 닫을 수 있도록 열린 스트림을 넘김 (세 어댑터 공통)
+    # timeout: 이 호출의 요청 기한(초). 응답 헤더나 다음 조각을 이보다 오래 기다리면 SDK가 시간 초과로 끝냄 (세 어댑터 공통)
+    def stream(self, messages, system, model, usage, summary=None, on_response=None, timeout=None):
+        # 자동 프리픽스 캐시가 적용되도록 변하지 않는 시스템 프롬프트를 맨 앞에, 바뀌는 요약은 그 뒤에 둠
+        prefix = [{"role": "system", "content": system}]
+        if summary:
+            prefix.append({"role": "system", "content": format_summary(summary)})
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=prefix + messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **({"timeout": timeout} if timeout else {})
+        )
+        if on_response is not None:
+            on_response(response)
+        for chunk in response:
+            # 마지막 청크에는 choices 없이 토큰 사용량만 포함됨
+            if chunk.usage:
+                usage.input_tokens = chunk.usage.prompt_tokens
+                usage.output_tokens = chunk.usage.completion_tokens
+                details = getattr(chunk.usage, "prompt_tokens_details", None)
+                usage.cache_read_tokens = getattr(details, "cached_tokens", None)
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
+
+class GeminiAdapter:
+    # system_instruction을 지원하지 않는 모델 (시스템 프롬프트를 첫 사용자 메시지 앞에 붙임)
+    LEGACY_MODELS = {"gemini-pro"}
+
+    def __init__(self, genai_module, model_cache_size=128, request_timeout=None):
+        self.genai = genai_module
+        self.request_timeout = request_timeout
+        # (모델, 시스템 프롬프트)별 GenerativeModel 객체 재사용
+        self._model_for = functools.lru_cache(maxsize=model_cache_size)(self._create_model)
+
+    def _create_model(self, model, system):
+        if model in self.LEGACY_MODELS or not system:
+            return self.genai.GenerativeModel(model)
+        return self.genai.GenerativeModel(model, system_instruction=system)
+
+    # 대화 내역을 Gemini contents 형식으로 변환
+    # Gemini는 user로 시작해 user/model이 번갈아 나와야 하므로, 앞쪽의 assistant 메시지(웰컴 메시지 등)는 빼고
+    # 같은 역할이 연속되면 하나로 합칩니다.
+    @staticmethod
+    def to_contents(messages):
+        contents = []
+        for message in messages:
+            role = "model" if message["role"] == "assistant" else "user"
+            if not contents and role != "user":
+                continue
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append(message["content"])
+            else:
+                contents.append({"role": role, "parts": [message["content"]]})
+        return contents
+
+    def stream(self, messages, system, model, usage, summary=None, on_response=None, timeout=None):
+        if summary:
+            system = f"{system}\n\n{format_summary(summary)}"
+        contents = self.to_contents(messages)
+        if model in self.LEGACY_MODELS and system and contents:
+            contents[0]["parts"].insert(0, system)
+        timeout = timeout or self.request_timeout
+        request_options = {"timeout": timeout} if timeout else None
+        response = self._model_for(model, system).generate_content(contents, stream=True, request_options=request_options)
+        if on_response is not None:
+            on_response(response)
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+        if response.usage_metadata:
+            usage.input_tokens = response.usage_metadata.prompt_token_count
+            usage.output_tokens = response.usage_metadata.candidates_token_count
+            usage.cache_read_tokens = getattr(response.usage_metadata, "cached_content_token_count", None)
+
+class AnthropicAdapter:
+    def __init__(self, client, max_tokens=1000):
+        self.client = client
+        self.max_tokens = max_tokens
+
+    # 시스템 프롬프트 블록에 캐시 지점 표시 (요약은 캐시 지점 뒤의 별도 블록)
+    @staticmethod
+    def system_blocks(system, summary):
+        blocks = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        if summary:
+            blocks.append({"type": "text", "text": format_summary(summary)})
+        return blocks
+
+    # 새 사용자 메시지 바로 앞의 메시지에 캐시 지점 표시 (다음 턴에는 여기까지가 캐시에서 읽힘)
+    @staticmethod
+    def cached_messages(messages):
+        messages = list(messages)
+        if len(messages) >= 2:
+            previous = messages[-2]
+            messages[-2] = {
+                "role": previous["role"],
+                "content": [{"type": "text", "text": previous["content"], "cache_control": {"type": "ephemeral"}}]
+            }
+        return messages
+
+    def stream(self, messages, system, model, usage, summary=None, on_response=None, timeout=None):
+        with self.client.messages.stream(
+            max_tokens=self.max_tokens,
+            messages=self.cached_messages(messages),
+            model=model,
+            system=self.system_blocks(system, summary),
+            **({"timeout": timeout} if timeout else {})
+        ) as stream:
+            if on_response is not None:
+                on_response(stream)
+            for text in stream.text_stream:
+                yield text
+            final_usage = stream.get_final_message().usage
+            usage.input_tokens = final_usage.input_tokens
+            usage.output_tokens = final_usage.output_tokens
+            usage.cache_read_tokens = getattr(final_usage, "cache_read_input_tokens", None)
+            usage.cache_write_tokens = getattr(final_usage, "cache_creation_input_tokens", None)
+
+# 첫 토큰 전에 실패해 다음 호출로 넘어가도 되는 경우
+class _RetryableFailure(Exception):
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+class ChatEngine:
+    def __init__(self, adapters, context_manager=None, governor=None, resilience=None):
+        self.adapters = adapters
+        self.context_manager = context_manager
+        self.governor = governor
+        self.resilience = resilience
+
+    # 응답 텍스트 조각을 내보내고, 끝나면 ChatUsage 하나를 내보냄
+    # 대화 요약을 새로 만들었으면 그 호출의 ChatUsage(purpose="summary")를 이어서 내보냄
+    # on_wait(대기 순서)는 호출 수 제한으로 기다리는 동안 순서가 바뀔 때마다 호출됨
+    def stream(self, messages, system, model, context_state=None, on_wait=None):
+        provider = provider_for(model)
+        adapter = self.adapters[provider]
+        usage = ChatUsage(model=model, provider=provider, requested_model=model)
+        started_at = time.perf_counter()
+        messages = all_messages = to_provider_messages(messages)
+        summary = summarize_until = None
+        if self.context_manager is not None and context_state is not None:
+            messages, summary, context = self.context_manager.prepare(messages, system, model, context_state)
+            summarize_until = context["summarize_until"]
+            usage.original_context_tokens = context["original_context_tokens"]
+            usage.context_tokens = context["context_tokens"]
+            usage.trimmed_messages = context["trimmed_messages"]
+        if self.resilience is not None:
+            yield from self._stream_resilient(messages, system, model, usage, summary, started_at, on_wait)
+        elif self.governor is None:
+            usage.attempts = 1
+            yield from self._stream_adapter(adapter, messages, system, model, usage, summary, started_at)
+        else:
+            with self.governor.slot(provider, model, on_wait) as ticket:
+                usage.attempts = 1
+                usage.queue_wait_ms = ticket.wait_ms
+                usage.queue_position = ticket.position
+                try:
+                    yield from self._stream_adapter(adapter, messages, system, model, usage, summary, started_at)
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        self.governor.throttle(provider, model)
+                    raise
+        usage.duration_ms = round((time.perf_counter() - started_at) * 1000)
+        yield usage
+        if summarize_until is not None:
+            yield from self._update_summary(all_messages, summarize_until, context_state, provider)
+
+    # 답변이 끝난 뒤 대화 요약 갱신 (stream을 그대로 사용하므로 호출 수 제한과 장애 대응이 똑같이 적용됨)
+    # 실패하면 기록만 남기고, 다음 턴에 아직 요약하지 않은 대화를 보내면서 다시 시도함
+    def _update_summary(self, messages, cutoff, state, provider):
+        model = SUMMARY_MODELS[provider]
+        usages = []
+
+        def summarize(previous_summary, summarized_messages):
+            system, request = summary_request(previous_summary, summarized_messages)
+            parts = []
+            for event in self.stream(request, system, model):
+                if isinstance(event, ChatUsage):
+                    usages.append(event)
+                else:
+                    parts.append(event)
+            text = "".join(parts).strip()
+            if not text:
+                raise ValueError("요약 응답이 비어 있습니다.")
+            return text
+
+        try:
+            self.context_manager.update_summary(messages, cutoff, state, summarize)
+        except Exception as e:
+            logger.warning("대화 요약에 실패했습니다 (%s): %s", model, e)
+        for usage in usages:
+            usage.purpose = "summary"
+            # 학생이 기다린 첫 토큰 지연이 아니므로 TTFT 통계에서 제외
+            usage.ttft_ms = None
+            yield usage
+
+    @staticmethod
+    def _stream_adapter(adapter, messages, system, model, usage, summary, started_at):
+        for text in adapter.stream(messages, system, model, usage, summary=summary):
+            if not text:
+                continue
+            if usage.ttft_ms is None:
+                usage.ttft_ms = round((time.perf_counter() - started_at) * 1000)
+            usage.chunk_count += 1
+            yield text
+
+    # 호출 계획(resilience.plan)에 따라 차례로 시도 (브레이커가 열린 제공자는 건너뜀)
+    def _stream_resilient(self, messages, system, model, usage, summary, started_at, on_wait):
+        last_error = None
+        for attempt_model in self.resilience.plan(model):
+            attempt_provider = provider_for(attempt_model)
+            breaker = self.resilience.breaker(attempt_provider)
+            permit = breaker.allow()
+            if not permit:
+                last_error = last_error or CircuitOpenError(f"{attempt_provider} 호출이 잠시 중단되었습니다. (연속 실패)")
+                add_failover_event(usage, attempt_model, attempt_provider, "circuit_open")
+                continue
+            # 시험 호출이 재시도할 수 없는 오류, 대기열 거절, 화면 중단(GeneratorExit)으로 끝나도 허가를 돌려줌
+            try:
+                if usage.attempts:
+                    self.resilience.sleep(self.resilience.backoff(usage.attempts))
+                yield from self._race(messages, system, attempt_model, usage, summary, started_at, on_wait)
+                return
+            except _RetryableFailure as failure:
+                last_error = failure.error
+                add_failover_event(usage, attempt_model, attempt_provider,
+                                         f"{type(failure.error).__name__}: {failure.error}"[:200])
+            finally:
+                breaker.release(permit)
+        raise last_error
+
+    # 한 모델로 호출하고, 첫 토큰이 늦으면 헤지 요청을 보내 먼저 답한 쪽의 응답을 내보냄
+    def _race(self, messages, system, model, usage, summary, started_at, on_wait):
+        config = self.resilience.config
+        provider = provider_for(model)
+        adapter = self.adapters[provider]
+        breaker = self.resilience.breaker(provider)
+        race = StreamRace(on_finish=self._release_attempt)
+
+        def start(ticket, hedge=False):
+            attempt = StreamAttempt(model, provider, ChatUsage(model=model, provider=provider), ticket, hedge)
+            usage.attempts += 1
+            # 응답 헤더 전에 멈춘 호출은 닫을 스트림이 없으므로, SDK 요청 기한을 첫 토큰 기한에 맞춰
+            # 작업자 스레드가 곧 끝나고 호출 수 제한 자리를 돌려주게 함
+            return race.start(attempt, lambda: adapter.stream(messages, system, model, attempt.usage, summary=summary,
+                                                              on_response=attempt.set_response,
+                                                              timeout=config["first_token_timeout_seconds"]))
+
+        if self.governor is not None:
+            ticket = self.governor.acquire(provider, model, on_wait)
+            usage.queue_wait_ms = (usage.queue_wait_ms or 0) + ticket.wait_ms
+            if usage.queue_position is None:
+                usage.queue_position = ticket.position
+        else:
+            ticket = None
+        pending = {start(ticket)}
+        first_token_deadline = time.perf_counter() + config["first_token_timeout_seconds"]
+        hedge_delay = self.resilience.hedge_delay(model)
+        hedge_at = time.perf_counter() + hedge_delay if hedge_delay else None
+
+        try:
+            # 첫 토큰(또는 빈 응답으로 끝남)을 기다림
+            winner = None
+            while winner is None:
+                wake_at = min(first_token_deadline, hedge_at) if hedge_at else first_token_deadline
+                try:
+                    attempt, kind, payload = race.get(wake_at - time.perf_counter())
+                except queue.Empty:
+                    if hedge_at is not None and time.perf_counter() >= hedge_at:
+                        hedge_at = None
+                        hedge_ticket = self.governor.try_acquire(provider, model) if self.governor is not None else None
+                        # 다른 요청이 기다리고 있으면 헤지하지 않음
+                        if self.governor is None or hedge_ticket is not None:
+                            pending.add(start(hedge_ticket, hedge=True))
+                            usage.hedged = True
+                    elif time.perf_counter() >= first_token_deadline:
+                        breaker.record_failure()
+                        raise _RetryableFailure(StreamDeadlineExceeded(
+                            f"{config['first_token_timeout_seconds']}초 안에 응답이 시작되지 않았습니다. ({model})"))
+                    continue
+                if kind == "error":
+                    pending.discard(attempt)
+                    self._attempt_failed(attempt, payload)
+                    if not pending:
+                        if is_retriable_error(payload):
+                            raise _RetryableFailure(payload)
+                        raise payload
+                    continue
+                winner = attempt
+                race.cancel(keep=winner)
+                self.resilience.record_ttft(model, round((time.perf_counter() - winner.started_at) * 1000))
+                usage.model, usage.provider, usage.hedge_won = model, provider, winner.hedge
+                if kind == "done":
+                    break
+                usage.ttft_ms = round((time.perf_counter() - started_at) * 1000)
+                usage.chunk_count += 1
+                yield payload
+
+            # 나머지 응답 (첫 토큰 이후에는 재시도하지 않음)
+            while kind != "done":
+                try:
+                    attempt, kind, payload = race.get(config["idle_timeout_seconds"])
+                except queue.Empty:
+                    breaker.record_failure()
+                    raise StreamDeadlineExceeded(f"{config['idle_timeout_seconds']}초 동안 응답이 멈췄습니다. ({model})")
+                if attempt is not winner:
+                    continue
+                if kind == "error":
+                    self._attempt_failed(attempt, payload)
+                    raise payload
+                if kind == "text":
+                    usage.chunk_count += 1
+                    yield payload
+            breaker.record_success()
+            for field in ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens"):
+                setattr(usage, field, getattr(winner.usage, field))
+        finally:
+            race.cancel()
+
+    def _attempt_failed(self, attempt, error):
+        if is_retriable_error(error):
+            self.resilience.breaker(attempt.provider).record_failure()
+        if self.governor is not None and is_rate_limit_error(error):
+            self.governor.throttle(attempt.provider, attempt.model)
+
+    # 호출이 끝나면(작업자 스레드) 호출 수 제한 자리 반환
+    def _release_attempt(self, attempt):
+        if self.governor is not None and attempt.ticket is not None:
+            self.governor.release(attempt.ticket)
+
+# app.py에서 사용하는 기본 엔진 구성
+def build_chat_engine(anthropic_client, openai_client, genai_module, governor=None, resilience=None, request_timeout=None):
+    return ChatEngine({
+        "openai": OpenAIAdapter(openai_client),
+        "gemini": GeminiAdapter(genai_module, request_timeout=request_timeout),
+        "anthropic": AnthropicAdapter(anthropic_client),
+    }, context_manager=ContextManager(), governor=governor, resilience=resilience)
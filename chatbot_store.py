@@ -0,0 +1,87 @@
+# 챗봇 데이터 접근
+# 화면마다 필요한 필드만 읽도록 용도별 projection(카드 표시, 대화 설정, 소유자 확인)을 정해 두고 조회합니다.
+# 예전 구조의 문서에는 대화 메시지 배열이 남아 있을 수 있으므로 챗봇/사용자 문서를 통째로 읽지 않습니다.
+# 로그인 세션에는 카드 필드만 담은 가벼운 챗봇 목록을 두고, 대화/수정 화면을 열 때 대화 설정을 읽습니다.
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+
+from schema import migrate_user_chatbots
+
+# 카드 표시에 필요한 필드 (세션의 챗봇 목록, 공유 챗봇 목록)
+CARD_PROJECTION = {
+    "name": 1,
+    "description": 1,
+    "creator": 1,
+    "category": 1,
+    "background_color": 1,
+    "profile_image_url": 1,
+    "profile_thumbnails": 1,
+}
+
+# 대화/수정 화면에 필요한 필드 (카드 필드 + 프롬프트 설정)
+CHAT_CONFIG_PROJECTION = {
+    **CARD_PROJECTION,
+    "system_prompt": 1,
+    "welcome_message": 1,
+    "response_cache": 1,
+}
+
+# 소유자 확인에 필요한 필드
+OWNER_PROJECTION = {"creator": 1}
+
+# 세션에 보관할 사용자 정보 (예전 구조의 내장 챗봇 배열 제외)
+USER_PROJECTION = {"chatbots": 0}
+
+# 로그인한 사용자 정보 불러오기 (없으면 새로 생성)
+# users 문서에 챗봇이 내장된 예전 구조가 남아 있을 때만 전체 문서를 읽어 별도 컬렉션으로 옮깁니다.
+def load_user(db, username):
+    user = db.users.find_one({"username": username}, USER_PROJECTION)
+    if user is None:
+        user = {"username": username}
+        db.users.insert_one(user)
+        return user
+    if db.users.count_documents({"_id": user["_id"], "chatbots.0": {"$exists": True}}, limit=1):
+        migrate_user_chatbots(db, db.users.find_one({"_id": user["_id"]}))
+    return user
+
+# 사용자의 개인 챗봇 카드 목록
+def list_user_chatbots(db, username):
+    return list(db.chatbots.find({"creator": username}, CARD_PROJECTION).sort("_id", ASCENDING))
+
+# 개인 챗봇 카드 목록 한 쪽 (admin용, owner를 지정하면 해당 교사의 챗봇만)
+def list_chatbot_cards(db, page, page_size, owner=None):
+    query = {"creator": owner} if owner else {}
+    return list(db.chatbots.find(query, CARD_PROJECTION)
+                .sort("_id", ASCENDING)
+                .skip((page - 1) * page_size)
+                .limit(page_size))
+
+# 대화 설정 불러오기 (잘못된 ID면 bson.errors.InvalidId)
+def load_chat_config(db, chatbot_id, collection="chatbots"):
+    return db[collection].find_one({"_id": ObjectId(chatbot_id)}, CHAT_CONFIG_PROJECTION)
+
+# 공개 챗봇 대화 내역에 이번 턴 메시지 추가
+# 대화 세션마다 문서 하나를 두고, 매 턴에는 새로 추가된 메시지만 $push로 덧붙입니다.
+# timestamp는 마지막 대화 시각으로 갱신되어 보존 기간(TTL) 계산에 사용됩니다.
+def append_public_chat_history(db, chatbot_id, user_name, session_id, new_messages):
+    now = datetime.now()
+    db.public_chat_history.update_one(
+        {"_id": session_id},
+        {
+            "$push": {"messages": {"$each": new_messages}},
+            "$set": {"timestamp": now},
+            "$setOnInsert": {
+                "chatbot_id": str(chatbot_id),
+                "user_name": user_name,
+                "started_at": now
+            }
+        },
+        upsert=True
+    )
+
+# 챗봇 제작자 (챗봇이 없으면 None)
+def chatbot_owner(db, chatbot_id, collection="chatbots"):
+    chatbot = db[collection].find_one({"_id": ObjectId(chatbot_id)}, OWNER_PROJECTION)
+    return chatbot.get("creator", "") if chatbot else None
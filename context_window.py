@@ -0,0 +1,108 @@
+# 대화 맥락(컨텍스트) 관리
+# 모델별 토큰 예산 안에서 시스템 프롬프트와 최근 대화는 그대로 보내고, 예산을 넘는 오래된 대화는
+# 요약문 하나로 합칩니다. 요약문은 시스템 프롬프트와 분리해서 반환하므로, 제공자 어댑터는 변하지 않는
+# 시스템 프롬프트를 앞쪽에 두어 프롬프트 캐시를 활용할 수 있습니다. 요약은 대화마다 state(dict)에 저장해 두고,
+# 새로 예산 밖으로 밀려난 대화가 생길 때만 이전 요약과 합쳐 다시 만듭니다.
+# 요약 호출은 답변을 기다리게 하지 않도록 prepare에서 하지 않고, 호출하는 쪽(ChatEngine)이 답변이 끝난 뒤
+# update_summary로 만듭니다. 요약이 만들어지기 전까지는 아직 요약하지 않은 대화를 조금 더 보냅니다.
+
+# 모델별 대화 내역 토큰 예산 (시스템 프롬프트 포함)
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-4o": 8000,
+    "gpt-4o-mini": 8000,
+    "gemini-pro": 6000,
+    "gemini-1.5-pro-latest": 8000,
+    "claude-3-5-sonnet-20240620": 8000,
+    "claude-3-opus-20240229": 6000,
+    "claude-3-haiku-20240307": 8000,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = 6000
+# 요약문에 남겨 두는 토큰 수
+SUMMARY_TOKEN_RESERVE = 600
+# 예산을 넘었을 때 최근 대화를 예산의 이 비율까지만 남겨, 다음 몇 턴 동안은 다시 요약하지 않도록 함
+KEEP_RATIO = 0.7
+# 요약이 아직 없을 때(답변 뒤에 만들거나 실패한 경우) 오래된 대화를 잘라내지 않고 보내는 한도 (예산의 배수)
+PENDING_SUMMARY_OVERFLOW = 1.5
+
+SUMMARY_HEADER = "[이전 대화 요약]"
+
+# 토큰 수 추정 (영문은 약 4글자당 1토큰, 한글 등 그 외 문자는 1글자당 약 1토큰)
+def estimate_tokens(text):
+    if not text:
+        return 0
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 4  # 메시지 구분용 토큰 포함
+
+class ContextManager:
+    def __init__(self, budgets=None, default_budget=DEFAULT_CONTEXT_TOKEN_BUDGET, overflow_ratio=PENDING_SUMMARY_OVERFLOW):
+        self.budgets = budgets or CONTEXT_TOKEN_BUDGETS
+        self.default_budget = default_budget
+        self.overflow_ratio = overflow_ratio
+
+    def budget_for(self, model):
+        return self.budgets.get(model, self.default_budget)
+
+    # 예산에 맞춘 (메시지 목록, 요약문 또는 None, 통계) 반환
+    # 새로 요약해야 할 대화가 있으면 stats["summarize_until"]에 그 범위의 끝을 담음 (요약은 update_summary로 만듦)
+    def prepare(self, messages, system, model, state):
+        # 대화가 초기화되어 요약 범위보다 짧아졌으면 요약도 초기화
+        if len(messages) < state.get("covered", 0):
+            state.clear()
+
+        token_counts = [estimate_tokens(message["content"]) for message in messages]
+        original_tokens = estimate_tokens(system) + sum(token_counts)
+        available = self.budget_for(model) - estimate_tokens(system)
+
+        covered = cutoff = state.get("covered", 0)
+        summarize_until = None
+        pending_tokens = sum(token_counts[covered:]) + estimate_tokens(state.get("summary"))
+        if pending_tokens > available:
+            # 최근 대화부터 거꾸로 채우되, 마지막 메시지는 항상 포함
+            target = (available - SUMMARY_TOKEN_RESERVE) * KEEP_RATIO
+            used = 0
+            keep_from = len(messages)
+            while keep_from > 0 and (keep_from == len(messages) or used + token_counts[keep_from - 1] <= target):
+                keep_from -= 1
+                used += token_counts[keep_from]
+            # 남기는 대화는 사용자 메시지로 시작하도록 맞춤
+            while keep_from < len(messages) - 1 and messages[keep_from]["role"] != "user":
+                keep_from += 1
+            keep_from = max(keep_from, covered)
+            if keep_from > covered:
+                summarize_until = keep_from
+            # 요약을 기다리는 동안에도 한도를 넘으면 이번 턴은 오래된 대화를 잘라냄
+            if pending_tokens > available * self.overflow_ratio:
+                cutoff = keep_from
+
+        kept = messages[cutoff:]
+        summary = state.get("summary")
+        stats = {
+            "original_context_tokens": original_tokens,
+            "context_tokens": estimate_tokens(system) + estimate_tokens(summary) + sum(token_counts[cutoff:]),
+            "trimmed_messages": cutoff,
+            "summarized": bool(summary),
+            "summarize_until": summarize_until,
+        }
+        return kept, summary, stats
+
+    # state["covered"]부터 cutoff 앞까지의 대화를 이전 요약과 합쳐 새 요약으로 만듦
+    # summarize(previous_summary, messages) -> 새 요약문. 실패하면 예외를 그대로 올리고 state는 바꾸지 않음
+    def update_summary(self, messages, cutoff, state, summarize):
+        covered = state.get("covered", 0)
+        if cutoff <= covered:
+            return
+        state["summary"] = summarize(state.get("summary"), messages[covered:cutoff])
+        state["covered"] = cutoff
+
+# 요약 호출에 보낼 (시스템 프롬프트, 메시지 목록)
+def summary_request(previous_summary, messages):
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    if previous_summary:
+        transcript = f"{SUMMARY_HEADER}\n{previous_summary}\n\n{transcript}"
+    system = ("다음 대화를 이후 대화에 필요한 사실, 사용자의 요청과 선호, 진행 상황 위주로 "
+              f"{SUMMARY_TOKEN_RESERVE // 2}자 이내로 간결하게 요약하세요. 대화에 사용된 언어로 작성하세요.")
+    return system, [{"role": "user", "content": transcript}]
+
+# 요약문을 모델에 보낼 때 사용하는 형식 (시스템 프롬프트 뒤의 별도 블록/메시지)
+def format_summary(summary):
+    return f"{SUMMARY_HEADER}\n{summary}"
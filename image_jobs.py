@@ -0,0 +1,329 @@
+# 이미지 생성 작업
+# DALL-E 호출, 이미지 다운로드, Cloud Storage 업로드를 Streamlit 스크립트 스레드가 아닌 작업자 스레드 풀에서 실행합니다.
+# submit은 바로 작업 ID를 돌려주고, 화면에서는 get으로 상태를 확인하거나 wait로 결과를 기다립니다.
+# 다운로드한 이미지는 메모리에 모두 올리지 않고 응답 스트림을 그대로 재개 가능한(resumable) 업로드로 넘기며,
+# 단계별 소요 시간(생성, 전송, 썸네일)을 작업 기록에 남깁니다.
+# 프로필 이미지는 업로드하면서 임시 파일에 사본을 남겨 두었다가, 카드 CSS 크기(100px, 150px)의 WebP/PNG 썸네일을 만들어
+# 함께 올립니다. 파일 이름이 매번 달라 내용이 바뀌지 않으므로 모든 이미지에 긴 Cache-Control을 설정합니다.
+# 이미지 생성 호출에는 요청 기한을 두고, resilience를 넘기면 일시적인 오류에 재시도와 서킷 브레이커를 적용합니다.
+# 이미지 생성은 호출마다 비용이 들므로 시간 초과는 다시 시도하지 않고, 작업 대기 시간(job_timeout) 안에 끝낼 수 없으면
+# 재시도하지 않습니다. 호출 횟수와 실패한 호출은 작업의 usage(ChatUsage)에 남습니다.
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from chat_engine import ChatUsage
+from resilience import call_with_retries, is_timeout_error
+
+# 작업 상태
+JOB_PENDING = "pending"
+JOB_GENERATING = "generating"
+JOB_UPLOADING = "uploading"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 재개 가능한 업로드 청크 크기 (256KiB의 배수)
+UPLOAD_CHUNK_SIZE = 4 * 256 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 프로필 이미지 썸네일 크기 (px) 및 형식: 확장자 -> (Pillow 형식, content type, 저장 옵션)
+THUMBNAIL_SIZES = (100, 150)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 6}),
+    "png": ("PNG", "image/png", {"optimize": True}),
+}
+# 썸네일용 사본을 메모리에 둘 최대 크기 (넘으면 임시 파일로 옮겨짐)
+THUMBNAIL_SPOOL_BYTES = 1024 * 1024
+
+# 이미지 생성 관련 키워드와 패턴
+IMAGE_PATTERNS = [
+    r'(이미지|그림|사진|웹툰).*?(그려|만들어|생성|출력)',
+    r'(그려|만들어|생성|출력).*?(이미지|그림|사진|웹툰)',
+    r'(시각화|시각적).*?(표현|묘사)',
+    r'비주얼.*?(만들어|생성)',
+    r'(그려|만들어|생성|출력)[줘라]',
+    r'(이미지|그림|사진|웹툰).*?(보여)',
+]
+
+# 이미지 생성 요청 확인 함수
+def is_image_request(text):
+    return any(re.search(pattern, text, re.IGNORECASE) for pattern in IMAGE_PATTERNS)
+
+# 채팅 메시지를 이미지 생성 프롬프트로 바꾸기 (요청 표현을 빼고 안전한 이미지 지시를 덧붙임)
+def safe_image_prompt(prompt):
+    clean_prompt = re.sub(r'(이미지|그림|사진|웹툰).*?(그려|만들어|생성|출력|보여)[줘라]?', '', prompt).strip()
+    return f"Create a safe and appropriate image based on this description: {clean_prompt}. The image should be family-friendly and avoid any controversial or sensitive content."
+
+class ImageJobError(Exception):
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+
+# 원본 파일 이름에 대응하는 썸네일 파일 이름 (images/x.png -> images/x_100.webp)
+def thumbnail_name(filename, size, extension):
+    return f"{os.path.splitext(filename)[0]}_{size}.{extension}"
+
+# 이미지 파일로 썸네일 만들기: {(크기, 확장자): 바이트}
+# 카드의 object-fit: cover와 같도록 가운데를 정사각형으로 잘라 줄입니다.
+def make_thumbnails(image_file, sizes=THUMBNAIL_SIZES):
+    from PIL import Image, ImageOps  # 썸네일을 만들 때만 필요
+
+    thumbnails = {}
+    with Image.open(image_file) as image:
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for size in sizes:
+            resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            for extension, (image_format, _, options) in THUMBNAIL_FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, image_format, **options)
+                thumbnails[(size, extension)] = buffer.getvalue()
+    return thumbnails
+
+# 업로드 스트림에서 읽은 내용을 사본 파일에도 기록
+class _TeeReader:
+    def __init__(self, stream, copy):
+        self.stream = stream
+        self.copy = copy
+        self.position = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.copy.write(data)
+        self.position += len(data)
+        return data
+
+    def tell(self):
+        return self.position
+
+# 프롬프트 -> DALL-E 이미지 -> Cloud Storage 공개 URL
+# 클라이언트는 작업마다 넘겨받으므로, 연결이 끊겨 새로 만든 클라이언트도 다음 작업부터 바로 사용됩니다.
+# job_timeout은 화면이 작업을 기다리는 시간(초)으로, 재시도할지 정할 때 사용합니다.
+class ImagePipeline:
+    def __init__(self, bucket_name, connect_timeout=5, read_timeout=60, model="dall-e-3", generate_timeout=90,
+                 resilience=None, job_timeout=None):
+        self.bucket_name = bucket_name
+        self.timeout = (connect_timeout, read_timeout)
+        self.model = model
+        self.generate_timeout = generate_timeout
+        self.resilience = resilience
+        self.job_timeout = job_timeout
+        # 다운로드 연결 재사용 (requests는 작업 큐를 처음 만들 때 import)
+        import requests
+        self.session = requests.Session()
+
+    def run(self, job):
+        job.set_status(JOB_GENERATING)
+        with job.stage("generate_ms"):
+            try:
+                image_url = self.generate(job)
+            except Exception as e:
+                raise ImageJobError("generate", str(e)) from e
+
+        job.set_status(JOB_UPLOADING)
+        with tempfile.SpooledTemporaryFile(THUMBNAIL_SPOOL_BYTES) as copy:
+            with job.stage("transfer_ms"):
+                url = self.transfer(image_url, job, copy if job.thumbnail_sizes else None)
+            if job.thumbnail_sizes:
+                copy.seek(0)
+                with job.stage("thumbnail_ms"):
+                    self.upload_thumbnails(copy, job)
+        return url
+
+    def generate(self, job):
+        job.usage = ChatUsage(model=self.model, provider="openai_images", purpose="image")
+
+        def call():
+            return job.openai_client.images.generate(
+                model=self.model,
+                prompt=job.prompt,
+                size="1024x1024",
+                quality="standard",
+                n=1,
+                timeout=self.generate_timeout,
+            )
+        if self.resilience is None:
+            job.usage.attempts = 1
+            response = call()
+        else:
+            response = call_with_retries(call, self.resilience, "openai_images", retry_if=lambda e: self.can_retry(job, e),
+                                         usage=job.usage)
+        return response.data[0].url
+
+    # 시간 초과된 요청은 이미지가 만들어져 비용이 청구되었을 수 있으므로 다시 보내지 않고,
+    # 다시 생성하고 내려받으면 작업 대기 시간을 넘길 때도 재시도하지 않음
+    def can_retry(self, job, error):
+        if is_timeout_error(error):
+            return False
+        if self.job_timeout is None:
+            return True
+        elapsed = time.perf_counter() - job.submitted_at
+        worst_case = self.resilience.config["backoff_max_seconds"] + self.generate_timeout + sum(self.timeout)
+        return elapsed + worst_case < self.job_timeout
+
+    # 다운로드 스트림을 그대로 Cloud Storage로 업로드 (copy가 있으면 읽은 내용을 사본으로도 기록)
+    def transfer(self, image_url, job, copy=None):
+        import requests
+
+        try:
+            image_response = self.session.get(image_url, stream=True, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ImageJobError("download", str(e)) from e
+        with image_response:
+            if image_response.status_code != 200:
+                raise ImageJobError("download", f"이미지 다운로드에 실패했습니다. (HTTP {image_response.status_code})")
+            image_response.raw.decode_content = True
+            stream = _TeeReader(image_response.raw, copy) if copy is not None else image_response.raw
+            try:
+                blob = job.storage_client.bucket(self.bucket_name).blob(job.filename)
+                blob.cache_control = IMMUTABLE_CACHE_CONTROL
+                # chunk_size를 지정하면 upload_from_file이 청크 단위의 재개 가능한 업로드를 사용함
+                blob.chunk_size = UPLOAD_CHUNK_SIZE
+                content_length = image_response.headers.get("Content-Length")
+                blob.upload_from_file(stream, content_type="image/png",
+                                      size=int(content_length) if content_length else None)
+            except Exception as e:
+                raise ImageJobError("upload", str(e)) from e
+            job.bytes = int(content_length) if content_length else blob.size
+        return self.public_url(job.filename)
+
+    # 썸네일 만들어 올리기 (실패해도 원본 이미지는 그대로 사용)
+    def upload_thumbnails(self, image_file, job):
+        try:
+            bucket = job.storage_client.bucket(self.bucket_name)
+            for (size, extension), data in make_thumbnails(image_file, job.thumbnail_sizes).items():
+                name = thumbnail_name(job.filename, size, extension)
+                blob = bucket.blob(name)
+                blob.cache_control = IMMUTABLE_CACHE_CONTROL
+                blob.upload_from_string(data, content_type=THUMBNAIL_FORMATS[extension][1])
+                job.thumbnails.setdefault(str(size), {})[extension] = self.public_url(name)
+        except Exception as e:
+            job.thumbnails = {}
+            job.thumbnail_error = str(e)
+
+    def public_url(self, name):
+        return f"https://storage.googleapis.com/{self.bucket_name}/{name}"
+
+class ImageJob:
+    def __init__(self, prompt, openai_client, storage_client, owner=None, thumbnail_sizes=()):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.openai_client = openai_client
+        self.storage_client = storage_client
+        self.owner = owner
+        self.status = JOB_PENDING
+        self.url = None
+        self.error = None
+        self.error_stage = None
+        self.bytes = None
+        # 썸네일: {"100": {"webp": URL, "png": URL}, ...}
+        self.thumbnail_sizes = tuple(thumbnail_sizes)
+        self.thumbnails = {}
+        self.thumbnail_error = None
+        # 이미지 생성 호출 기록 (호출 횟수, 실패하거나 건너뛴 호출), 생성 단계에서 만듦
+        self.usage = None
+        self.created_at = datetime.now()
+        self.filename = f"images/{self.created_at.strftime('%Y%m%d%H%M%S%f')}_{self.id[:8]}.png"
+        self.submitted_at = time.perf_counter()
+        # 단계별 소요 시간 (ms): queue_ms, generate_ms, transfer_ms, thumbnail_ms, total_ms
+        self.timings = {}
+        self.done = threading.Event()
+
+    def set_status(self, status):
+        if self.status == JOB_PENDING:
+            self.timings["queue_ms"] = round((time.perf_counter() - self.submitted_at) * 1000)
+        self.status = status
+
+    def stage(self, name):
+        return _StageTimer(self.timings, name)
+
+    @property
+    def finished(self):
+        return self.done.is_set()
+
+    def to_record(self):
+        return {
+            "job_id": self.id,
+            "owner": self.owner,
+            "status": self.status,
+            "url": self.url,
+            "error": self.error,
+            "error_stage": self.error_stage,
+            "bytes": self.bytes,
+            "thumbnails": self.thumbnails,
+            "thumbnail_error": self.thumbnail_error,
+            "model": self.usage.model if self.usage else None,
+            "attempts": self.usage.attempts if self.usage else 0,
+            "failover_events": self.usage.failover_events if self.usage else None,
+            "timestamp": self.created_at,
+            **self.timings,
+        }
+
+class _StageTimer:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings[self.name] = round((time.perf_counter() - self.started_at) * 1000)
+
+class ImageJobQueue:
+    def __init__(self, pipeline, max_workers=4, on_finish=None, keep_seconds=600):
+        self.pipeline = pipeline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-job")
+        # on_finish(job): 작업이 끝나면(성공/실패) 작업자 스레드에서 호출 (작업 기록 저장용)
+        self.on_finish = on_finish
+        self.keep_seconds = keep_seconds
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    # 작업 등록 후 작업 ID 반환
+    def submit(self, prompt, openai_client, storage_client, owner=None, thumbnail_sizes=()):
+        job = ImageJob(prompt, openai_client, storage_client, owner, thumbnail_sizes)
+        with self.lock:
+            self._prune()
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    # 작업이 끝날 때까지(또는 timeout초) 기다린 뒤 작업 반환
+    def wait(self, job_id, timeout=None):
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def _run(self, job):
+        try:
+            job.url = self.pipeline.run(job)
+            job.status = JOB_DONE
+        except ImageJobError as e:
+            job.error, job.error_stage, job.status = str(e), e.stage, JOB_FAILED
+        except Exception as e:
+            job.error, job.error_stage, job.status = str(e), "unknown", JOB_FAILED
+        job.timings["total_ms"] = round((time.perf_counter() - job.submitted_at) * 1000)
+        job.done.set()
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception:
+                pass
+
+    # 끝난 지 오래된 작업 정리
+    def _prune(self):
+        now = datetime.now()
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished and (now - job.created_at).total_seconds() > self.keep_seconds]:
+            del self.jobs[job_id]
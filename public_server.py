@@ -0,0 +1,551 @@
+# 공개 챗봇 전용 경량 서버 (ASGI)
+# 학생들이 QR 코드로 여는 공개 챗봇 URL(?chatbot_id=...&model=...)을 Streamlit 앱 대신 처리합니다.
+# Streamlit은 학생마다 스크립트 세션을 만들고 입력할 때마다 스크립트 전체를 다시 실행하지만, 이 서버는 정적 페이지 하나와
+# 대화마다 WebSocket 연결(또는 SSE 응답) 하나만 유지하므로, 답변을 기다리지 않는 연결에는 비동기 작업 하나 외에 드는 것이 없습니다.
+# 모델 호출, 호출 수 제한, 장애 대응, 응답 캐시, 사용량/대화 기록은 Streamlit 앱과 같은 모듈(chat_engine, admission,
+# resilience, response_cache, usage_stats, chatbot_store)을 사용하며, 학생은 로그인하지 않으므로 Google Sheets는 쓰지 않고
+# Cloud Storage는 이미지 생성 요청이 처음 들어올 때 연결합니다. 교사용 화면은 계속 Streamlit 앱(app.py)이 담당합니다.
+#
+# 제공자 SDK는 블로킹 방식이므로 답변 하나를 스트리밍하는 동안에만 작업자 스레드를 사용하고(PUBLIC_CHAT_STREAM_THREADS),
+# 텍스트 조각은 이벤트 루프로 넘겨 연결에 바로 씁니다. 호출 수 제한은 프로세스 단위이므로 Streamlit 앱과 따로 적용됩니다.
+#
+# 엔드포인트
+# - GET  /?chatbot_id=...&model=...   대화 화면 (public_static/index.html)
+# - GET  /api/chatbots/{chatbot_id}    챗봇 카드 정보 (이름, 프로필 이미지, 환영 메시지. 시스템 프롬프트는 보내지 않음)
+# - WS   /ws/chat                      {"type": "start", chatbot_id, model, user_name} 후 {"type": "message", content}
+# - POST /api/chat                     WebSocket을 쓸 수 없는 환경용 SSE. 대화 내역은 브라우저가 보관해 함께 보냄
+# - GET  /healthz
+# 이벤트 (WebSocket 메시지 / SSE data, JSON):
+#   started(session_id: 서버가 발급한 세션 토큰, welcome_message), queue(position), status(message), text(text), image(url),
+#   done(text), error(message)
+#
+# 제공자 SDK(anthropic, openai, google.generativeai)는 해당 모델로 처음 답할 때 import하고 클라이언트를 만듭니다. (LazyClient)
+#
+# 실행: uvicorn public_server:app --host 0.0.0.0 --port 8080  (또는 python public_server.py)
+# 교사 화면의 공유 링크와 QR 코드가 이 서버를 가리키도록 하려면 Streamlit 앱에 PUBLIC_CHAT_URL을 설정합니다.
+import asyncio
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.staticfiles import StaticFiles
+from starlette.websockets import WebSocketDisconnect
+
+from admission import AdmissionError, ConcurrencyGovernor, is_rate_limit_error
+from chat_engine import MODEL_REGISTRY, ChatUsage, LazyClient, UnsupportedModelError, build_chat_engine
+from chatbot_store import append_public_chat_history, load_chat_config
+from image_jobs import JOB_DONE, ImageJobQueue, ImagePipeline, is_image_request, safe_image_prompt
+from resilience import CircuitOpenError, Resilience, StreamDeadlineExceeded
+from response_cache import CACHE_MODE_OFF, CACHE_MODE_SEMANTIC, ResponseCache
+from usage_stats import log_usage
+
+logger = logging.getLogger("public_server")
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public_static")
+
+# 환경 변수 (Streamlit 앱과 같은 이름 사용)
+MONGO_URI = os.environ.get("MONGO_URI")
+ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.environ.get("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+LLM_LIMITS = os.environ.get("LLM_LIMITS", "")
+RESILIENCE_CONFIG = os.environ.get("RESILIENCE_CONFIG", "")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", "0.65"))
+IMAGE_BUCKET_NAME = 'sawlteacher'
+IMAGE_JOB_WORKERS = int(os.environ.get("IMAGE_JOB_WORKERS", "4"))
+IMAGE_JOB_TIMEOUT_SECONDS = int(os.environ.get("IMAGE_JOB_TIMEOUT_SECONDS", "180"))
+
+# 답변 스트리밍/DB 작업에 쓰는 작업자 스레드 수 (동시에 답변 중인 대화 수의 상한)
+# 스레드는 대부분 제공자 응답이나 호출 수 제한 차례를 기다리므로, 수업 하나의 학생이 한꺼번에 질문해도 모자라지 않게 둠
+PUBLIC_CHAT_STREAM_THREADS = int(os.environ.get("PUBLIC_CHAT_STREAM_THREADS", "1000"))
+# 챗봇 설정을 다시 읽기 전까지 재사용하는 시간 (초). 수업 시작 때 같은 챗봇을 여는 요청이 한꺼번에 몰림
+PUBLIC_CHATBOT_CACHE_SECONDS = int(os.environ.get("PUBLIC_CHATBOT_CACHE_SECONDS", "30"))
+PUBLIC_CHATBOT_CACHE_ENTRIES = 256
+# 서버가 기억하는 대화 세션 수 (오래 쓰지 않은 것부터 지움. 지워진 세션으로 SSE 질문이 오면 새 세션으로 이어감)
+PUBLIC_SESSION_ENTRIES = 5000
+# 입력 제한 (질문 글자 수, 이름 글자 수, SSE로 받는 대화 내역 메시지 수)
+MAX_QUESTION_CHARS = 4000
+MAX_USER_NAME_CHARS = 50
+MAX_HISTORY_MESSAGES = 200
+DEFAULT_MODEL = "gpt-4o"
+DEFAULT_WELCOME_MESSAGE = "안녕하세요! 무엇을 도와드릴까요?"
+IMAGE_FAILED_MESSAGE = "죄송합니다. 이미지 생성 중 오류가 발생했습니다. 다른 주제로 시도해 보시거나, 요청을 더 구체적으로 해주세요."
+
+# 입력 오류 (화면에 그대로 보여 줄 메시지)
+class PublicChatError(Exception):
+    pass
+
+# 세션 토큰이 요청한 챗봇/이름의 세션이 아님
+class PublicSessionMismatch(PublicChatError):
+    pass
+
+# 모델 호출 오류를 화면에 보여 줄 메시지로 바꾸기 (Streamlit 앱의 stream_assistant_reply와 같은 문구)
+def error_message(error):
+    if isinstance(error, (UnsupportedModelError, PublicChatError)):
+        return str(error)
+    if isinstance(error, AdmissionError):
+        return "지금 사용하는 사람이 많아 답변을 시작하지 못했습니다. 잠시 후 다시 질문해 주세요."
+    if isinstance(error, (CircuitOpenError, StreamDeadlineExceeded)):
+        return "AI 서비스가 응답하지 않고 있습니다. 잠시 후 다시 질문해 주세요."
+    if is_rate_limit_error(error):
+        return "AI 서비스 요청 한도에 도달했습니다. 잠시 후 다시 질문해 주세요."
+    return f"응답 생성 중 오류가 발생했습니다: {str(error)}"
+
+# JSON 형식은 맞지만 필요한 모양(객체, 문자열)이 아닌 요청에 대한 응답
+BAD_REQUEST_MESSAGE = "잘못된 요청입니다."
+
+# 대화 세션 (서버에만 보관)
+# 브라우저에는 추측할 수 없는 토큰만 주고, 토큰은 챗봇과 이름에 묶어 둡니다. 대화 내역 문서의 _id와 대화 요약 상태는
+# 서버가 만든 값이므로, 다른 학생의 세션 ID를 짐작해 그 대화 내역에 쓰거나 요약을 가져올 수 없습니다.
+class PublicSession:
+    def __init__(self, chatbot_id, user_name):
+        self.token = secrets.token_urlsafe(24)
+        self.chatbot_id = chatbot_id
+        self.user_name = user_name
+        self.history_id = str(ObjectId())
+        # 대화 요약 상태 (context_window.py 참고)
+        self.context_state = {}
+
+# 공개 대화 하나 (WebSocket 연결 하나, 또는 SSE 요청 하나)
+class PublicConversation:
+    def __init__(self, chatbot, model, user_name, session, history=None):
+        self.chatbot = chatbot
+        self.model = model
+        self.user_name = user_name
+        self.session = session
+        if history:
+            # 이미 저장된 대화 (SSE): 이번 턴에 추가되는 메시지만 저장
+            self.messages = list(history)
+            self.saved_count = len(self.messages)
+        else:
+            self.messages = [{"role": "assistant", "content": self.welcome_message}]
+            self.saved_count = 0
+
+    @property
+    def session_token(self):
+        return self.session.token
+
+    @property
+    def context_state(self):
+        return self.session.context_state
+
+    @property
+    def welcome_message(self):
+        return self.chatbot.get('welcome_message', DEFAULT_WELCOME_MESSAGE)
+
+def make_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY, timeout=LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0)
+
+def make_anthropic_client():
+    from anthropic import Anthropic
+    return Anthropic(api_key=ANTHROPIC_API_KEY, timeout=LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0)
+
+# Gemini 모듈 (API 키 설정 후 반환)
+def configure_gemini():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+# 프로세스 단위 서비스 (클라이언트, 호출 수 제한, 응답 캐시, 작업자 스레드)
+class PublicChatServices:
+    def __init__(self):
+        self.db = MongoClient(MONGO_URI).get_database("chatbot_platform")
+        self.openai_client = LazyClient(make_openai_client)
+        self.resilience = Resilience(RESILIENCE_CONFIG)
+        self.engine = build_chat_engine(LazyClient(make_anthropic_client), self.openai_client, LazyClient(configure_gemini),
+                                        governor=ConcurrencyGovernor(LLM_LIMITS), resilience=self.resilience,
+                                        request_timeout=LLM_REQUEST_TIMEOUT_SECONDS)
+        self.response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SIMILARITY)
+        self.executor = ThreadPoolExecutor(PUBLIC_CHAT_STREAM_THREADS, thread_name_prefix="public-chat")
+        self.chatbots = OrderedDict()
+        self.sessions = OrderedDict()
+        self.image_job_queue = None
+        self.storage_client = None
+        # 챗봇/세션 캐시용 (이벤트 루프에서도 잡으므로 오래 걸리는 작업을 하지 않음)
+        self.lock = threading.Lock()
+        # 이미지 작업 큐를 처음 만들 때만 사용 (SDK import와 클라이언트 생성 동안 다른 학생의 요청을 막지 않도록 따로 둠)
+        self.image_job_queue_lock = threading.Lock()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # 블로킹 함수를 작업자 스레드에서 실행
+    async def run_blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    # 블로킹 iterator를 작업자 스레드에서 읽어 [("wait", 대기 순서) 또는 ("item", 값), ...] 묶음으로 내보냄
+    # 이벤트 루프가 바쁜 동안 쌓인 값은 한 묶음으로 넘겨, 연결에 보내는 메시지 수가 토큰 수만큼 늘지 않도록 함
+    # make_iterator(on_wait)는 작업자 스레드에서 호출되며, 연결이 끊기면 다음 값을 받은 뒤 iterator를 닫음
+    async def iterate_in_thread(self, make_iterator):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        stopped = threading.Event()
+
+        def put(kind, value):
+            try:
+                loop.call_soon_threadsafe(events.put_nowait, (kind, value))
+            except RuntimeError:
+                # 이벤트 루프가 이미 닫힘 (서버 종료)
+                stopped.set()
+
+        def run():
+            iterator = None
+            try:
+                iterator = make_iterator(lambda position: put("wait", position))
+                for item in iterator:
+                    if stopped.is_set():
+                        break
+                    put("item", item)
+                put("end", None)
+            except Exception as e:
+                put("error", e)
+            finally:
+                if iterator is not None and hasattr(iterator, "close"):
+                    iterator.close()
+
+        self.executor.submit(run)
+        try:
+            finished = False
+            while not finished:
+                batch = [await events.get()]
+                while not events.empty():
+                    batch.append(events.get_nowait())
+                for i, (kind, value) in enumerate(batch):
+                    if kind == "error":
+                        if i:
+                            yield batch[:i]
+                        raise value
+                    if kind == "end":
+                        batch, finished = batch[:i], True
+                        break
+                if batch:
+                    yield batch
+        finally:
+            stopped.set()
+
+    # 챗봇 대화 설정 (PUBLIC_CHATBOT_CACHE_SECONDS 동안 재사용, 없으면 PublicChatError)
+    async def load_chatbot(self, chatbot_id):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.chatbots.get(chatbot_id)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+        try:
+            chatbot = await self.run_blocking(load_chat_config, self.db, chatbot_id)
+        except (InvalidId, TypeError):
+            raise PublicChatError("잘못된 챗봇 ID입니다.")
+        if not chatbot:
+            raise PublicChatError("챗봇을 찾을 수 없습니다.")
+        with self.lock:
+            self.chatbots[chatbot_id] = (now + PUBLIC_CHATBOT_CACHE_SECONDS, chatbot)
+            self.chatbots.move_to_end(chatbot_id)
+            while len(self.chatbots) > PUBLIC_CHATBOT_CACHE_ENTRIES:
+                self.chatbots.popitem(last=False)
+        return chatbot
+
+    # 세션 토큰에 해당하는 세션 (없으면 새로 만듦, 다른 챗봇이나 이름의 세션이면 PublicSessionMismatch)
+    def session_for(self, token, chatbot_id, user_name):
+        with self.lock:
+            session = self.sessions.get(token) if isinstance(token, str) else None
+            if session is not None and (session.chatbot_id != chatbot_id or session.user_name != user_name):
+                raise PublicSessionMismatch("대화 세션이 이 챗봇과 이름에 맞지 않습니다. 새로고침 후 다시 시작해 주세요.")
+            if session is None:
+                session = PublicSession(chatbot_id, user_name)
+                self.sessions[session.token] = session
+            self.sessions.move_to_end(session.token)
+            while len(self.sessions) > PUBLIC_SESSION_ENTRIES:
+                self.sessions.popitem(last=False)
+            return session
+
+    # 대화 시작 요청 확인 (챗봇, 모델, 이름)
+    # session_token과 history는 SSE로 이어서 질문하거나 WebSocket을 다시 연결할 때 브라우저가 보냄
+    async def start_conversation(self, chatbot_id, model, user_name, session_token=None, history=None):
+        if not all(value is None or isinstance(value, str) for value in (chatbot_id, model, user_name)):
+            raise PublicChatError(BAD_REQUEST_MESSAGE)
+        user_name = (user_name or "").strip()[:MAX_USER_NAME_CHARS]
+        if not user_name:
+            raise PublicChatError("이름을 입력하세요.")
+        model = model or DEFAULT_MODEL
+        if model not in MODEL_REGISTRY:
+            raise PublicChatError(f"지원하지 않는 모델입니다: {model}")
+        chatbot = await self.load_chatbot(str(chatbot_id or ""))
+        session = self.session_for(session_token, str(chatbot['_id']), user_name)
+        return PublicConversation(chatbot, model, user_name, session, history)
+
+    # 질문 하나에 답하기 (이벤트 dict를 차례로 내보내고, 끝나면 이번 턴 메시지를 대화 내역에 저장)
+    async def reply(self, conversation, question):
+        if question is not None and not isinstance(question, str):
+            yield {"type": "error", "message": BAD_REQUEST_MESSAGE}
+            return
+        question = (question or "").strip()
+        if not question:
+            return
+        if len(question) > MAX_QUESTION_CHARS:
+            yield {"type": "error", "message": f"질문은 {MAX_QUESTION_CHARS}자 이내로 입력해 주세요."}
+            return
+        conversation.messages.append({"role": "user", "content": question})
+        replies = self._reply_with_image if is_image_request(question) else self._reply_with_model
+        async for event in replies(conversation, question):
+            yield event
+        await self.run_blocking(self.save_history, conversation)
+
+    async def _reply_with_model(self, conversation, question):
+        chatbot, model = conversation.chatbot, conversation.model
+        cache_mode = chatbot.get('response_cache', CACHE_MODE_OFF)
+        cache_result = scope = None
+        if cache_mode != CACHE_MODE_OFF:
+            scope = self.response_cache.scope_for(chatbot['_id'], model, chatbot['system_prompt'], conversation.messages[:-1])
+            cached_response, cache_result = self.response_cache.get(scope, question, semantic=cache_mode == CACHE_MODE_SEMANTIC)
+            if cached_response is not None:
+                conversation.messages.append({"role": "assistant", "content": cached_response})
+                await self.run_blocking(self.record_usage, chatbot['creator'], model, datetime.now(), 0, None, cache_result)
+                yield {"type": "text", "text": cached_response}
+                yield {"type": "done", "text": cached_response}
+                return
+
+        start_time = datetime.now()
+        parts = []
+        answered = False
+        messages = list(conversation.messages)
+        try:
+            stream = self.iterate_in_thread(lambda on_wait: self.engine.stream(
+                messages, chatbot['system_prompt'], model, conversation.context_state, on_wait=on_wait))
+            async for batch in stream:
+                texts = []
+                usages = []
+                for kind, value in batch:
+                    if kind == "wait":
+                        yield {"type": "queue", "position": value}
+                    elif isinstance(value, ChatUsage):
+                        usages.append(value)
+                    else:
+                        texts.append(value)
+                if texts:
+                    parts.extend(texts)
+                    yield {"type": "text", "text": "".join(texts)}
+                for usage in usages:
+                    if usage.purpose == "summary":
+                        # 답변 뒤에 대화 요약을 만든 호출의 사용량
+                        await self.run_blocking(self.record_usage, chatbot['creator'], usage.model, datetime.now(), None, usage)
+                    else:
+                        # 대화 요약을 만드는 동안 기다리지 않도록 답변을 먼저 마무리함
+                        answered = True
+                        yield await self._finish_reply(conversation, question, scope, cache_result, start_time, usage, parts)
+        except Exception as e:
+            if answered:
+                logger.warning("답변 이후 처리 중 오류가 발생했습니다: %s", e)
+            else:
+                yield {"type": "error", "message": error_message(e)}
+            return
+        if not answered:
+            yield await self._finish_reply(conversation, question, scope, cache_result, start_time, None, parts)
+
+    # 답변 마무리 (사용량 기록, 대화 내역과 응답 캐시에 추가) 후 done 이벤트 반환
+    async def _finish_reply(self, conversation, question, scope, cache_result, start_time, usage, parts):
+        response = "".join(parts)
+        await self.run_blocking(self.record_usage, conversation.chatbot['creator'], usage.model if usage else conversation.model,
+                                start_time, None, usage, cache_result)
+        if response:
+            conversation.messages.append({"role": "assistant", "content": response})
+            if scope is not None:
+                self.response_cache.put(scope, question, response)
+        return {"type": "done", "text": response}
+
+    async def _reply_with_image(self, conversation, question):
+        yield {"type": "status", "message": "이미지를 생성하겠습니다. 잠시만 기다려 주세요."}
+        try:
+            queue, storage_client = await self.run_blocking(self.get_image_job_queue)
+            job_id = queue.submit(safe_image_prompt(question), self.openai_client, storage_client, conversation.user_name)
+            job = await self.run_blocking(queue.wait, job_id, IMAGE_JOB_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning("이미지 생성 작업을 시작하지 못했습니다: %s", e)
+            job = None
+        if job is None or job.status != JOB_DONE:
+            yield {"type": "error", "message": IMAGE_FAILED_MESSAGE}
+            return
+        response = "요청하신 이미지를 생성했습니다. 위의 이미지를 확인해 주세요."
+        conversation.messages.append({"role": "assistant", "content": response, "image_url": job.url})
+        yield {"type": "image", "url": job.url}
+        yield {"type": "done", "text": response}
+
+    # 이미지 생성 작업 큐와 Cloud Storage 클라이언트 (처음 이미지 요청이 들어올 때 만듦)
+    def get_image_job_queue(self):
+        with self.image_job_queue_lock:
+            if self.image_job_queue is None:
+                from google.cloud import storage
+                from google.oauth2.service_account import Credentials
+
+                service_account_info = json.loads(os.environ.get("GCP_SERVICE_ACCOUNT_KEY"))
+                creds = Credentials.from_service_account_info(service_account_info)
+                self.storage_client = storage.Client(credentials=creds, project=service_account_info['project_id'])
+                self.image_job_queue = ImageJobQueue(ImagePipeline(IMAGE_BUCKET_NAME, resilience=self.resilience,
+                                                                   job_timeout=IMAGE_JOB_TIMEOUT_SECONDS),
+                                                     IMAGE_JOB_WORKERS, on_finish=self.save_image_job)
+            return self.image_job_queue, self.storage_client
+
+    # 이미지 생성 작업 기록 저장 (생성 호출 횟수와 재시도 기록은 usage_logs에도 남김)
+    def save_image_job(self, job):
+        self.db.image_jobs.insert_one(job.to_record())
+        if job.usage is not None:
+            log_usage(self.db, job.owner, job.usage.model, job.created_at, usage=job.usage)
+
+    # 사용량 기록 (기록에 실패해도 답변은 그대로 보여 줌)
+    def record_usage(self, username, model_name, timestamp, tokens_used=None, usage=None, response_cache=None):
+        try:
+            log_usage(self.db, username, model_name, timestamp, tokens_used, usage, response_cache)
+        except Exception as e:
+            logger.warning("사용량 기록 중 오류가 발생했습니다: %s", e)
+
+    # 대화 내역 저장 (이번 턴에 추가된 메시지만)
+    def save_history(self, conversation):
+        new_messages = conversation.messages[conversation.saved_count:]
+        if not new_messages:
+            return
+        try:
+            append_public_chat_history(self.db, conversation.chatbot['_id'], conversation.user_name,
+                                       conversation.session.history_id, new_messages)
+            conversation.saved_count += len(new_messages)
+        except Exception as e:
+            logger.warning("대화 내역 저장 중 오류가 발생했습니다: %s", e)
+
+# 브라우저가 보낸 대화 내역 정리 (SSE와 다시 연결한 WebSocket용, 역할과 내용만 남김, 목록이 아니면 빈 내역)
+def clean_history(history):
+    messages = []
+    if not isinstance(history, list):
+        return messages
+    for message in history[-MAX_HISTORY_MESSAGES:]:
+        if isinstance(message, dict) and message.get("role") in ("user", "assistant") and isinstance(message.get("content"), str):
+            messages.append({"role": message["role"], "content": message["content"]})
+    return messages
+
+# 챗봇 카드 정보 (화면 표시용 필드만)
+def chatbot_card(chatbot):
+    return {
+        "id": str(chatbot['_id']),
+        "name": chatbot.get('name', ''),
+        "description": chatbot.get('description', ''),
+        "welcome_message": chatbot.get('welcome_message', DEFAULT_WELCOME_MESSAGE),
+        "background_color": chatbot.get('background_color', '#FFFFFF'),
+        "profile_image_url": chatbot.get('profile_image_url'),
+        "profile_thumbnails": chatbot.get('profile_thumbnails') or {},
+    }
+
+async def index(request):
+    return FileResponse(os.path.join(STATIC_DIR, "index.html"))
+
+async def healthz(request):
+    return JSONResponse({"status": "ok"})
+
+async def get_chatbot(request):
+    try:
+        chatbot = await request.app.state.services.load_chatbot(request.path_params["chatbot_id"])
+    except PublicChatError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    return JSONResponse(chatbot_card(chatbot))
+
+# WebSocket 대화: 연결 하나가 대화 하나 (대화 내역은 서버가 연결 동안 보관)
+# 연결이 끊겨 다시 연결하면 브라우저가 start에 session_id와 history를 보내 SSE처럼 같은 대화로 이어 감
+async def chat_websocket(websocket):
+    services = websocket.app.state.services
+    await websocket.accept()
+    conversation = None
+    try:
+        while True:
+            try:
+                request = await websocket.receive_json()
+            except (ValueError, KeyError, TypeError):
+                # JSON이 아닌 텍스트 또는 바이너리 프레임
+                request = None
+            if not isinstance(request, dict):
+                await websocket.send_json({"type": "error", "message": BAD_REQUEST_MESSAGE})
+                continue
+            if request.get("type") == "start":
+                try:
+                    session_token = request.get("session_id")
+                    conversation = await services.start_conversation(
+                        request.get("chatbot_id"), request.get("model"), request.get("user_name"), session_token,
+                        clean_history(request.get("history")) if session_token else None)
+                except PublicChatError as e:
+                    await websocket.send_json({"type": "error", "message": str(e)})
+                    continue
+                await websocket.send_json({"type": "started", "session_id": conversation.session_token,
+                                           "welcome_message": conversation.welcome_message})
+            elif request.get("type") == "message":
+                if conversation is None:
+                    await websocket.send_json({"type": "error", "message": "먼저 이름을 입력하고 챗봇을 시작하세요."})
+                    continue
+                async for event in services.reply(conversation, request.get("content")):
+                    await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+
+def sse_event(event):
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+# SSE 대화: 요청 하나가 질문 하나 (대화 내역은 브라우저가 보관해 history로 보냄)
+async def chat_sse(request):
+    services = request.app.state.services
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return JSONResponse({"error": BAD_REQUEST_MESSAGE}, status_code=400)
+    session_token = body.get("session_id")
+    try:
+        conversation = await services.start_conversation(body.get("chatbot_id"), body.get("model"), body.get("user_name"),
+                                                         session_token,
+                                                         clean_history(body.get("history")) if session_token else None)
+    except PublicSessionMismatch as e:
+        return JSONResponse({"error": str(e)}, status_code=403)
+    except PublicChatError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    async def events():
+        yield sse_event({"type": "started", "session_id": conversation.session_token,
+                         "welcome_message": conversation.welcome_message})
+        async for event in services.reply(conversation, body.get("content")):
+            yield sse_event(event)
+
+    # 프록시가 응답을 모아서 보내지 않도록 함
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.services = PublicChatServices()
+    try:
+        yield
+    finally:
+        app.state.services.close()
+
+app = Starlette(routes=[
+    Route("/", index),
+    Route("/healthz", healthz),
+    Route("/api/chatbots/{chatbot_id}", get_chatbot),
+    Route("/api/chat", chat_sse, methods=["POST"]),
+    WebSocketRoute("/ws/chat", chat_websocket),
+    Mount("/static", StaticFiles(directory=STATIC_DIR), name="static"),
+], lifespan=lifespan)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8080")))
@@ -0,0 +1,297 @@
+// 공개 챗봇 화면
+// WebSocket(/ws/chat)으로 대화하고, 연결할 수 없으면 SSE(POST /api/chat)로 바꿔 대화 내역을 함께 보냅니다.
+// WebSocket 연결이 끊겨 다시 연결할 때도 세션 ID와 대화 내역을 보내 같은 대화로 이어 갑니다.
+// 답변은 받은 텍스트 조각을 그대로 이어 붙여 표시합니다. (마크다운 변환 없이 텍스트로 표시)
+(function () {
+    "use strict";
+
+    var params = new URLSearchParams(window.location.search);
+    var chatbotId = params.get("chatbot_id");
+    var model = params.get("model") || "gpt-4o";
+
+    var elements = {
+        name: document.getElementById("chatbot-name"),
+        profile: document.getElementById("profile"),
+        profileImage: document.getElementById("profile-image"),
+        notice: document.getElementById("notice"),
+        startForm: document.getElementById("start-form"),
+        userName: document.getElementById("user-name"),
+        chat: document.getElementById("chat"),
+        messages: document.getElementById("messages"),
+        messageForm: document.getElementById("message-form"),
+        message: document.getElementById("message"),
+    };
+
+    var state = {
+        userName: null,
+        sessionId: null,
+        // SSE나 다시 연결한 WebSocket으로 보낼 대화 내역 (역할, 내용)
+        history: [],
+        socket: null,
+        useSse: false,
+        // 답변 중인 말풍선 {element, text, status}
+        reply: null,
+    };
+
+    function showNotice(text, isError) {
+        elements.notice.textContent = text;
+        elements.notice.className = isError ? "notice error" : "notice";
+        elements.notice.hidden = !text;
+    }
+
+    function addMessage(role, text) {
+        var element = document.createElement("div");
+        element.className = "message " + role;
+        element.textContent = text;
+        elements.messages.appendChild(element);
+        element.scrollIntoView({block: "end"});
+        return element;
+    }
+
+    // 썸네일이 있으면 WebP 썸네일과 PNG 대체 이미지를 사용 (app.py의 profile_image_html과 같음)
+    function showProfile(chatbot) {
+        var thumbnails = chatbot.profile_thumbnails["150"];
+        if (thumbnails) {
+            var source = document.createElement("source");
+            source.srcset = thumbnails.webp;
+            source.type = "image/webp";
+            elements.profile.insertBefore(source, elements.profileImage);
+            elements.profileImage.src = thumbnails.png;
+        } else {
+            elements.profileImage.src = chatbot.profile_image_url || "https://via.placeholder.com/150";
+        }
+        elements.profileImage.hidden = false;
+    }
+
+    function setBusy(busy) {
+        elements.message.disabled = busy;
+        elements.messageForm.querySelector("button").disabled = busy;
+        if (!busy) {
+            elements.message.focus();
+        }
+    }
+
+    // 서버 이벤트 처리 (WebSocket/SSE 공통)
+    function handleEvent(event) {
+        var reply = state.reply;
+        switch (event.type) {
+        case "started":
+            state.sessionId = event.session_id;
+            if (!state.history.length) {
+                state.history.push({role: "assistant", content: event.welcome_message});
+                addMessage("assistant", event.welcome_message);
+            }
+            elements.startForm.hidden = true;
+            elements.chat.hidden = false;
+            setBusy(!!state.reply);
+            break;
+        case "queue":
+            if (reply && !reply.text) {
+                reply.element.textContent = "사용자가 많아 차례를 기다리는 중입니다... (대기 순서: " + event.position + "번째)";
+            }
+            break;
+        case "status":
+            if (reply) {
+                reply.element.textContent = event.message;
+            }
+            break;
+        case "text":
+            if (reply) {
+                reply.text += event.text;
+                reply.element.textContent = reply.text;
+                reply.element.scrollIntoView({block: "end"});
+            }
+            break;
+        case "image":
+            if (reply) {
+                var image = document.createElement("img");
+                image.src = event.url;
+                image.alt = "생성된 이미지";
+                reply.element.textContent = "";
+                reply.element.appendChild(image);
+                reply.image = image;
+            }
+            break;
+        case "done":
+            if (reply) {
+                if (reply.image) {
+                    reply.element.appendChild(document.createTextNode(event.text));
+                } else {
+                    reply.element.textContent = event.text;
+                }
+                if (event.text) {
+                    state.history.push({role: "assistant", content: event.text});
+                }
+                state.reply = null;
+                setBusy(false);
+            }
+            break;
+        case "error":
+            if (reply) {
+                reply.element.textContent = reply.text;
+                if (!reply.text) {
+                    reply.element.remove();
+                }
+                state.reply = null;
+                setBusy(false);
+            }
+            showNotice(event.message, true);
+            break;
+        }
+    }
+
+    // 서버에 보낼 대화 내역 (답변을 기다리는 마지막 질문은 content로 따로 보냄)
+    function previousHistory() {
+        return state.reply ? state.history.slice(0, -1) : state.history;
+    }
+
+    function connectWebSocket(onFailure) {
+        var protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+        var socket;
+        try {
+            socket = new WebSocket(protocol + "//" + window.location.host + "/ws/chat");
+        } catch (error) {
+            onFailure();
+            return;
+        }
+        var opened = false;
+        socket.onopen = function () {
+            opened = true;
+            state.socket = socket;
+            var start = {type: "start", chatbot_id: chatbotId, model: model, user_name: state.userName};
+            if (state.sessionId) {
+                // 다시 연결: 서버의 같은 세션에 지금까지의 대화 내역을 보냄
+                start.session_id = state.sessionId;
+                start.history = previousHistory();
+            }
+            socket.send(JSON.stringify(start));
+        };
+        socket.onmessage = function (message) {
+            handleEvent(JSON.parse(message.data));
+        };
+        socket.onclose = function () {
+            state.socket = null;
+            if (!opened) {
+                onFailure();
+            } else if (state.reply) {
+                handleEvent({type: "error", message: "연결이 끊어졌습니다. 다시 질문해 주세요."});
+            }
+        };
+    }
+
+    // SSE 응답 읽기 (data: 줄마다 JSON 이벤트 하나)
+    function postSse(content) {
+        var body = {
+            chatbot_id: chatbotId,
+            model: model,
+            user_name: state.userName,
+            session_id: state.sessionId,
+            history: previousHistory(),
+            content: content,
+        };
+        return fetch("/api/chat", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify(body),
+        }).then(function (response) {
+            if (!response.ok) {
+                return response.json().then(function (error) {
+                    handleEvent({type: "error", message: error.error});
+                });
+            }
+            var reader = response.body.getReader();
+            var decoder = new TextDecoder();
+            var buffer = "";
+            function read() {
+                return reader.read().then(function (result) {
+                    buffer += decoder.decode(result.value || new Uint8Array(), {stream: !result.done});
+                    var blocks = buffer.split("\n\n");
+                    buffer = blocks.pop();
+                    blocks.forEach(function (block) {
+                        if (block.indexOf("data: ") === 0) {
+                            handleEvent(JSON.parse(block.slice(6)));
+                        }
+                    });
+                    if (!result.done) {
+                        return read();
+                    }
+                    if (state.reply) {
+                        handleEvent({type: "error", message: "연결이 끊어졌습니다. 다시 질문해 주세요."});
+                    }
+                });
+            }
+            return read();
+        }).catch(function () {
+            handleEvent({type: "error", message: "연결이 끊어졌습니다. 다시 질문해 주세요."});
+        });
+    }
+
+    function sendMessage(content) {
+        showNotice("");
+        state.history.push({role: "user", content: content});
+        addMessage("user", content);
+        state.reply = {element: addMessage("assistant", ""), text: "", image: null};
+        setBusy(true);
+        if (state.useSse) {
+            postSse(content);
+        } else if (state.socket) {
+            state.socket.send(JSON.stringify({type: "message", content: content}));
+        } else {
+            // 연결이 끊어졌으면 다시 연결해 같은 대화로 이어서 질문
+            connectWebSocket(function () { state.useSse = true; postSse(content); });
+            var waitForSocket = setInterval(function () {
+                if (state.socket && state.sessionId) {
+                    clearInterval(waitForSocket);
+                    state.socket.send(JSON.stringify({type: "message", content: content}));
+                } else if (state.useSse) {
+                    clearInterval(waitForSocket);
+                }
+            }, 100);
+        }
+    }
+
+    elements.startForm.addEventListener("submit", function (event) {
+        event.preventDefault();
+        var userName = elements.userName.value.trim();
+        if (!userName) {
+            return;
+        }
+        state.userName = userName;
+        connectWebSocket(function () {
+            // WebSocket을 쓸 수 없는 네트워크: 첫 질문 때 SSE로 대화를 시작
+            state.useSse = true;
+            handleEvent({type: "started", session_id: null, welcome_message: state.welcomeMessage});
+        });
+    });
+
+    elements.messageForm.addEventListener("submit", function (event) {
+        event.preventDefault();
+        var content = elements.message.value.trim();
+        if (!content || state.reply) {
+            return;
+        }
+        elements.message.value = "";
+        sendMessage(content);
+    });
+
+    if (!chatbotId) {
+        showNotice("챗봇 ID가 없습니다. 공유받은 링크를 다시 확인해 주세요.", true);
+        return;
+    }
+    fetch("/api/chatbots/" + encodeURIComponent(chatbotId)).then(function (response) {
+        return response.json().then(function (chatbot) {
+            if (!response.ok) {
+                showNotice(chatbot.error, true);
+                return;
+            }
+            document.title = chatbot.name;
+            elements.name.textContent = chatbot.name;
+            state.welcomeMessage = chatbot.welcome_message;
+            showProfile(chatbot);
+            elements.startForm.hidden = false;
+            elements.userName.focus();
+        });
+    }).catch(function () {
+        showNotice("챗봇 정보를 불러오지 못했습니다. 잠시 후 다시 시도해 주세요.", true);
+    });
+})();
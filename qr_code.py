@@ -0,0 +1,350 @@
+# QR 코드 생성
+# 외부 API나 추가 패키지 없이 QR 코드(모델 2, 바이트 모드)를 만들고 PNG로 저장합니다.
+# 챗봇 공유 URL처럼 짧은 문자열을 위한 것으로, 데이터 길이에 맞는 가장 작은 버전(1~40)을 고르고
+# 8가지 마스크 중 벌점이 가장 낮은 것을 사용합니다. (ISO/IEC 18004)
+import struct
+import zlib
+
+# 오류 정정 수준: 이름 -> (형식 정보 비트, 표 인덱스)
+ERROR_CORRECTION_LEVELS = {"L": (1, 0), "M": (0, 1), "Q": (3, 2), "H": (2, 3)}
+
+# 버전별 블록당 오류 정정 코드워드 수 [수준][버전]
+ECC_CODEWORDS_PER_BLOCK = (
+    (-1, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28, 28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26, 26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28),
+    (-1, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30, 28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28, 30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+)
+
+# 버전별 오류 정정 블록 수 [수준][버전]
+NUM_ERROR_CORRECTION_BLOCKS = (
+    (-1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8, 8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25),
+    (-1, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16, 17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    (-1, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20, 23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    (-1, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25, 25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+)
+
+# 마스크 패턴: (마스크 번호) -> (행, 열)에서 반전 여부
+MASK_PATTERNS = (
+    lambda r, c: (r + c) % 2 == 0,
+    lambda r, c: r % 2 == 0,
+    lambda r, c: c % 3 == 0,
+    lambda r, c: (r + c) % 3 == 0,
+    lambda r, c: (r // 2 + c // 3) % 2 == 0,
+    lambda r, c: r * c % 2 + r * c % 3 == 0,
+    lambda r, c: (r * c % 2 + r * c % 3) % 2 == 0,
+    lambda r, c: ((r + c) % 2 + r * c % 3) % 2 == 0,
+)
+
+class QRCodeError(ValueError):
+    pass
+
+# 버전의 전체 데이터 모듈 수 (기능 패턴 제외)
+def _raw_data_modules(version):
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        num_align = version // 7 + 2
+        result -= (25 * num_align - 10) * num_align - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+def _data_codewords(version, level_index):
+    return (_raw_data_modules(version) // 8
+            - ECC_CODEWORDS_PER_BLOCK[level_index][version] * NUM_ERROR_CORRECTION_BLOCKS[level_index][version])
+
+# 정렬 패턴 중심 좌표
+def _alignment_positions(version):
+    if version == 1:
+        return []
+    num_align = version // 7 + 2
+    step = 26 if version == 32 else (version * 4 + num_align * 2 + 1) // (num_align * 2 - 2) * 2
+    size = version * 4 + 17
+    return [6] + [size - 7 - i * step for i in range(num_align - 1)][::-1]
+
+# GF(256) 곱셈 (원시 다항식 0x11D)
+def _gf_multiply(x, y):
+    z = 0
+    for i in range(7, -1, -1):
+        z = (z << 1) ^ ((z >> 7) * 0x11D)
+        z ^= ((y >> i) & 1) * x
+    return z
+
+def _rs_divisor(degree):
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _gf_multiply(result[j], root)
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _gf_multiply(root, 0x02)
+    return result
+
+def _rs_remainder(data, divisor):
+    result = [0] * len(divisor)
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        for i, coefficient in enumerate(divisor):
+            result[i] ^= _gf_multiply(coefficient, factor)
+    return result
+
+# BCH 부호가 붙은 형식 정보 (15비트)
+def _format_bits(level_bits, mask):
+    data = level_bits << 3 | mask
+    remainder = data
+    for _ in range(10):
+        remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+    return (data << 10 | remainder) ^ 0x5412
+
+# BCH 부호가 붙은 버전 정보 (18비트, 버전 7 이상)
+def _version_bits(version):
+    remainder = version
+    for _ in range(12):
+        remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+    return version << 12 | remainder
+
+class QRCode:
+    def __init__(self, data, level="M"):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if level not in ERROR_CORRECTION_LEVELS:
+            raise QRCodeError(f"지원하지 않는 오류 정정 수준입니다: {level}")
+        self.level_bits, self.level_index = ERROR_CORRECTION_LEVELS[level]
+        self.version = self._choose_version(len(data))
+        self.size = self.version * 4 + 17
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.is_function = [[False] * self.size for _ in range(self.size)]
+
+        self._draw_function_patterns()
+        self._draw_codewords(self._add_ecc_and_interleave(self._encode_data(data)))
+        self.mask = self._apply_best_mask()
+
+    def _choose_version(self, length):
+        for version in range(1, 41):
+            count_bits = 8 if version < 10 else 16
+            if 4 + count_bits + length * 8 <= _data_codewords(version, self.level_index) * 8:
+                return version
+        raise QRCodeError("QR 코드에 담기에는 데이터가 너무 깁니다.")
+
+    # 바이트 모드 비트열 + 종료 패턴 + 채움 바이트 -> 데이터 코드워드
+    def _encode_data(self, data):
+        bits = []
+
+        def append_bits(value, length):
+            bits.extend((value >> i) & 1 for i in range(length - 1, -1, -1))
+
+        capacity = _data_codewords(self.version, self.level_index) * 8
+        append_bits(0b0100, 4)
+        append_bits(len(data), 8 if self.version < 10 else 16)
+        for byte in data:
+            append_bits(byte, 8)
+        append_bits(0, min(4, capacity - len(bits)))
+        append_bits(0, -len(bits) % 8)
+        pad = 0xEC
+        while len(bits) < capacity:
+            append_bits(pad, 8)
+            pad ^= 0xEC ^ 0x11
+        return [int("".join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)]
+
+    def _add_ecc_and_interleave(self, data):
+        num_blocks = NUM_ERROR_CORRECTION_BLOCKS[self.level_index][self.version]
+        ecc_length = ECC_CODEWORDS_PER_BLOCK[self.level_index][self.version]
+        raw_codewords = _raw_data_modules(self.version) // 8
+        num_short_blocks = num_blocks - raw_codewords % num_blocks
+        short_block_length = raw_codewords // num_blocks
+
+        divisor = _rs_divisor(ecc_length)
+        blocks = []
+        offset = 0
+        for i in range(num_blocks):
+            length = short_block_length - ecc_length + (0 if i < num_short_blocks else 1)
+            block = data[offset:offset + length]
+            offset += length
+            ecc = _rs_remainder(block, divisor)
+            if i < num_short_blocks:
+                block = block + [None]  # 긴 블록과 길이를 맞추기 위한 자리
+            blocks.append(block + ecc)
+
+        result = []
+        for i in range(len(blocks[0])):
+            for block in blocks:
+                if block[i] is not None:
+                    result.append(block[i])
+        return result
+
+    def _set_function(self, x, y, dark):
+        self.modules[y][x] = dark
+        self.is_function[y][x] = True
+
+    def _draw_function_patterns(self):
+        size = self.size
+        # 타이밍 패턴
+        for i in range(size):
+            self._set_function(6, i, i % 2 == 0)
+            self._set_function(i, 6, i % 2 == 0)
+        # 위치 찾기 패턴 (분리 영역 포함)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        distance = max(abs(dx), abs(dy))
+                        self._set_function(x, y, distance not in (2, 4))
+        # 정렬 패턴 (위치 찾기 패턴과 겹치는 세 곳 제외)
+        positions = _alignment_positions(self.version)
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self._set_function(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        # 형식 정보 자리 (마스크를 고른 뒤 다시 그림)
+        self._draw_format_bits(0)
+        # 버전 정보
+        if self.version >= 7:
+            bits = _version_bits(self.version)
+            for i in range(18):
+                dark = (bits >> i) & 1 == 1
+                a, b = size - 11 + i % 3, i // 3
+                self._set_function(a, b, dark)
+                self._set_function(b, a, dark)
+
+    def _draw_format_bits(self, mask):
+        bits = _format_bits(self.level_bits, mask)
+        size = self.size
+
+        def bit(i):
+            return (bits >> i) & 1 == 1
+
+        # 왼쪽 위 위치 찾기 패턴 주변
+        for i in range(6):
+            self._set_function(8, i, bit(i))
+        self._set_function(8, 7, bit(6))
+        self._set_function(8, 8, bit(7))
+        self._set_function(7, 8, bit(8))
+        for i in range(9, 15):
+            self._set_function(14 - i, 8, bit(i))
+        # 오른쪽 위, 왼쪽 아래 위치 찾기 패턴 주변
+        for i in range(8):
+            self._set_function(size - 1 - i, 8, bit(i))
+        for i in range(8, 15):
+            self._set_function(8, size - 15 + i, bit(i))
+        self._set_function(8, size - 8, True)  # 항상 어두운 모듈
+
+    # 오른쪽 아래부터 두 열씩 지그재그로 코드워드 배치
+    def _draw_codewords(self, codewords):
+        size = self.size
+        total_bits = len(codewords) * 8
+        index = 0
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            for vertical in range(size):
+                for j in range(2):
+                    x = right - j
+                    upward = (right + 1) & 2 == 0
+                    y = size - 1 - vertical if upward else vertical
+                    if not self.is_function[y][x] and index < total_bits:
+                        self.modules[y][x] = (codewords[index >> 3] >> (7 - (index & 7))) & 1 == 1
+                        index += 1
+            right -= 2
+
+    def _apply_mask(self, mask):
+        pattern = MASK_PATTERNS[mask]
+        for y in range(self.size):
+            row, function_row = self.modules[y], self.is_function[y]
+            for x in range(self.size):
+                if not function_row[x] and pattern(y, x):
+                    row[x] = not row[x]
+
+    def _apply_best_mask(self):
+        best_mask, best_penalty = 0, None
+        for mask in range(8):
+            self._apply_mask(mask)
+            self._draw_format_bits(mask)
+            penalty = self._penalty()
+            if best_penalty is None or penalty < best_penalty:
+                best_mask, best_penalty = mask, penalty
+            self._apply_mask(mask)  # 같은 마스크를 한 번 더 적용하면 원래대로 돌아감
+        self._apply_mask(best_mask)
+        self._draw_format_bits(best_mask)
+        return best_mask
+
+    # 마스크 평가 벌점 (같은 색 연속, 2x2 블록, 위치 찾기 패턴과 비슷한 모양, 어두운 모듈 비율)
+    def _penalty(self):
+        size = self.size
+        modules = self.modules
+        columns = [[modules[y][x] for y in range(size)] for x in range(size)]
+        result = 0
+        for line in modules + columns:
+            run_color, run_length = line[0], 0
+            for color in line:
+                if color == run_color:
+                    run_length += 1
+                else:
+                    if run_length >= 5:
+                        result += run_length - 2
+                    run_color, run_length = color, 1
+            if run_length >= 5:
+                result += run_length - 2
+            # 1:1:3:1:1 패턴 앞뒤로 밝은 모듈 4개 (테두리 밖은 밝은 모듈로 봄)
+            padded = [False] * 4 + line + [False] * 4
+            for i in range(len(padded) - 10):
+                window = padded[i:i + 11]
+                if window in (_FINDER_LIKE_AFTER, _FINDER_LIKE_BEFORE):
+                    result += 40
+        for y in range(size - 1):
+            for x in range(size - 1):
+                color = modules[y][x]
+                if color == modules[y][x + 1] == modules[y + 1][x] == modules[y + 1][x + 1]:
+                    result += 3
+        dark = sum(sum(row) for row in modules)
+        total = size * size
+        k = (abs(dark * 20 - total * 10) + total - 1) // total - 1
+        result += k * 10
+        return result
+
+    # 모듈을 0/1 행 목록으로 (테두리 여백 포함)
+    def matrix(self, border=4):
+        size = self.size + border * 2
+        blank = [0] * size
+        rows = [list(blank) for _ in range(border)]
+        for row in self.modules:
+            rows.append([0] * border + [1 if dark else 0 for dark in row] + [0] * border)
+        rows.extend(list(blank) for _ in range(border))
+        return rows
+
+    # 흑백 PNG 바이트 (width: 이미지 한 변의 목표 크기 px, 모듈 크기는 정수로 맞춤)
+    def to_png(self, width=150, border=4):
+        matrix = self.matrix(border)
+        scale = max(1, width // len(matrix))
+        pixel_size = len(matrix) * scale
+        raw = bytearray()
+        row_bytes = (pixel_size + 7) // 8
+        for row in matrix:
+            bits = 0
+            for dark in row:
+                bits = (bits << scale) | (0 if dark else (1 << scale) - 1)  # 1비트 흑백: 1이 흰색
+            bits <<= row_bytes * 8 - pixel_size
+            line = b"\x00" + bits.to_bytes(row_bytes, "big")
+            raw.extend(line * scale)
+
+        def chunk(tag, payload):
+            return (struct.pack(">I", len(payload)) + tag + payload
+                    + struct.pack(">I", zlib.crc32(tag + payload) & 0xFFFFFFFF))
+
+        header = struct.pack(">IIBBBBB", pixel_size, pixel_size, 1, 0, 0, 0, 0)
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+                + chunk(b"IDAT", zlib.compress(bytes(raw), 9)) + chunk(b"IEND", b""))
+
+_FINDER_LIKE_AFTER = [True, False, True, True, True, False, True, False, False, False, False]
+_FINDER_LIKE_BEFORE = _FINDER_LIKE_AFTER[::-1]
+
+# 문자열을 PNG QR 코드로
+def make_qr_png(data, width=150, level="M", border=4):
+    return QRCode(data, level).to_png(width, border)
@@ -0,0 +1,317 @@
+# 모델 호출 장애 대응
+# 제공자가 멈추거나 오류를 돌려줄 때 바로 오류를 보여 주지 않도록, 호출마다 다음을 적용합니다.
+# - 기한: 첫 토큰까지의 시간과 토큰 사이 간격에 제한을 둠 (넘으면 StreamDeadlineExceeded)
+# - 재시도: 다시 시도해도 되는 오류(429, 5xx, 시간 초과, 연결 오류)는 지터를 준 지수 백오프 후 재시도
+# - 서킷 브레이커: 제공자별로 연속 실패가 일정 횟수를 넘으면 잠시 호출하지 않음
+# - 대체 모델: 선택한 모델이 계속 실패하거나 브레이커가 열려 있으면 비슷한 수준의 다른 제공자 모델로 전환
+# - 헤지 요청: 첫 토큰이 최근 p95 TTFT보다 늦으면 같은 요청을 한 번 더 보내고 먼저 응답한 쪽을 사용
+# 재시도/전환/헤지는 첫 토큰이 화면에 나가기 전까지만 하며, 그 뒤의 오류는 그대로 올려 보냅니다.
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+# 기본 설정 (RESILIENCE_CONFIG 환경 변수(JSON)로 필요한 값만 덮어씀)
+DEFAULT_RESILIENCE = {
+    "first_token_timeout_seconds": 20,
+    "idle_timeout_seconds": 30,
+    # 한 번의 답변에 사용할 최대 호출 횟수 (대체 모델 포함)
+    "max_attempts": 3,
+    "backoff_base_seconds": 0.5,
+    "backoff_max_seconds": 4,
+    "breaker_failures": 5,
+    "breaker_reset_seconds": 30,
+    "fallback_enabled": True,
+    "fallback_models": {
+        "claude-3-5-sonnet-20240620": "gpt-4o",
+        "claude-3-opus-20240229": "gpt-4o",
+        "claude-3-haiku-20240307": "gpt-4o-mini",
+        "gpt-4o": "claude-3-5-sonnet-20240620",
+        "gpt-4o-mini": "claude-3-haiku-20240307",
+        "gemini-1.5-pro-latest": "gpt-4o",
+        "gemini-pro": "gpt-4o-mini",
+    },
+    "hedge_enabled": True,
+    # 헤지 기준 TTFT 백분위, 기준을 계산할 최소 표본 수, 기준의 최솟값(초)
+    "hedge_percentile": 95,
+    "hedge_min_samples": 20,
+    "hedge_min_seconds": 1.5,
+}
+
+# 최근 TTFT 기록 개수 (모델별)
+TTFT_SAMPLE_SIZE = 200
+
+# 다시 시도해도 되는 HTTP 상태 코드와 예외 이름 (OpenAI/Anthropic/Google SDK, requests)
+RETRIABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRIABLE_ERROR_NAMES = {
+    "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError", "OverloadedError",
+    "ServiceUnavailable", "DeadlineExceeded", "ResourceExhausted", "TooManyRequests",
+    "Timeout", "ConnectTimeout", "ReadTimeout", "ConnectionError", "StreamDeadlineExceeded",
+}
+
+# 시간 초과 예외 이름 (요청이 끝까지 처리되었을 수 있어, 비용이 큰 호출은 다시 시도하지 않을 때 사용)
+TIMEOUT_ERROR_NAMES = {"APITimeoutError", "DeadlineExceeded", "Timeout", "ConnectTimeout", "ReadTimeout",
+                       "StreamDeadlineExceeded"}
+
+class StreamDeadlineExceeded(TimeoutError):
+    pass
+
+# 선택한 모델과 대체 모델의 브레이커가 모두 열려 있음
+class CircuitOpenError(Exception):
+    pass
+
+def load_resilience_config(config=None):
+    if isinstance(config, str):
+        config = json.loads(config) if config.strip() else {}
+    merged = dict(DEFAULT_RESILIENCE)
+    merged.update({key: value for key, value in (config or {}).items() if key != "fallback_models"})
+    merged["fallback_models"] = {**DEFAULT_RESILIENCE["fallback_models"], **(config or {}).get("fallback_models", {})}
+    return merged
+
+def is_retriable_error(error):
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in RETRIABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in RETRIABLE_ERROR_NAMES
+
+def is_timeout_error(error):
+    return isinstance(error, TimeoutError) or type(error).__name__ in TIMEOUT_ERROR_NAMES
+
+# 실패하거나 건너뛴 호출을 사용량 기록(ChatUsage)에 추가 (같은 내용은 한 번만)
+def add_failover_event(usage, model, provider, error):
+    event = {"model": model, "provider": provider, "error": error}
+    if usage.failover_events is None:
+        usage.failover_events = []
+    if event not in usage.failover_events:
+        usage.failover_events.append(event)
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_seconds=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        # 진행 중인 시험 호출 (allow가 돌려준 허가 객체)과 시작 시각
+        self.probing = None
+        self.probe_started_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    # 호출해도 되는지 확인 (열린 뒤 reset_seconds가 지나면 시험 호출 하나만 허용)
+    # 허용하면 참인 허가 객체를 돌려주며, 호출이 어떻게 끝나든(재시도할 수 없는 오류, 중단, 대기열 거절) release로 돌려줘야 함
+    # 시험 호출이 reset_seconds 안에 끝나지 않으면 잃어버린 것으로 보고 새 시험 호출을 허용함
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and (self.probing is None
+                                            or self.clock() - self.probe_started_at >= self.reset_seconds):
+                self.probing = object()
+                self.probe_started_at = self.clock()
+                return self.probing
+            return False
+
+    # 성공/실패를 기록하지 않고 끝난 시험 호출 정리 (브레이커는 HALF_OPEN 그대로 두어 다음 호출이 다시 시험함)
+    def release(self, permit):
+        with self.lock:
+            if permit is not True and permit is self.probing:
+                self.probing = None
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.probing = None
+
+class Resilience:
+    def __init__(self, config=None, clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.config = load_resilience_config(config)
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self.breakers = {}
+        self.ttfts = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, provider):
+        with self.lock:
+            breaker = self.breakers.get(provider)
+            if breaker is None:
+                breaker = self.breakers[provider] = CircuitBreaker(
+                    self.config["breaker_failures"], self.config["breaker_reset_seconds"], self.clock)
+            return breaker
+
+    # 호출 순서: 선택한 모델로 먼저 시도하고, 마지막 시도는 대체 모델로 (대체 모델이 없으면 모두 선택한 모델)
+    def plan(self, model):
+        attempts = max(1, self.config["max_attempts"])
+        fallback = self.config["fallback_models"].get(model) if self.config["fallback_enabled"] else None
+        if fallback is None or attempts == 1:
+            return [model] * attempts
+        return [model] * (attempts - 1) + [fallback]
+
+    # 지터를 준 지수 백오프 (0 ~ base * 2^(retry-1) 사이, 최대 backoff_max_seconds)
+    def backoff(self, retry):
+        ceiling = min(self.config["backoff_max_seconds"], self.config["backoff_base_seconds"] * 2 ** (retry - 1))
+        return ceiling * self.rng()
+
+    def record_ttft(self, model, ttft_ms):
+        with self.lock:
+            self.ttfts.setdefault(model, deque(maxlen=TTFT_SAMPLE_SIZE)).append(ttft_ms)
+
+    # 헤지 요청을 보낼 시점 (첫 토큰 대기 시간, 초). 표본이 부족하거나 헤지를 끄면 None
+    def hedge_delay(self, model):
+        if not self.config["hedge_enabled"]:
+            return None
+        with self.lock:
+            samples = sorted(self.ttfts.get(model, ()))
+        if len(samples) < self.config["hedge_min_samples"]:
+            return None
+        p = samples[min(len(samples) - 1, int(len(samples) * self.config["hedge_percentile"] / 100))]
+        return max(p / 1000, self.config["hedge_min_seconds"])
+
+    # 제공자별 브레이커 상태
+    def snapshot(self):
+        with self.lock:
+            breakers = dict(self.breakers)
+        return [{"provider": provider, "state": breaker.state, "failures": breaker.failures}
+                for provider, breaker in sorted(breakers.items())]
+
+# 재시도를 적용한 단순 호출 (이미지 생성 등 스트리밍이 아닌 호출용)
+# retry_if(error)가 False를 돌려주면 다시 시도할 수 있는 오류여도 재시도하지 않음 (브레이커에는 실패로 기록)
+# usage(ChatUsage)를 넘기면 호출 횟수와 실패하거나 건너뛴 호출을 기록함
+def call_with_retries(function, resilience, provider, retry_if=None, usage=None):
+    breaker = resilience.breaker(provider)
+    attempts = max(1, resilience.config["max_attempts"])
+    model = usage.model if usage is not None else provider
+    for attempt in range(attempts):
+        permit = breaker.allow()
+        if not permit:
+            if usage is not None:
+                add_failover_event(usage, model, provider, "circuit_open")
+            raise CircuitOpenError(f"{provider} 호출이 잠시 중단되었습니다. (연속 실패)")
+        try:
+            if attempt:
+                resilience.sleep(resilience.backoff(attempt))
+            if usage is not None:
+                usage.attempts += 1
+            try:
+                result = function()
+            except Exception as e:
+                if usage is not None:
+                    add_failover_event(usage, model, provider, f"{type(e).__name__}: {e}"[:200])
+                if is_retriable_error(e):
+                    breaker.record_failure()
+                    if attempt < attempts - 1 and (retry_if is None or retry_if(e)):
+                        continue
+                raise
+            breaker.record_success()
+            return result
+        finally:
+            breaker.release(permit)
+
+# 같은 답변을 위한 호출 하나 (작업자 스레드에서 제공자 스트림을 읽어 공용 큐로 넘김)
+class StreamAttempt:
+    def __init__(self, model, provider, usage, ticket=None, hedge=False):
+        self.model = model
+        self.provider = provider
+        self.usage = usage
+        self.ticket = ticket
+        self.hedge = hedge
+        self.cancelled = threading.Event()
+        self.started_at = time.perf_counter()
+        # 제공자 응답 스트림 (취소할 때 닫아 연결과 호출 수 제한 자리를 바로 반환)
+        self.response = None
+        self.lock = threading.Lock()
+
+    # 어댑터가 제공자 스트림을 열면 호출 (이미 취소되었으면 바로 닫음)
+    def set_response(self, response):
+        with self.lock:
+            self.response = response
+        if self.cancelled.is_set():
+            self.close_response()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.close_response()
+
+    def close_response(self):
+        with self.lock:
+            response, self.response = self.response, None
+        close = getattr(response, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+# 여러 호출 중 첫 토큰을 먼저 보낸 호출을 사용 (나머지는 취소)
+class StreamRace:
+    def __init__(self, on_finish=None):
+        self.events = queue.Queue()
+        self.attempts = []
+        # on_finish(attempt): 호출이 끝나면(성공/실패/취소) 작업자 스레드에서 호출 (호출 수 제한 자리 반환용)
+        self.on_finish = on_finish
+
+    # iterator_factory(): 제공자 스트림(텍스트 조각 iterator)을 만드는 함수
+    def start(self, attempt, iterator_factory):
+        self.attempts.append(attempt)
+        attempt.started_at = time.perf_counter()
+        threading.Thread(target=self._run, args=(attempt, iterator_factory), daemon=True,
+                         name=f"stream-{attempt.provider}").start()
+        return attempt
+
+    def _run(self, attempt, iterator_factory):
+        iterator = None
+        try:
+            iterator = iterator_factory()
+            for text in iterator:
+                if attempt.cancelled.is_set():
+                    break
+                if text:
+                    self.events.put((attempt, "text", text))
+            else:
+                self.events.put((attempt, "done", None))
+        except Exception as e:
+            # 취소하면서 스트림을 닫아 생긴 오류는 알리지 않음
+            if not attempt.cancelled.is_set():
+                self.events.put((attempt, "error", e))
+        finally:
+            if iterator is not None and hasattr(iterator, "close"):
+                try:
+                    iterator.close()
+                except Exception:
+                    pass
+            if self.on_finish is not None:
+                self.on_finish(attempt)
+
+    # 다음 이벤트 (attempt, "text"|"done"|"error", 내용). timeout초 안에 없으면 queue.Empty
+    def get(self, timeout):
+        return self.events.get(timeout=max(timeout, 0))
+
+    # 취소한 호출은 제공자 스트림을 닫아, 다음 조각을 기다리며 멈춰 있던 작업자 스레드도 바로 끝나게 함
+    def cancel(self, keep=None):
+        for attempt in self.attempts:
+            if attempt is not keep and not attempt.cancelled.is_set():
+                attempt.cancel()
@@ -0,0 +1,171 @@
+# 응답 캐시
+# QR 코드로 같은 챗봇에 들어온 학생들이 거의 같은 질문을 반복할 때, 모델을 다시 호출하지 않고 이전 응답을 돌려줍니다.
+# 캐시 키는 (챗봇 ID, 모델, 시스템 프롬프트 해시, 이전 대화 해시, 정규화한 질문)입니다. 이전 대화를 키에 포함하므로
+# 대화 흐름이 다르면 같은 질문이라도 캐시를 사용하지 않습니다.
+# 정확히 같은 질문(정규화 후)을 먼저 찾고, 유사 검색을 켠 챗봇은 같은 범위 안에서 글자 n-gram 벡터의 코사인 유사도가
+# 기준 이상인 질문도 찾습니다. 항목은 TTL이 지나면 만료되고, 최대 개수를 넘으면 가장 오래 사용하지 않은 항목부터 지웁니다.
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+# 챗봇별 캐시 설정 값 (chatbot["response_cache"])
+CACHE_MODE_OFF = "off"
+CACHE_MODE_EXACT = "exact"
+CACHE_MODE_SEMANTIC = "semantic"
+CACHE_MODES = [CACHE_MODE_OFF, CACHE_MODE_EXACT, CACHE_MODE_SEMANTIC]
+
+# 조회 결과 (사용량 기록의 response_cache 필드)
+CACHE_HIT_EXACT = "exact"
+CACHE_HIT_SEMANTIC = "semantic"
+CACHE_MISS = "miss"
+
+# 유사 검색에 사용하기에 너무 짧은 질문 (정규화 후 글자 수)
+MIN_SEMANTIC_CHARS = 6
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s?？!！.。~]+$")
+_WHITESPACE = re.compile(r"\s+")
+_NUMBERS = re.compile(r"\d+(?:\.\d+)?")
+
+# 질문 정규화 (유니코드 정규화, 소문자, 공백 정리, 끝의 물음표/마침표 제거)
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+def text_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+# 이전 대화(새 질문 앞까지)의 해시
+def history_hash(messages):
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message["role"].encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((message["content"] or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+# 로컬 임베딩: 글자 2-gram/3-gram 빈도 벡터 (한글은 띄어쓰기가 달라도 비슷하게 나오도록 공백 제거)
+def ngram_vector(text):
+    compact = text.replace(" ", "")
+    vector = Counter()
+    for n in (2, 3):
+        for i in range(len(compact) - n + 1):
+            vector[compact[i:i + n]] += 1
+    return vector, math.sqrt(sum(count * count for count in vector.values()))
+
+def cosine_similarity(a, b):
+    vector_a, norm_a = a
+    vector_b, norm_b = b
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(vector_a) > len(vector_b):
+        vector_a, vector_b = vector_b, vector_a
+    return sum(count * vector_b.get(gram, 0) for gram, count in vector_a.items()) / (norm_a * norm_b)
+
+class ResponseCache:
+    def __init__(self, max_entries=2000, ttl_seconds=3600, similarity_threshold=0.65, embed=ngram_vector,
+                 similarity=cosine_similarity, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self.similarity = similarity
+        self.clock = clock
+        # 전체 항목 (LRU 순서): key -> {"response", "expires_at", "vector", "numbers"}
+        self.entries = OrderedDict()
+        # 유사 검색 범위(챗봇, 모델, 시스템 프롬프트, 이전 대화)별 질문 목록: scope -> {정규화한 질문}
+        self.scopes = {}
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    @staticmethod
+    def scope_for(chatbot_id, model, system_prompt, history):
+        return (str(chatbot_id), model, text_hash(system_prompt), history_hash(history))
+
+    # (응답, 조회 결과) 반환. 못 찾으면 (None, CACHE_MISS)
+    def get(self, scope, question, semantic=False):
+        question = normalize_question(question)
+        now = self.clock()
+        with self.lock:
+            entry = self._live_entry((scope, question), now)
+            if entry is not None:
+                self.stats[CACHE_HIT_EXACT] += 1
+                return entry["response"], CACHE_HIT_EXACT
+            if semantic and len(question) >= MIN_SEMANTIC_CHARS:
+                key = self._similar_key(scope, question, now)
+                if key is not None:
+                    self.entries.move_to_end(key)
+                    self.stats[CACHE_HIT_SEMANTIC] += 1
+                    return self.entries[key]["response"], CACHE_HIT_SEMANTIC
+            self.stats[CACHE_MISS] += 1
+            return None, CACHE_MISS
+
+    def put(self, scope, question, response):
+        question = normalize_question(question)
+        if not question or not response:
+            return
+        key = (scope, question)
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = {
+                "response": response,
+                "expires_at": self.clock() + self.ttl_seconds,
+                "vector": self.embed(question),
+                "numbers": _NUMBERS.findall(question),
+            }
+            self.scopes.setdefault(scope, set()).add(question)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    # 챗봇의 캐시 항목 전체 삭제 (챗봇 수정 시)
+    def invalidate(self, chatbot_id):
+        chatbot_id = str(chatbot_id)
+        with self.lock:
+            for key in [key for key in self.entries if key[0][0] == chatbot_id]:
+                self._remove(key)
+
+    def hit_rate(self):
+        lookups = self.stats[CACHE_HIT_EXACT] + self.stats[CACHE_HIT_SEMANTIC] + self.stats[CACHE_MISS]
+        return (self.stats[CACHE_HIT_EXACT] + self.stats[CACHE_HIT_SEMANTIC]) / lookups if lookups else None
+
+    def _live_entry(self, key, now, touch=True):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= now:
+            self._remove(key)
+            self.stats["expired"] += 1
+            return None
+        if touch:
+            self.entries.move_to_end(key)
+        return entry
+
+    # 같은 범위에서 가장 비슷한 질문의 키 (숫자가 다른 질문은 다른 질문으로 봄)
+    def _similar_key(self, scope, question, now):
+        vector = self.embed(question)
+        numbers = _NUMBERS.findall(question)
+        best_key, best_score = None, self.similarity_threshold
+        for candidate in list(self.scopes.get(scope, ())):
+            key = (scope, candidate)
+            entry = self._live_entry(key, now, touch=False)
+            if entry is None or entry["numbers"] != numbers:
+                continue
+            score = self.similarity(vector, entry["vector"])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _remove(self, key):
+        if self.entries.pop(key, None) is None:
+            return
+        questions = self.scopes.get(key[0])
+        if questions is not None:
+            questions.discard(key[1])
+            if not questions:
+                del self.scopes[key[0]]
@@ -0,0 +1,117 @@
+# MongoDB 컬렉션 인덱스 정의, 초기화 및 데이터 마이그레이션
+# app.py의 조회 패턴에 맞춘 인덱스를 한곳에 정의합니다. ensure_indexes는 여러 번 실행해도 결과가 같으며,
+# QUERY_PLAN_CHECKS는 scripts/check_query_plans.py에서 explain 결과에 COLLSCAN이 없는지 확인하는 데 사용됩니다.
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING
+
+# 보존 기간(TTL) 인덱스
+RETENTION_INDEX_NAME = "timestamp_ttl"
+RETENTION_COLLECTIONS = ["chat_history", "public_chat_history", "usage_logs", "image_jobs"]
+
+# 컬렉션별 인덱스: (키 목록, 이름[, 옵션])
+INDEXES = {
+    "users": [
+        ([("username", ASCENDING)], "username_1"),
+    ],
+    "chatbots": [
+        ([("creator", ASCENDING), ("_id", ASCENDING)], "creator_id"),
+    ],
+    "messages": [
+        # 챗봇별 대화 메시지 (삽입 순서대로 조회)
+        ([("chatbot_id", ASCENDING), ("_id", ASCENDING)], "chatbot_id_order"),
+    ],
+    "public_chat_history": [
+        # 사용자별 대화 조회 및 distinct("user_name", {"chatbot_id"})
+        ([("chatbot_id", ASCENDING), ("user_name", ASCENDING), ("timestamp", ASCENDING)], "chatbot_user_timestamp"),
+        # 챗봇 전체 대화 조회 (시간순 정렬)
+        ([("chatbot_id", ASCENDING), ("timestamp", ASCENDING)], "chatbot_timestamp"),
+    ],
+    "chat_history": [
+        ([("chatbot_name", ASCENDING), ("user", ASCENDING), ("timestamp", DESCENDING)], "chatbot_user_timestamp"),
+    ],
+    "shared_chatbots": [
+        # 범주별 카드 페이지 (등록 순) 및 distinct("category")
+        ([("category", ASCENDING), ("_id", ASCENDING)], "category_id"),
+    ],
+    "usage_logs": [
+        ([("username", ASCENDING), ("model_name", ASCENDING), ("timestamp", ASCENDING)], "user_model_timestamp"),
+    ],
+    "usage_daily": [
+        # 일간 집계 문서는 (날짜, 사용자, 모델)당 하나
+        ([("date", ASCENDING), ("username", ASCENDING), ("model_name", ASCENDING)], "date_user_model", {"unique": True}),
+    ],
+}
+
+# explain 검사 대상 쿼리 (app.py의 실제 조회와 같은 형태)
+QUERY_PLAN_CHECKS = [
+    {"collection": "users", "filter": {"username": "admin"}},
+    {"collection": "chatbots", "filter": {"creator": "admin"}, "sort": {"_id": 1}},
+    {"collection": "chatbots", "filter": {}, "sort": {"_id": 1}},
+    {"collection": "chatbots", "distinct": "creator", "filter": {}},
+    {"collection": "messages", "filter": {"chatbot_id": "000000000000000000000000"}, "sort": {"_id": 1}},
+    {"collection": "public_chat_history", "filter": {"chatbot_id": "x", "user_name": "x"}, "sort": {"timestamp": 1}},
+    {"collection": "public_chat_history", "filter": {"chatbot_id": "x"}, "sort": {"timestamp": 1}},
+    {"collection": "public_chat_history", "distinct": "user_name", "filter": {"chatbot_id": "x"}},
+    {"collection": "chat_history", "filter": {"chatbot_name": "x", "user": "x"}, "sort": {"timestamp": -1}},
+    {"collection": "shared_chatbots", "distinct": "category", "filter": {}},
+    {"collection": "shared_chatbots", "filter": {"category": "x"}, "sort": {"_id": 1}},
+    {"collection": "usage_daily", "filter": {"date": {"$gte": "2024-01-01"}, "username": {"$in": ["x"]}, "model_name": {"$in": ["x"]}}},
+    {"collection": "usage_logs", "filter": {"username": {"$in": ["x"]}, "model_name": {"$in": ["x"]}}, "sort": {"timestamp": -1}},
+]
+
+# 인덱스 생성 함수 (없으면 만들고, 보존 기간이 바뀌었으면 TTL만 변경)
+def ensure_indexes(db, retention_days):
+    for collection_name, indexes in INDEXES.items():
+        for keys, name, *options in indexes:
+            db[collection_name].create_index(keys, name=name, **(options[0] if options else {}))
+
+    expire_after = int(timedelta(days=retention_days).total_seconds())
+    for collection_name in RETENTION_COLLECTIONS:
+        collection = db[collection_name]
+        existing = collection.index_information().get(RETENTION_INDEX_NAME)
+        if existing is None:
+            collection.create_index("timestamp", name=RETENTION_INDEX_NAME, expireAfterSeconds=expire_after)
+        elif existing.get("expireAfterSeconds") != expire_after:
+            # 보존 기간이 바뀐 경우 인덱스를 다시 만들지 않고 만료 시간만 변경
+            db.command("collMod", collection_name, index={"name": RETENTION_INDEX_NAME, "expireAfterSeconds": expire_after})
+
+# 실행 계획에 포함된 단계 이름 목록
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+# 쿼리 하나의 explain 결과에서 최종 실행 계획 단계 목록 가져오기
+def explain_stages(db, check):
+    if "distinct" in check:
+        command = {"distinct": check["collection"], "key": check["distinct"], "query": check["filter"]}
+    else:
+        command = {"find": check["collection"], "filter": check["filter"]}
+        if "sort" in check:
+            command["sort"] = check["sort"]
+    result = db.command("explain", command, verbosity="queryPlanner")
+    return _plan_stages(result["queryPlanner"]["winningPlan"])
+
+# 개인 챗봇 마이그레이션 함수
+# users 문서에 내장된 chatbots 배열을 chatbots 컬렉션으로, 각 챗봇의 messages 배열을 messages 컬렉션으로 옮깁니다.
+# 챗봇 _id는 그대로 유지하므로 기존 공개 URL(chatbot_id)도 계속 동작합니다. 여러 번 실행해도 안전합니다.
+def migrate_user_chatbots(db, user):
+    embedded_chatbots = user.get("chatbots")
+    if not embedded_chatbots:
+        return 0
+    for chatbot in embedded_chatbots:
+        chatbot = dict(chatbot)
+        messages = chatbot.pop("messages", [])
+        chatbot.pop("owner", None)
+        chatbot.setdefault("creator", user["username"])
+        db.chatbots.update_one({"_id": chatbot["_id"]}, {"$setOnInsert": chatbot}, upsert=True)
+        if messages and db.messages.count_documents({"chatbot_id": chatbot["_id"]}, limit=1) == 0:
+            now = datetime.now()
+            db.messages.insert_many([dict(message, chatbot_id=chatbot["_id"], timestamp=now) for message in messages])
+    db.users.update_one({"_id": user["_id"]}, {"$unset": {"chatbots": ""}})
+    return len(embedded_chatbots)
@@ -0,0 +1,72 @@
+# 프로필 이미지 썸네일 백필
+# 썸네일 생성 기능이 생기기 전에 만든 챗봇의 프로필 이미지(Cloud Storage에 있는 원본)로 카드용 WebP/PNG 썸네일을 만들고,
+# 원본과 썸네일에 긴 Cache-Control을 설정한 뒤 챗봇 문서에 profile_thumbnails를 기록합니다.
+#
+# 사용법:
+#   MONGO_URI=... GCP_SERVICE_ACCOUNT_KEY=... python scripts/backfill_profile_thumbnails.py [--dry-run]
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from google.cloud import storage
+from google.oauth2.service_account import Credentials
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from image_jobs import (IMMUTABLE_CACHE_CONTROL, THUMBNAIL_FORMATS, THUMBNAIL_SIZES,  # noqa: E402
+                        make_thumbnails, thumbnail_name)
+
+BUCKET_NAME = "sawlteacher"
+PUBLIC_URL_PREFIX = f"https://storage.googleapis.com/{BUCKET_NAME}/"
+
+def backfill(db, collection_name, bucket, dry_run):
+    count = 0
+    chatbots = db[collection_name].find(
+        {"profile_image_url": {"$regex": f"^{PUBLIC_URL_PREFIX}"}, "profile_thumbnails": {"$in": [None, {}]}},
+        {"_id": 1, "name": 1, "profile_image_url": 1}
+    )
+    for chatbot in chatbots:
+        filename = chatbot["profile_image_url"][len(PUBLIC_URL_PREFIX):]
+        count += 1
+        print(f"{collection_name}: {chatbot['name']} ({filename})")
+        if dry_run:
+            continue
+
+        source = bucket.blob(filename)
+        with tempfile.SpooledTemporaryFile(1024 * 1024) as image_file:
+            source.download_to_file(image_file)
+            image_file.seek(0)
+            thumbnails = {}
+            for (size, extension), data in make_thumbnails(image_file, THUMBNAIL_SIZES).items():
+                name = thumbnail_name(filename, size, extension)
+                blob = bucket.blob(name)
+                blob.cache_control = IMMUTABLE_CACHE_CONTROL
+                blob.upload_from_string(data, content_type=THUMBNAIL_FORMATS[extension][1])
+                thumbnails.setdefault(str(size), {})[extension] = PUBLIC_URL_PREFIX + name
+
+        source.cache_control = IMMUTABLE_CACHE_CONTROL
+        source.patch()
+        db[collection_name].update_one({"_id": chatbot["_id"]}, {"$set": {"profile_thumbnails": thumbnails}})
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="기존 챗봇 프로필 이미지의 카드용 썸네일 생성")
+    parser.add_argument("--database", default="chatbot_platform")
+    parser.add_argument("--dry-run", action="store_true", help="대상만 출력하고 변경하지 않음")
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ["MONGO_URI"])
+    db = client.get_database(args.database)
+    service_account_info = json.loads(os.environ["GCP_SERVICE_ACCOUNT_KEY"])
+    creds = Credentials.from_service_account_info(service_account_info)
+    bucket = storage.Client(credentials=creds, project=service_account_info["project_id"]).bucket(BUCKET_NAME)
+
+    total = sum(backfill(db, collection_name, bucket, args.dry_run) for collection_name in ("chatbots", "shared_chatbots"))
+    action = "생성 예정" if args.dry_run else "생성 완료"
+    print(f"{action}: 챗봇 {total}개")
+    client.close()
+
+if __name__ == "__main__":
+    main()
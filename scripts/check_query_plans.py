@@ -0,0 +1,39 @@
+# 쿼리 실행 계획 검사
+# schema.py의 인덱스를 적용한 뒤 QUERY_PLAN_CHECKS의 각 쿼리를 explain하여, 전체 컬렉션 스캔(COLLSCAN)으로
+# 실행되는 쿼리가 있으면 종료 코드 1로 끝납니다. CI(.github/workflows/deploy.yml의 check 작업)에서 배포 전에 mongo 서비스 컨테이너를
+# 대상으로 실행하며, 검사가 실패하면 배포하지 않습니다.
+#
+# 사용법:
+#   MONGO_URI=mongodb://localhost:27017 python scripts/check_query_plans.py [--database chatbot_platform_ci]
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from schema import QUERY_PLAN_CHECKS, ensure_indexes, explain_stages  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="인덱스를 사용하지 않는 쿼리(COLLSCAN) 검사")
+    parser.add_argument("--database", default="chatbot_platform_ci")
+    parser.add_argument("--retention-days", type=int, default=30)
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+    db = client.get_database(args.database)
+    ensure_indexes(db, args.retention_days)
+
+    failed = False
+    for check in QUERY_PLAN_CHECKS:
+        stages = explain_stages(db, check)
+        status = "FAIL" if "COLLSCAN" in stages else "OK"
+        failed = failed or status == "FAIL"
+        query = check.get("distinct") and f"distinct({check['distinct']})" or "find"
+        print(f"[{status}] {check['collection']}.{query} {check['filter']} -> {' > '.join(s for s in stages if s)}")
+
+    client.close()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
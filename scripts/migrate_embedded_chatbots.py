@@ -0,0 +1,42 @@
+# 개인 챗봇 데이터 마이그레이션
+# users.chatbots[]에 내장된 개인 챗봇과 대화 메시지를 chatbots / messages 컬렉션으로 옮깁니다.
+# 앱도 로그인 시 해당 사용자의 데이터를 같은 방식으로 옮기지만, 배포 전에 한 번 전체를 옮겨 두는 것을 권장합니다.
+#
+# 사용법:
+#   MONGO_URI=... python scripts/migrate_embedded_chatbots.py [--dry-run]
+import argparse
+import os
+import sys
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from schema import migrate_user_chatbots  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="users 문서에 내장된 개인 챗봇을 별도 컬렉션으로 이동")
+    parser.add_argument("--database", default="chatbot_platform")
+    parser.add_argument("--dry-run", action="store_true", help="옮길 대상만 출력하고 변경하지 않음")
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ["MONGO_URI"])
+    db = client.get_database(args.database)
+
+    users = db.users.find({"chatbots.0": {"$exists": True}})
+    total_users = 0
+    total_chatbots = 0
+    for user in users:
+        total_users += 1
+        if args.dry_run:
+            count = len(user["chatbots"])
+        else:
+            count = migrate_user_chatbots(db, user)
+        total_chatbots += count
+        print(f"{user['username']}: 챗봇 {count}개")
+
+    action = "이동 예정" if args.dry_run else "이동 완료"
+    print(f"{action}: 사용자 {total_users}명, 챗봇 {total_chatbots}개")
+    client.close()
+
+if __name__ == "__main__":
+    main()
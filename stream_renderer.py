@@ -0,0 +1,45 @@
+# 스트리밍 응답 표시
+# 청크가 올 때마다 전체 응답을 다시 그리지 않고, 청크를 리스트에 모아 두었다가
+# 일정 시간(flush_interval_ms) 또는 일정 글자 수(flush_chars)가 쌓였을 때만 화면(placeholder)을 갱신합니다.
+import time
+
+class StreamRenderer:
+    def __init__(self, placeholder, flush_interval_ms=200, flush_chars=500, cursor="▌", clock=time.perf_counter):
+        self.placeholder = placeholder
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_chars = flush_chars
+        self.cursor = cursor
+        self.clock = clock
+        self.parts = []
+        self.pending_chars = 0
+        self.last_flush_at = clock()
+        # 벤치마크 및 모니터링용
+        self.flush_count = 0
+        self.bytes_pushed = 0
+
+    @property
+    def text(self):
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0] if self.parts else ""
+
+    def append(self, chunk):
+        if not chunk:
+            return
+        self.parts.append(chunk)
+        self.pending_chars += len(chunk)
+        if self.pending_chars >= self.flush_chars or self.clock() - self.last_flush_at >= self.flush_interval:
+            self._push(self.text + self.cursor)
+
+    # 마지막 갱신 (커서 없이 전체 응답 표시) 후 전체 텍스트 반환
+    def finish(self):
+        text = self.text
+        self._push(text)
+        return text
+
+    def _push(self, content):
+        self.placeholder.markdown(content)
+        self.pending_chars = 0
+        self.last_flush_at = self.clock()
+        self.flush_count += 1
+        self.bytes_pushed += len(content.encode("utf-8"))
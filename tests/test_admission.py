@@ -0,0 +1,151 @@
+# admission.py ConcurrencyGovernor 테스트
+# 기다리는 요청이 들어온 순서대로 허용되고 요청 속도 제한에 걸린 모델의 요청은 건너뛰는지, 대기열이 가득 차거나
+# 대기 시간이 지나면 거절하는지, 화면이 다시 실행되어(on_wait에서 예외) 기다리기를 멈추면 자리를 돌려주는지,
+# 기다리는 요청이 있으면 try_acquire가 새치기하지 않는지 확인합니다. (가짜 시계 사용)
+import threading
+
+import pytest
+
+from admission import AdmissionRejected, AdmissionTimeout, ConcurrencyGovernor
+
+OPUS = "claude-3-opus-20240229"
+SONNET = "claude-3-5-sonnet-20240620"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+# Streamlit의 RerunException처럼 기다리는 도중 화면 실행을 멈추는 예외
+class RerunException(Exception):
+    pass
+
+def make_governor(clock, **limits):
+    limits = {"providers": {"anthropic": {"max_concurrent": 1}}, "models": {OPUS: {"requests_per_minute": 1, "burst": 1}},
+              **limits}
+    return ConcurrencyGovernor(limits, clock=clock, poll_seconds=0.01)
+
+def provider_row(governor, provider="anthropic"):
+    return [row for row in governor.snapshot() if row["provider"] == provider][0]
+
+# 다른 스레드에서 acquire로 기다리다 허용받으면 admitted에 기록하고 자리를 돌려줌
+# 대기열에 들어갈 때까지 기다렸다가 스레드를 반환
+def start_waiter(governor, model, admitted, timeout=600):
+    queued = threading.Event()
+
+    def run():
+        ticket = governor.acquire("anthropic", model, on_wait=lambda position: queued.set(), timeout=timeout)
+        admitted.append(model)
+        governor.release(ticket)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert queued.wait(5)
+    return thread
+
+def test_waiting_requests_are_admitted_in_order():
+    governor = make_governor(FakeClock())
+    holder = governor.try_acquire("anthropic", SONNET)
+    admitted = []
+    threads = [start_waiter(governor, model, admitted) for model in ("gpt-a", "gpt-b", "gpt-c")]
+
+    governor.release(holder)
+    for thread in threads:
+        thread.join(5)
+    assert admitted == ["gpt-a", "gpt-b", "gpt-c"]
+    row = provider_row(governor)
+    assert row["queue_depth"] == 0 and row["in_flight"] == 0 and row["admitted"] == 4
+
+def test_rate_limited_model_is_skipped():
+    clock = FakeClock()
+    governor = make_governor(clock)
+    # Opus 요청 하나로 모델 요청 속도 제한(분당 1회)을 다 씀
+    holder = governor.try_acquire("anthropic", OPUS)
+    admitted = []
+    opus = start_waiter(governor, OPUS, admitted)
+    sonnet = start_waiter(governor, SONNET, admitted)
+
+    # Opus 요청이 먼저 기다리지만 모델 요청 속도 제한에 걸려 있어 Sonnet 요청을 먼저 보냄
+    governor.release(holder)
+    sonnet.join(5)
+    assert admitted == [SONNET]
+
+    clock.now += 60
+    opus.join(5)
+    assert admitted == [SONNET, OPUS]
+
+def test_timeout_when_turn_never_comes():
+    clock = FakeClock()
+    governor = make_governor(clock)
+    holder = governor.try_acquire("anthropic", SONNET)
+    positions = []
+
+    def on_wait(position):
+        positions.append(position)
+        clock.now += 10
+
+    with pytest.raises(AdmissionTimeout):
+        governor.acquire("anthropic", SONNET, on_wait=on_wait, timeout=5)
+    assert positions == [1]
+    row = provider_row(governor)
+    assert row["queue_depth"] == 0 and row["timed_out"] == 1 and row["in_flight"] == 1
+    governor.release(holder)
+
+def test_full_queue_is_rejected():
+    governor = make_governor(FakeClock(), max_queue=1)
+    holder = governor.try_acquire("anthropic", SONNET)
+    admitted = []
+    waiter = start_waiter(governor, SONNET, admitted)
+
+    with pytest.raises(AdmissionRejected):
+        governor.acquire("anthropic", SONNET)
+    assert provider_row(governor)["rejected"] == 1
+
+    governor.release(holder)
+    waiter.join(5)
+    assert admitted == [SONNET]
+
+def test_rerun_while_waiting_leaves_queue():
+    governor = make_governor(FakeClock())
+    holder = governor.try_acquire("anthropic", SONNET)
+
+    def on_wait(position):
+        raise RerunException()
+
+    with pytest.raises(RerunException):
+        governor.acquire("anthropic", SONNET, on_wait=on_wait)
+    governor.release(holder)
+    row = provider_row(governor)
+    assert row["queue_depth"] == 0 and row["in_flight"] == 0 and row["admitted"] == 1
+
+def test_rerun_after_admission_returns_slot():
+    governor = make_governor(FakeClock())
+    holder = governor.try_acquire("anthropic", SONNET)
+
+    # 순서를 알리는 사이에 앞선 호출이 끝나 이미 허용받은 뒤 화면이 다시 실행됨
+    def on_wait(position):
+        governor.release(holder)
+        raise RerunException()
+
+    with pytest.raises(RerunException):
+        governor.acquire("anthropic", SONNET, on_wait=on_wait)
+    row = provider_row(governor)
+    assert row["admitted"] == 2 and row["in_flight"] == 0
+    assert governor.try_acquire("anthropic", SONNET) is not None
+
+def test_try_acquire_does_not_jump_queue():
+    clock = FakeClock()
+    governor = make_governor(clock, providers={"anthropic": {"max_concurrent": 2}})
+    holder = governor.try_acquire("anthropic", OPUS)
+    admitted = []
+    waiter = start_waiter(governor, OPUS, admitted)
+
+    # 자리는 남아 있지만 먼저 기다리는 요청이 있으므로 바로 허용하지 않음
+    assert governor.try_acquire("anthropic", SONNET) is None
+    governor.release(holder)
+    clock.now += 60
+    waiter.join(5)
+    assert admitted == [OPUS]
+    assert governor.try_acquire("anthropic", SONNET) is not None
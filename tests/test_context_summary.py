@@ -0,0 +1,92 @@
+# ChatEngine 대화 요약 테스트
+# 오래된 대화의 요약을 답변 뒤에 같은 제공자의 작은 모델로 만드는지, 요약 호출이 호출 수 제한과 장애 대응을 거치고
+# 사용량을 내보내는지, 요약에 실패하면 기록을 남기고 오래된 대화를 바로 버리지 않는지 확인합니다. (가짜 어댑터 사용)
+import logging
+
+from admission import ConcurrencyGovernor
+from chat_engine import SUMMARY_MODELS, ChatEngine, ChatUsage
+from context_window import ContextManager
+from resilience import Resilience
+
+class RecordingAdapter:
+    def __init__(self, log, reply="답변", summary="요약문", summary_error=None):
+        self.log = log
+        self.reply = reply
+        self.summary = summary
+        self.summary_error = summary_error
+
+    def stream(self, messages, system, model, usage, summary=None, on_response=None, timeout=None):
+        self.log.append(("call", model))
+        usage.input_tokens, usage.output_tokens = 10, 5
+        if model in SUMMARY_MODELS.values():
+            if self.summary_error is not None:
+                raise self.summary_error
+            yield self.summary
+        else:
+            yield self.reply
+
+class CountingGovernor(ConcurrencyGovernor):
+    def __init__(self, log):
+        super().__init__()
+        self.log = log
+
+    def acquire(self, provider, model, on_wait=None, timeout=None):
+        self.log.append(("acquire", model))
+        return super().acquire(provider, model, on_wait, timeout)
+
+def long_conversation(turns=8):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"질문 {i} " + "가" * 100})
+        messages.append({"role": "assistant", "content": f"답변 {i} " + "나" * 100})
+    messages.append({"role": "user", "content": "마지막 질문"})
+    return messages
+
+def make_engine(log, provider="anthropic", **adapter_options):
+    resilience = Resilience({"max_attempts": 1, "fallback_enabled": False, "hedge_enabled": False}, sleep=lambda seconds: None)
+    return ChatEngine({provider: RecordingAdapter(log, **adapter_options)},
+                      context_manager=ContextManager(budgets={"claude-3-5-sonnet-20240620": 1000}, overflow_ratio=2),
+                      governor=CountingGovernor(log), resilience=resilience)
+
+def test_summary_is_made_after_reply_with_provider_model():
+    log = []
+    engine = make_engine(log)
+    state = {}
+
+    events = []
+    for event in engine.stream(long_conversation(), "시스템", "claude-3-5-sonnet-20240620", state):
+        events.append(event)
+        log.append(("event", event if isinstance(event, str) else event.purpose))
+
+    summary_model = SUMMARY_MODELS["anthropic"]
+    assert log.index(("event", "chat")) < log.index(("call", summary_model))
+    assert ("acquire", summary_model) in log
+    usages = [event for event in events if isinstance(event, ChatUsage)]
+    assert [usage.purpose for usage in usages] == ["chat", "summary"]
+    assert usages[1].model == summary_model and usages[1].output_tokens == 5 and usages[1].ttft_ms is None
+    assert state["summary"] == "요약문" and state["covered"] > 0
+
+def test_next_turn_uses_summary():
+    log = []
+    engine = make_engine(log)
+    state = {}
+    messages = long_conversation()
+    list(engine.stream(messages, "시스템", "claude-3-5-sonnet-20240620", state))
+
+    usage = [event for event in engine.stream(messages, "시스템", "claude-3-5-sonnet-20240620", state)
+             if isinstance(event, ChatUsage)][0]
+    assert usage.trimmed_messages == state["covered"]
+
+def test_failed_summary_is_logged_and_keeps_old_turns(caplog):
+    log = []
+    engine = make_engine(log, summary_error=ConnectionError("요약 실패"))
+    state = {}
+
+    with caplog.at_level(logging.WARNING, logger="chat_engine"):
+        events = list(engine.stream(long_conversation(), "시스템", "claude-3-5-sonnet-20240620", state))
+    assert "대화 요약에 실패했습니다" in caplog.text
+    assert events[0] == "답변"
+    usage = [event for event in events if isinstance(event, ChatUsage)][0]
+    # 요약이 없으므로 이번 턴은 오래된 대화를 잘라내지 않고 보냄 (한도 안)
+    assert usage.trimmed_messages == 0
+    assert "summary" not in state
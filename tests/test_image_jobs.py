@@ -0,0 +1,61 @@
+# 이미지 생성 재시도 테스트
+# 비용이 드는 이미지 생성 호출을 시간 초과 후 다시 보내지 않는지, 작업 대기 시간 안에 끝낼 수 없으면 재시도하지 않는지,
+# 호출 횟수와 실패한 호출이 작업 기록에 남는지 확인합니다. (가짜 OpenAI 클라이언트 사용)
+from types import SimpleNamespace
+
+import pytest
+
+from image_jobs import ImageJob, ImagePipeline
+from resilience import Resilience
+
+class APITimeoutError(Exception):
+    pass
+
+class InternalServerError(Exception):
+    status_code = 500
+
+class FakeImages:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate(self, **options):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(data=[SimpleNamespace(url="https://example.com/image.png")])
+
+def make_job(*errors):
+    images = FakeImages(errors)
+    return ImageJob("고양이", SimpleNamespace(images=images), storage_client=None, owner="teacher"), images
+
+def make_pipeline(job_timeout=180):
+    resilience = Resilience({"max_attempts": 3, "breaker_failures": 10}, sleep=lambda seconds: None)
+    return ImagePipeline("bucket", resilience=resilience, job_timeout=job_timeout)
+
+def test_timeout_is_not_retried():
+    job, images = make_job(APITimeoutError("timed out"))
+
+    with pytest.raises(APITimeoutError):
+        make_pipeline().generate(job)
+    assert images.calls == 1
+    record = job.to_record()
+    assert record["attempts"] == 1
+    assert record["failover_events"] == [{"model": "dall-e-3", "provider": "openai_images",
+                                          "error": "APITimeoutError: timed out"}]
+
+def test_server_error_is_retried_and_recorded():
+    job, images = make_job(InternalServerError("server error"))
+
+    assert make_pipeline().generate(job) == "https://example.com/image.png"
+    assert images.calls == 2
+    assert job.usage.attempts == 2 and job.usage.purpose == "image"
+    assert job.usage.failover_events[0]["error"] == "InternalServerError: server error"
+
+def test_no_retry_when_job_wait_would_be_exceeded():
+    job, images = make_job(InternalServerError("server error"))
+
+    # 다시 생성하고 내려받는 최악의 시간(90 + 65초 + 백오프)이 작업 대기 시간을 넘음
+    with pytest.raises(InternalServerError):
+        make_pipeline(job_timeout=120).generate(job)
+    assert images.calls == 1
@@ -0,0 +1,92 @@
+# 공개 챗봇 서버 요청 검사 테스트
+# JSON 형식은 맞지만 모양이 다른 요청(객체가 아닌 프레임/본문, 목록이 아닌 history, 문자열이 아닌 값)과 JSON이 아닌
+# WebSocket 프레임에 500이나 연결 종료 대신 오류 이벤트/400으로 답하는지, WebSocket을 다시 연결하면 같은 대화로
+# 이어지는지 확인합니다.
+# (benchmarks/fake_services.py의 가짜 모델과 mongomock 사용)
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+@pytest.fixture(scope="module")
+def server():
+    pytest.importorskip("mongomock")
+    from starlette.testclient import TestClient
+
+    import fake_services
+
+    for name, value in {"MONGO_URI": "mongodb://localhost:27017", "OPENAI_API_KEY": "test", "ANTHROPIC_API_KEY": "test",
+                        "GEMINI_API_KEY": "test"}.items():
+        os.environ.setdefault(name, value)
+    client = fake_services.install({}, fake_services.LatencyProfile(0, 1000, 3))
+    db = client.get_database(fake_services.APP_DATABASE)
+    chatbot_id = db.chatbots.insert_one({"name": "광합성 도우미", "system_prompt": "당신은 친절한 조교입니다.",
+                                         "welcome_message": "안녕하세요!", "creator": "teacher"}).inserted_id
+    public_server = importlib.import_module("public_server")
+    with TestClient(public_server.app) as test_client:
+        yield test_client, str(chatbot_id)
+
+def sse_events(response):
+    return [json.loads(line[len("data: "):]) for line in response.text.split("\n\n") if line.startswith("data: ")]
+
+def test_websocket_rejects_malformed_frames(server):
+    test_client, chatbot_id = server
+    with test_client.websocket_connect("/ws/chat") as websocket:
+        for frame in ("[]", '"x"', "not json"):
+            websocket.send_text(frame)
+            assert websocket.receive_json()["type"] == "error"
+        websocket.send_json({"type": "start", "chatbot_id": chatbot_id, "model": ["gpt-4o"], "user_name": "학생"})
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_json({"type": "start", "chatbot_id": chatbot_id, "model": "gpt-4o", "user_name": "학생"})
+        assert websocket.receive_json()["type"] == "started"
+        websocket.send_json({"type": "message", "content": {"text": "질문"}})
+        assert websocket.receive_json()["type"] == "error"
+
+def test_sse_rejects_malformed_bodies(server):
+    test_client, chatbot_id = server
+    for body in ([], "x"):
+        assert test_client.post("/api/chat", json=body).status_code == 400
+    response = test_client.post("/api/chat", json={"chatbot_id": chatbot_id, "user_name": 3, "content": "질문"})
+    assert response.status_code == 400
+
+def test_sse_ignores_history_that_is_not_a_list(server):
+    test_client, chatbot_id = server
+    started = sse_events(test_client.post("/api/chat", json={"chatbot_id": chatbot_id, "user_name": "학생",
+                                                             "content": "광합성이 뭐예요?"}))[0]
+    response = test_client.post("/api/chat", json={"chatbot_id": chatbot_id, "user_name": "학생", "content": "더 알려 줘",
+                                                   "session_id": started["session_id"], "history": {"role": "user"}})
+    assert response.status_code == 200
+    assert sse_events(response)[-1]["type"] == "done"
+
+def receive_until_done(websocket):
+    while True:
+        event = websocket.receive_json()
+        if event["type"] in ("done", "error"):
+            return event
+
+def test_websocket_reconnect_continues_conversation(server):
+    test_client, chatbot_id = server
+    start = {"type": "start", "chatbot_id": chatbot_id, "model": "gpt-4o", "user_name": "다시 연결한 학생"}
+    with test_client.websocket_connect("/ws/chat") as websocket:
+        websocket.send_json(start)
+        session_id = websocket.receive_json()["session_id"]
+        websocket.send_json({"type": "message", "content": "광합성이 뭐예요?"})
+        answer = receive_until_done(websocket)["text"]
+
+    history = [{"role": "assistant", "content": "안녕하세요!"}, {"role": "user", "content": "광합성이 뭐예요?"},
+               {"role": "assistant", "content": answer}]
+    with test_client.websocket_connect("/ws/chat") as websocket:
+        websocket.send_json({**start, "session_id": session_id, "history": history})
+        assert websocket.receive_json()["session_id"] == session_id
+        websocket.send_json({"type": "message", "content": "더 알려 주세요"})
+        assert receive_until_done(websocket)["type"] == "done"
+
+    # 같은 대화 내역 문서에 이어서 저장됨
+    db = test_client.app.state.services.db
+    documents = list(db.public_chat_history.find({"user_name": "다시 연결한 학생"}))
+    assert len(documents) == 1
+    assert [message["role"] for message in documents[0]["messages"]] == ["assistant", "user", "assistant", "user", "assistant"]
@@ -0,0 +1,166 @@
+# resilience.py / ChatEngine 장애 대응 테스트
+# 서킷 브레이커의 시험 호출(HALF_OPEN)이 성공/실패를 기록하지 않고 끝나도 다음 호출이 다시 시험할 수 있는지,
+# 첫 토큰 기한을 넘긴 호출의 제공자 스트림을 닫거나 요청 기한으로 끝내 호출 수 제한 자리를 돌려주는지 확인합니다.
+# (외부 서비스 없이 가짜 어댑터 사용)
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionRejected, ConcurrencyGovernor
+from chat_engine import ChatEngine, ChatUsage
+from resilience import CircuitOpenError, Resilience, call_with_retries
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class BadRequestError(Exception):
+    status_code = 400
+
+class APITimeoutError(Exception):
+    pass
+
+def make_resilience(clock, **config):
+    config = {"breaker_failures": 1, "breaker_reset_seconds": 30, "max_attempts": 1, "fallback_enabled": False,
+              "hedge_enabled": False, **config}
+    return Resilience(config, clock=clock, sleep=lambda seconds: None)
+
+# 연속 실패로 브레이커를 열고 reset_seconds가 지나 HALF_OPEN이 되게 함
+def open_then_half_open(resilience, clock, provider):
+    breaker = resilience.breaker(provider)
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 31
+    return breaker
+
+class FakeAdapter:
+    def __init__(self, chunks=("안녕", "하세요"), error=None, stall=None, stall_before_response=False):
+        self.chunks = chunks
+        self.error = error
+        self.stall = stall
+        self.stall_before_response = stall_before_response
+        self.responses = []
+
+    def stream(self, messages, system, model, usage, summary=None, on_response=None, timeout=None):
+        if self.stall_before_response:
+            # 응답 헤더가 오지 않음: SDK처럼 요청 기한(없으면 오래)이 지나야 시간 초과로 끝남
+            time.sleep(timeout or 5)
+            raise APITimeoutError("Request timed out.")
+        response = FakeResponse()
+        self.responses.append(response)
+        if on_response is not None:
+            on_response(response)
+        if self.error is not None:
+            raise self.error
+        if self.stall is not None:
+            response.closed.wait(5)
+            raise ConnectionError("stream closed")
+        yield from self.chunks
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+class RejectingGovernor:
+    def acquire(self, provider, model, on_wait=None):
+        raise AdmissionRejected("대기열이 가득 찼습니다.")
+
+def collect(engine, model="gpt-4o"):
+    return [event for event in engine.stream([{"role": "user", "content": "질문"}], "시스템", model)
+            if not isinstance(event, ChatUsage)]
+
+def test_non_retriable_error_on_probe_releases_breaker():
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    open_then_half_open(resilience, clock, "openai_images")
+
+    def bad_request():
+        raise BadRequestError("content policy")
+
+    with pytest.raises(BadRequestError):
+        call_with_retries(bad_request, resilience, "openai_images")
+    clock.now += 1000
+    assert call_with_retries(lambda: "ok", resilience, "openai_images") == "ok"
+    assert resilience.breaker("openai_images").state == "closed"
+
+def test_non_retriable_error_on_streaming_probe_releases_breaker():
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    breaker = open_then_half_open(resilience, clock, "openai")
+    engine = ChatEngine({"openai": FakeAdapter(error=BadRequestError("bad request"))}, resilience=resilience)
+
+    with pytest.raises(BadRequestError):
+        collect(engine)
+    assert breaker.allow()
+
+def test_abandoned_probe_releases_breaker():
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    breaker = open_then_half_open(resilience, clock, "openai")
+    engine = ChatEngine({"openai": FakeAdapter()}, resilience=resilience)
+
+    stream = engine.stream([{"role": "user", "content": "질문"}], "시스템", "gpt-4o")
+    assert next(stream) == "안녕"
+    # 화면 재실행/연결 종료로 스트림을 끝까지 읽지 않음
+    stream.close()
+    assert breaker.allow()
+
+def test_rejected_admission_releases_probe():
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    breaker = open_then_half_open(resilience, clock, "openai")
+    engine = ChatEngine({"openai": FakeAdapter()}, governor=RejectingGovernor(), resilience=resilience)
+
+    with pytest.raises(AdmissionRejected):
+        collect(engine)
+    assert breaker.allow()
+
+def test_lost_probe_expires_after_reset_period():
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    breaker = open_then_half_open(resilience, clock, "openai")
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    clock.now += 31
+    assert breaker.allow()
+
+def test_open_breaker_still_blocks_calls():
+    clock = FakeClock()
+    resilience = make_resilience(clock)
+    resilience.breaker("openai_images").record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(lambda: "ok", resilience, "openai_images")
+
+def test_first_token_timeout_closes_provider_stream():
+    clock = FakeClock()
+    resilience = make_resilience(clock, first_token_timeout_seconds=0.2)
+    adapter = FakeAdapter(stall=True)
+    engine = ChatEngine({"openai": adapter}, resilience=resilience)
+
+    started_at = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        collect(engine)
+    assert adapter.responses[0].closed.wait(1)
+    assert time.perf_counter() - started_at < 2
+
+def test_stall_before_response_returns_governor_slot():
+    clock = FakeClock()
+    resilience = make_resilience(clock, first_token_timeout_seconds=0.2)
+    governor = ConcurrencyGovernor({"providers": {"openai": {"max_concurrent": 1}}})
+    engine = ChatEngine({"openai": FakeAdapter(stall_before_response=True)}, governor=governor, resilience=resilience)
+
+    with pytest.raises(TimeoutError):
+        collect(engine)
+    deadline = time.perf_counter() + 1
+    while governor.snapshot()[0]["in_flight"] and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert governor.snapshot()[0]["in_flight"] == 0
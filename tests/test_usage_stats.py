@@ -0,0 +1,29 @@
+# 사용량 일간 집계 테스트
+# 대화 요약 호출이 요청 수에 들어가지 않고 요약 호출 수로 따로 세어지는지, 기록할 때 갱신하는 집계와 로그로 다시 만드는
+# 집계(ROLLUP_FIELDS)가 같은 규칙을 쓰는지 확인합니다. (mongomock 사용)
+from datetime import datetime
+
+import pytest
+
+from chat_engine import ChatUsage
+from usage_stats import ROLLUP_FIELDS, log_usage
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().db
+
+def test_summary_calls_are_counted_separately(db):
+    timestamp = datetime(2026, 10, 1, 9)
+    for purpose in ("chat", "chat", "summary"):
+        log_usage(db, "teacher", "gpt-4o", timestamp, usage=ChatUsage(model="gpt-4o", provider="openai", purpose=purpose))
+    # purpose가 없는 예전 로그는 요청으로 셈
+    log_usage(db, "teacher", "gpt-4o", timestamp)
+
+    daily = db.usage_daily.find_one({"username": "teacher"})
+    assert daily["request_count"] == 3 and daily["summary_count"] == 1
+
+    rebuilt = list(db.usage_logs.aggregate([
+        {"$group": {"_id": None, **{field: {"$sum": expression} for field, expression in ROLLUP_FIELDS.items()}}}
+    ]))[0]
+    assert rebuilt["request_count"] == 3 and rebuilt["summary_count"] == 1
@@ -0,0 +1,237 @@
+# 사용량 통계 집계
+# usage_logs에 기록이 추가될 때마다 (날짜, 사용자, 모델)별 일간 집계 문서(usage_daily)를 $inc로 갱신해 두고,
+# 관리자 대시보드는 원본 로그 대신 이 집계 문서를 MongoDB 집계 파이프라인으로 읽습니다.
+from datetime import datetime, time as dt_time, timedelta
+
+# TTFT 분포 구간 상한 (ms). 마지막 구간은 상한 없음
+TTFT_BUCKETS_MS = [100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000, 13000]
+
+# TTFT 값이 속하는 구간 번호
+def ttft_bucket(ttft_ms):
+    for i, upper in enumerate(TTFT_BUCKETS_MS):
+        if ttft_ms <= upper:
+            return i
+    return len(TTFT_BUCKETS_MS)
+
+# 구간별 개수로 백분위 TTFT 근사값 계산 (해당 구간의 상한값 반환)
+def ttft_percentile(histogram, percentile):
+    total = sum(histogram.values())
+    if total == 0:
+        return None
+    threshold = total * percentile / 100
+    cumulative = 0
+    for i in range(len(TTFT_BUCKETS_MS) + 1):
+        cumulative += histogram.get(str(i), 0)
+        if cumulative >= threshold:
+            return TTFT_BUCKETS_MS[i] if i < len(TTFT_BUCKETS_MS) else float("inf")
+    return None
+
+# 사용량 기록 한 건 저장 (usage_logs 추가 + 일간 집계 갱신)
+# usage(ChatUsage)가 있으면 토큰 수, TTFT, 대기 시간 등 호출 정보를 함께 기록합니다.
+# response_cache에는 응답 캐시 조회 결과("exact", "semantic", "miss")를 기록합니다. (캐시를 쓰지 않는 챗봇은 None)
+def log_usage(db, username, model_name, timestamp, tokens_used=None, usage=None, response_cache=None):
+    usage_entry = {
+        "username": username,
+        "model_name": model_name,
+        "timestamp": timestamp,
+        "tokens_used": tokens_used
+    }
+    if usage:
+        if tokens_used is None and usage.input_tokens is not None and usage.output_tokens is not None:
+            usage_entry["tokens_used"] = usage.input_tokens + usage.output_tokens
+        usage_entry.update(usage.to_log_fields())
+    if response_cache is not None:
+        usage_entry["response_cache"] = response_cache
+    db.usage_logs.insert_one(usage_entry)
+    record_daily_rollup(db, usage_entry)
+    return usage_entry
+
+# 사용량 기록 한 건을 일간 집계에 반영
+def record_daily_rollup(db, usage_entry):
+    timestamp = usage_entry["timestamp"]
+    # 대화 요약 호출은 요청 수에 넣지 않고 따로 셈
+    if usage_entry.get("purpose") == "summary":
+        increments = {"summary_count": 1}
+    else:
+        increments = {"request_count": 1}
+    for field in ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens"):
+        if usage_entry.get(field) is not None:
+            increments[f"{field}_sum"] = usage_entry[field]
+    if usage_entry.get("duration_ms") is not None:
+        increments["duration_ms_sum"] = usage_entry["duration_ms"]
+        increments["duration_count"] = 1
+    if usage_entry.get("ttft_ms") is not None:
+        increments["ttft_ms_sum"] = usage_entry["ttft_ms"]
+        increments["ttft_count"] = 1
+        increments[f"ttft_hist.{ttft_bucket(usage_entry['ttft_ms'])}"] = 1
+    if usage_entry.get("queue_wait_ms") is not None:
+        increments["queue_wait_ms_sum"] = usage_entry["queue_wait_ms"]
+        increments["queue_wait_count"] = 1
+        if (usage_entry.get("queue_position") or 0) > 1:
+            increments["queued_requests"] = 1
+    # 헤지 요청은 재시도로 세지 않음
+    retries = (usage_entry.get("attempts") or 1) - 1 - (1 if usage_entry.get("hedged") else 0)
+    if retries > 0:
+        increments["retries"] = retries
+    if usage_entry.get("requested_model") not in (None, usage_entry["model_name"]):
+        increments["fallback_requests"] = 1
+    if usage_entry.get("hedged"):
+        increments["hedged_requests"] = 1
+    if usage_entry.get("response_cache") is not None:
+        increments["response_cache_lookups"] = 1
+        if usage_entry["response_cache"] != "miss":
+            increments["response_cache_hits"] = 1
+    db.usage_daily.update_one(
+        {
+            "date": datetime.combine(timestamp.date(), dt_time.min),
+            "username": usage_entry["username"],
+            "model_name": usage_entry["model_name"]
+        },
+        {"$inc": increments},
+        upsert=True
+    )
+
+# 값이 숫자인 로그 수 / 조건을 만족하는 로그 수 (집계 파이프라인 식)
+def _count_if(condition):
+    return {"$cond": [condition, 1, 0]}
+
+def _has_number(field):
+    return _count_if({"$isNumber": f"${field}"})
+
+# 일간 집계 필드 -> 로그 한 건의 값 (record_daily_rollup과 같은 규칙)
+ROLLUP_FIELDS = {
+    # 대화 요약 호출은 요청 수에 넣지 않고 따로 셈
+    "request_count": _count_if({"$ne": [{"$ifNull": ["$purpose", None]}, "summary"]}),
+    "summary_count": _count_if({"$eq": ["$purpose", "summary"]}),
+    "input_tokens_sum": "$input_tokens",
+    "output_tokens_sum": "$output_tokens",
+    "cache_read_tokens_sum": "$cache_read_tokens",
+    "cache_write_tokens_sum": "$cache_write_tokens",
+    "duration_ms_sum": "$duration_ms",
+    "duration_count": _has_number("duration_ms"),
+    "ttft_ms_sum": "$ttft_ms",
+    "ttft_count": _has_number("ttft_ms"),
+    "queue_wait_ms_sum": "$queue_wait_ms",
+    "queue_wait_count": _has_number("queue_wait_ms"),
+    "queued_requests": _count_if({"$and": [_has_number("queue_wait_ms"), {"$gt": ["$queue_position", 1]}]}),
+    # 헤지 요청은 재시도로 세지 않음
+    "retries": {"$max": [0, {"$subtract": [{"$subtract": [{"$ifNull": ["$attempts", 1]}, 1]},
+                                           _count_if({"$eq": ["$hedged", True]})]}]},
+    "fallback_requests": _count_if({"$and": [{"$ne": [{"$ifNull": ["$requested_model", None]}, None]},
+                                             {"$ne": ["$requested_model", "$model_name"]}]}),
+    "hedged_requests": _count_if({"$eq": ["$hedged", True]}),
+    "response_cache_lookups": _count_if({"$ne": [{"$ifNull": ["$response_cache", None]}, None]}),
+    "response_cache_hits": _count_if({"$and": [{"$ne": [{"$ifNull": ["$response_cache", None]}, None]},
+                                               {"$ne": ["$response_cache", "miss"]}]}),
+}
+
+# usage_logs로 일간 집계 다시 만들기 (기존 로그 백필용)
+# usage_logs는 보존 기간(TTL)이 지나면 지워지므로, 로그가 남아 있는 날짜의 집계만 지우고 다시 계산합니다.
+# 가장 오래된 로그의 날짜는 그날 로그 일부가 이미 지워졌을 수 있어, 그날 집계가 있으면 그대로 두고 다음 날부터 계산합니다.
+# 파이프라인 하나로 (날짜, 사용자, 모델, TTFT 구간)별로 먼저 합친 뒤 (날짜, 사용자, 모델)별로 다시 합쳐 $merge로 씁니다.
+# 다시 계산한 첫 날짜를 반환합니다. (로그가 없으면 None)
+def rebuild_daily_rollups(db):
+    oldest = db.usage_logs.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+    if oldest is None:
+        return None
+    since = datetime.combine(oldest["timestamp"].date(), dt_time.min)
+    if db.usage_daily.find_one({"date": since}, {"_id": 1}) is not None:
+        since += timedelta(days=1)
+    db.usage_daily.delete_many({"date": {"$gte": since}})
+
+    ttft_bucket_expression = {"$cond": [
+        {"$isNumber": "$ttft_ms"},
+        {"$switch": {
+            "branches": [{"case": {"$lte": ["$ttft_ms", upper]}, "then": i} for i, upper in enumerate(TTFT_BUCKETS_MS)],
+            "default": len(TTFT_BUCKETS_MS)
+        }},
+        None
+    ]}
+    day_expression = {"$dateFromParts": {"year": {"$year": "$timestamp"}, "month": {"$month": "$timestamp"},
+                                         "day": {"$dayOfMonth": "$timestamp"}}}
+    db.usage_logs.aggregate([
+        {"$match": {"timestamp": {"$gte": since}}},
+        {"$group": {
+            "_id": {"date": day_expression, "username": "$username", "model_name": "$model_name",
+                    "ttft_bucket": ttft_bucket_expression},
+            **{field: {"$sum": expression} for field, expression in ROLLUP_FIELDS.items()}
+        }},
+        {"$group": {
+            "_id": {"date": "$_id.date", "username": "$_id.username", "model_name": "$_id.model_name"},
+            **{field: {"$sum": f"${field}"} for field in ROLLUP_FIELDS},
+            "ttft_hist": {"$push": {"k": {"$toString": "$_id.ttft_bucket"}, "v": "$ttft_count"}}
+        }},
+        {"$project": {
+            "_id": 0,
+            "date": "$_id.date",
+            "username": "$_id.username",
+            "model_name": "$_id.model_name",
+            **{field: 1 for field in ROLLUP_FIELDS},
+            "ttft_hist": {"$arrayToObject": {"$filter": {"input": "$ttft_hist", "cond": {"$gt": ["$$this.v", 0]}}}}
+        }},
+        {"$merge": {"into": "usage_daily", "on": ["date", "username", "model_name"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ])
+    return since
+
+# 대시보드 필터 조건 만들기 (date_field: 집계 문서는 "date", 원본 로그는 "timestamp")
+def build_usage_match(usernames, model_names, start_date=None, end_date=None, date_field="date"):
+    match = {"username": {"$in": list(usernames)}, "model_name": {"$in": list(model_names)}}
+    if start_date and end_date:
+        match[date_field] = {
+            "$gte": datetime.combine(start_date, dt_time.min),
+            "$lte": datetime.combine(end_date, dt_time.max)
+        }
+    return match
+
+# 사용자별 모델 사용 횟수
+def usage_counts_by_user(db, match):
+    return list(db.usage_daily.aggregate([
+        {"$match": match},
+        {"$group": {"_id": {"username": "$username", "model_name": "$model_name"}, "count": {"$sum": "$request_count"}}},
+        {"$sort": {"_id.username": 1, "_id.model_name": 1}}
+    ]))
+
+# 일별 사용 횟수
+def usage_counts_by_day(db, match):
+    return list(db.usage_daily.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$date", "count": {"$sum": "$request_count"}}},
+        {"$sort": {"_id": 1}}
+    ]))
+
+# 모델별 토큰, 지연 시간, 응답 캐시 적중, 호출 대기, 재시도/대체 모델 합계 (TTFT 분포는 구간별로 합산)
+def usage_totals_by_model(db, match):
+    totals = list(db.usage_daily.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$model_name",
+            "request_count": {"$sum": "$request_count"},
+            "summary_count": {"$sum": "$summary_count"},
+            "input_tokens": {"$sum": "$input_tokens_sum"},
+            "output_tokens": {"$sum": "$output_tokens_sum"},
+            "cache_read_tokens": {"$sum": "$cache_read_tokens_sum"},
+            "cache_write_tokens": {"$sum": "$cache_write_tokens_sum"},
+            "duration_ms_sum": {"$sum": "$duration_ms_sum"},
+            "duration_count": {"$sum": "$duration_count"},
+            "ttft_ms_sum": {"$sum": "$ttft_ms_sum"},
+            "ttft_count": {"$sum": "$ttft_count"},
+            "response_cache_lookups": {"$sum": "$response_cache_lookups"},
+            "response_cache_hits": {"$sum": "$response_cache_hits"},
+            "queue_wait_ms_sum": {"$sum": "$queue_wait_ms_sum"},
+            "queue_wait_count": {"$sum": "$queue_wait_count"},
+            "queued_requests": {"$sum": "$queued_requests"},
+            "retries": {"$sum": "$retries"},
+            "fallback_requests": {"$sum": "$fallback_requests"},
+            "hedged_requests": {"$sum": "$hedged_requests"},
+            "ttft_hists": {"$push": "$ttft_hist"}
+        }},
+        {"$sort": {"_id": 1}}
+    ]))
+    for total in totals:
+        histogram = {}
+        for hist in total.pop("ttft_hists"):
+            for bucket, count in (hist or {}).items():
+                histogram[bucket] = histogram.get(bucket, 0) + count
+        total["ttft_hist"] = histogram
+    return totals